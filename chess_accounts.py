@@ -0,0 +1,260 @@
+
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+
+# Where the server keeps accounts unless told otherwise
+USER_DB_PATH = 'chess_users.db'
+
+# Password hashes: PBKDF2-SHA256 stored as "pbkdf2_sha256$iterations$salt$hash"
+# so the work factor can be raised later without breaking old accounts
+HASH_ALGORITHM = 'pbkdf2_sha256'
+HASH_ITERATIONS = 200000
+SALT_BYTES = 16
+MAX_PASSWORD_LENGTH = 128
+
+# Elo ratings. New players move quickly until they have played enough games.
+DEFAULT_RATING = 1500.0
+PROVISIONAL_GAMES = 30
+PROVISIONAL_K = 40
+ESTABLISHED_K = 20
+
+# How often cached rating changes are written back to disk (seconds)
+RATING_FLUSH_INTERVAL = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_by_rating ON users (rating);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    white TEXT NOT NULL,
+    black TEXT NOT NULL,
+    score REAL NOT NULL,
+    finished REAL NOT NULL
+);
+"""
+
+def hash_password(password, salt=None, iterations=HASH_ITERATIONS):
+    """Hash a password with a fresh (or given) salt into its stored form"""
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored):
+    """Check a password against a stored hash"""
+    try:
+        algorithm, iterations, salt, _ = stored.split('$')
+        if algorithm != HASH_ALGORITHM:
+            return False
+        expected = hash_password(password, bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, stored)
+
+def expected_score(rating, opponent_rating):
+    """Score a player is expected to make against an opponent"""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+def k_factor(games):
+    """How far one game can move a rating, given the games played before it"""
+    return PROVISIONAL_K if games < PROVISIONAL_GAMES else ESTABLISHED_K
+
+def rate_game(white_rating, white_games, black_rating, black_games, score):
+    """Ratings after a game as (white, black); score is white's (1, 0.5 or 0)"""
+    change = score - expected_score(white_rating, black_rating)
+    return (white_rating + k_factor(white_games) * change,
+            black_rating - k_factor(black_games) * change)
+
+class Account:
+    """A registered player, as cached by the user store"""
+    def __init__(self, name, display_name, password_hash, rating, games):
+        self.name = name  # Lower-cased username, the key
+        self.display_name = display_name
+        self.password_hash = password_hash
+        self.rating = rating
+        self.games = games
+
+class UserStore:
+    """Player accounts and ratings kept in a SQLite file.
+
+    Accounts are read from disk once, at login, and cached. Finished games
+    update the cached ratings straight away and are written back in one
+    transaction per flush interval, so ending a game never waits on the
+    disk. Every rated result is kept too, which lets the whole rating list
+    be recomputed in a single pass. Logging in hashes the password, which
+    is slow on purpose; the server runs authenticate() on its login pool.
+    """
+    def __init__(self, path=USER_DB_PATH, log=print):
+        self.path = path
+        self.log = log
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.db_lock = threading.Lock()  # One connection, shared by logins and the flusher
+        self.lock = threading.Lock()  # Guards the cache below
+        self.accounts = {}  # name -> Account, for everyone who logged in
+        self.dirty = set()  # names whose rating changed since the last flush
+        self.pending_results = []  # (white, black, score, finished) not written yet
+        self.flush_lock = threading.Lock()  # One flush or recompute at a time
+        self.running = False
+        self.thread = None
+
+    def authenticate(self, username, password):
+        """Log in, returning (account, error).
+
+        Unknown names with a password are registered; without one they play
+        as unrated guests (account None). Registered names need their password.
+        """
+        name = username.lower()
+        account = self.load(name)
+        if account is None:
+            if not password:
+                return None, None
+            account = self.register(name, username, password)
+        elif not password:
+            return None, f"{username} is registered; a password is required"
+        if not verify_password(password, account.password_hash):
+            return None, "Wrong password"
+        return account, None
+
+    def load(self, name):
+        """Get an account from the cache or the database, or None"""
+        with self.lock:
+            account = self.accounts.get(name)
+        if account:
+            return account
+        with self.db_lock:
+            row = self.db.execute(
+                'SELECT name, display_name, password_hash, rating, games FROM users WHERE name = ?',
+                (name,)).fetchone()
+        if row is None:
+            return None
+        with self.lock:
+            # Another login may have cached it meanwhile; keep theirs
+            return self.accounts.setdefault(name, Account(*row))
+
+    def register(self, name, display_name, password):
+        """Create an account, or return the existing one if the name was just taken"""
+        password_hash = hash_password(password)
+        with self.db_lock:
+            self.db.execute(
+                'INSERT OR IGNORE INTO users (name, display_name, password_hash, rating, games, created) '
+                'VALUES (?, ?, ?, ?, 0, ?)',
+                (name, display_name, password_hash, DEFAULT_RATING, time.time()))
+            self.db.commit()
+        return self.load(name)
+
+    def record_result(self, white, black, score):
+        """Rate a finished game between two accounts; score is white's.
+
+        Only touches the cache; returns the new (white, black) ratings.
+        """
+        with self.lock:
+            white.rating, black.rating = rate_game(white.rating, white.games, black.rating, black.games, score)
+            white.games += 1
+            black.games += 1
+            self.dirty.update((white.name, black.name))
+            self.pending_results.append((white.name, black.name, score, time.time()))
+            return white.rating, black.rating
+
+    def flush(self):
+        """Write cached rating changes and new results to disk"""
+        with self.flush_lock:
+            self.write_back()
+
+    def write_back(self):
+        """Flush, with flush_lock already held"""
+        with self.lock:
+            if not self.dirty and not self.pending_results:
+                return
+            ratings = [(self.accounts[name].rating, self.accounts[name].games, name) for name in self.dirty]
+            results = self.pending_results
+            self.dirty = set()
+            self.pending_results = []
+        try:
+            with self.db_lock:
+                with self.db:
+                    self.db.executemany('UPDATE users SET rating = ?, games = ? WHERE name = ?', ratings)
+                    self.db.executemany(
+                        'INSERT INTO results (white, black, score, finished) VALUES (?, ?, ?, ?)', results)
+        except Exception as e:
+            self.log(f"Error saving ratings: {e}")
+            # Keep the changes for the next flush
+            with self.lock:
+                self.dirty.update(name for _, _, name in ratings)
+                self.pending_results[:0] = results
+
+    def recompute_ratings(self):
+        """Rebuild every rating from the stored results, oldest first.
+
+        Games finishing while this runs are rated as usual and then replayed
+        on top of the recomputed ratings, so nothing is lost. Returns the
+        number of results replayed.
+        """
+        with self.flush_lock:
+            self.write_back()
+            with self.db_lock:
+                names = [row[0] for row in self.db.execute('SELECT name FROM users')]
+                results = self.db.execute('SELECT white, black, score FROM results ORDER BY id').fetchall()
+
+            # Plain dicts are much faster to update than the accounts
+            ratings = dict.fromkeys(names, DEFAULT_RATING)
+            games = dict.fromkeys(names, 0)
+            for white, black, score in results:
+                ratings[white], ratings[black] = rate_game(
+                    ratings[white], games[white], ratings[black], games[black], score)
+                games[white] += 1
+                games[black] += 1
+
+            with self.lock:
+                # Results recorded since the write-back above
+                for white, black, score, _ in self.pending_results:
+                    for name in (white, black):
+                        ratings.setdefault(name, DEFAULT_RATING)
+                        games.setdefault(name, 0)
+                    ratings[white], ratings[black] = rate_game(
+                        ratings[white], games[white], ratings[black], games[black], score)
+                    games[white] += 1
+                    games[black] += 1
+                for name, account in self.accounts.items():
+                    if name not in ratings:
+                        continue  # Registered since the read, with no games yet
+                    account.rating = ratings[name]
+                    account.games = games[name]
+                self.dirty.difference_update(names)
+
+            with self.db_lock:
+                with self.db:
+                    self.db.executemany('UPDATE users SET rating = ?, games = ? WHERE name = ?',
+                                        ((ratings[name], games[name], name) for name in names))
+        return len(results)
+
+    def start(self):
+        """Start the write-back thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """Write-back loop: flush the cached changes once per interval"""
+        while self.running:
+            time.sleep(RATING_FLUSH_INTERVAL)
+            self.flush()
+
+    def close(self):
+        """Stop the write-back thread, flush and close the database"""
+        self.running = False
+        self.flush()
+        with self.db_lock:
+            self.db.close()
@@ -1,14 +1,17 @@
 
-import socket                          
-import json
 import threading
 import sys
 import tkinter as tk
 from tkinter import ttk, scrolledtext, simpledialog, messagebox
+from tkinter import font as tkfont
 import re
 import time
 import io
 import os
+import queue
+import chess
+from chess_headless import ANY, CHAT, ChessSession, LatencyStats
+from chess_protocol import UUID_PATTERN
 
 # Define piece unicode symbols
 UNICODE_PIECES = {
@@ -16,6 +19,46 @@ UNICODE_PIECES = {
     'k': '♚', 'q': '♛', 'r': '♜', 'b': '♝', 'n': '♞', 'p': '♟'
 }
 
+# Bot strength levels offered by the server, weakest first
+BOT_LEVELS = ['beginner', 'casual', 'club', 'expert']
+
+TOURNAMENT_FORMATS = ['swiss', 'round_robin']
+
+# Board colors
+LIGHT_SQUARE = "#EEEED2"
+DARK_SQUARE = "#769656"
+SELECTED_SQUARE = "#BBCC44"
+TARGET_SQUARE = "#AABBFF"
+PREMOVE_SQUARE = "#D9A0A0"
+CHECK_SQUARE = "#E06666"
+
+# Resizes are redrawn once the window has stopped changing for this long
+RESIZE_DEBOUNCE_MS = 50
+
+# Received messages are applied to the UI at most once per frame (~60 Hz)
+UI_FRAME_MS = 16
+
+# Only the most recent plies are kept in the move history widget; older full
+# moves are trimmed in chunks once the window overflows by HISTORY_TRIM_PLIES
+HISTORY_WINDOW_PLIES = 400
+HISTORY_TRIM_PLIES = 100
+
+# After the server announces a restart, reconnect on our own: games in
+# progress carry on once we're back
+RECONNECT_DELAY_MS = 2000
+RECONNECT_ATTEMPTS = 30
+
+# Live game directory
+GAME_SORTS = ['spectators', 'rating', 'newest', 'moves']
+GAMES_PAGE_SIZE = 20
+
+# Board wall: many games followed at once on miniature boards
+MAX_WALL_BOARDS = 64  # The server's limit on games followed per connection
+WALL_COLUMNS = 5
+WALL_SQUARE = 22  # Pixels per square on the miniature boards
+WALL_GAP = 14  # Space around each board
+WALL_CAPTION = 32  # Room under each board for the players and status
+
 class ChessClientGUI:
     def __init__(self, root, host='localhost', port=5555, chat_port=None):
         self.root = root
@@ -27,24 +70,53 @@ class ChessClientGUI:
         self.host = host
         self.port = port
         self.chat_port = chat_port or port + 1  # Use port+1 for chat by default
-        self.game_socket = None
-        self.chat_socket = None
-        self.client_id = None
+        self.session = None  # Headless session doing the networking and protocol
         self.username = None
+        self.password = None  # Empty to play as an unrated guest
         self.game_id = None
         self.color = None
         self.last_game_state = None
-        self.receive_buffer = ""
         self.board_fen = None
         self.current_turn = None
         self.your_turn = False
-        self.legal_moves = []
+        self.board = chess.Board()  # Local model of the game position
+        self.moves_by_square = {}  # from square -> {to square: [UCI moves]} on our turn
+        self.pending_move = None  # Our move shown before the server confirmed it
+        self.last_server_state = None
+        self.check_square = None  # King in check, highlighted on the board
+        
+        # Messages from the network threads wait here for the next UI frame
+        self.ui_queue = queue.Queue()
+        self.ui_flush_pending = False
+        self.ui_lock = threading.Lock()
+        self.states_skipped = 0  # Game states replaced by a newer one in the same frame
+        self.display_latency = LatencyStats()  # Our move sent -> the confirmed board drawn
+        self.known_history = []  # SAN moves shown for the current game
         self.is_connected = False
+        self.server_restarting = False  # The server said it's restarting; reconnect when it drops us
+        self.reconnect_attempts = 0
         self.selected_square = None
         self.valid_targets = []
+        self.premoves = []  # Moves the server has queued for our next turns
+        self.rendered_moves = []  # SAN moves currently shown in the move history
+        self.history_start = 0  # Ply shown on the first line of the move history (always even)
+        
+        # Canvas items are created once and then updated in place
+        self.square_items = {}  # square name -> rectangle item
+        self.piece_items = {}  # square name -> text item
+        self.rank_label_items = []  # left column, top to bottom
+        self.file_label_items = []  # bottom row, left to right
+        self.drawn_colors = {}  # square name -> fill currently shown
+        self.drawn_pieces = {}  # square name -> FEN piece letter currently shown
+        self.board_layout = None  # (square size, x offset, y offset, flipped) last laid out
+        self.square_size = 0
+        self.resize_job = None
         self.current_lobby_id = None
+        self.current_tournament_id = None
         self.lobby_ids = []  # Store lobby IDs for selection
         self.in_chat = False
+        self.board_wall = None  # BoardWall window when open
+        self.live_games = None  # LiveGamesWindow when open
         
         # Set up the main frame structure
         self.setup_ui()
@@ -100,8 +172,13 @@ class ChessClientGUI:
         self.username_entry = ttk.Entry(connection_frame, width=15)
         self.username_entry.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
         
+        # Registers the username on first use; leave empty to play unrated
+        ttk.Label(connection_frame, text="Password:").grid(row=3, column=0, padx=5, pady=2, sticky=tk.W)
+        self.password_entry = ttk.Entry(connection_frame, width=15, show="*")
+        self.password_entry.grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
+        
         self.connect_button = ttk.Button(connection_frame, text="Connect", command=self.handle_connect)
-        self.connect_button.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
+        self.connect_button.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
         
         # Lobby frame
         lobby_frame = ttk.LabelFrame(self.left_frame, text="Lobby")
@@ -133,6 +210,38 @@ class ChessClientGUI:
         self.start_game_button = ttk.Button(lobby_actions_frame, text="Start Game", command=self.start_game, state=tk.DISABLED)
         self.start_game_button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=5)
         
+        # Bot opponent controls
+        bot_actions_frame = ttk.Frame(lobby_frame)
+        bot_actions_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.bot_level_combo = ttk.Combobox(bot_actions_frame, values=BOT_LEVELS, width=9, state="readonly")
+        self.bot_level_combo.set(BOT_LEVELS[1])
+        self.bot_level_combo.pack(side=tk.LEFT, padx=2, pady=5)
+        
+        self.add_bot_button = ttk.Button(bot_actions_frame, text="Add Bot", command=self.add_bot, state=tk.DISABLED)
+        self.add_bot_button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=5)
+        
+        # Tournament frame
+        tournament_frame = ttk.LabelFrame(self.left_frame, text="Tournament")
+        tournament_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.tournament_format_combo = ttk.Combobox(tournament_frame, values=TOURNAMENT_FORMATS, width=12, state="readonly")
+        self.tournament_format_combo.set(TOURNAMENT_FORMATS[0])
+        self.tournament_format_combo.grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+        
+        self.create_tournament_button = ttk.Button(tournament_frame, text="Create", command=self.create_tournament, state=tk.DISABLED)
+        self.create_tournament_button.grid(row=0, column=1, padx=5, pady=2, sticky=tk.EW)
+        
+        ttk.Label(tournament_frame, text="ID:").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+        self.tournament_id_entry = ttk.Entry(tournament_frame, width=12)
+        self.tournament_id_entry.grid(row=1, column=1, padx=5, pady=2, sticky=tk.W)
+        
+        self.join_tournament_button = ttk.Button(tournament_frame, text="Join", command=self.join_tournament, state=tk.DISABLED)
+        self.join_tournament_button.grid(row=2, column=0, padx=5, pady=2, sticky=tk.EW)
+        
+        self.start_tournament_button = ttk.Button(tournament_frame, text="Start", command=self.start_tournament, state=tk.DISABLED)
+        self.start_tournament_button.grid(row=2, column=1, padx=5, pady=2, sticky=tk.EW)
+        
         # Spectate frame
         spectate_frame = ttk.LabelFrame(self.left_frame, text="Spectate")
         spectate_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -143,6 +252,12 @@ class ChessClientGUI:
         
         self.spectate_button = ttk.Button(spectate_frame, text="Spectate", command=self.spectate_game, state=tk.DISABLED)
         self.spectate_button.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
+        
+        self.board_wall_button = ttk.Button(spectate_frame, text="Board Wall", command=self.open_board_wall, state=tk.DISABLED)
+        self.board_wall_button.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
+        
+        self.live_games_button = ttk.Button(spectate_frame, text="Live Games", command=self.open_live_games, state=tk.DISABLED)
+        self.live_games_button.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
     
     def setup_center_section(self):
         """Set up the center section with the chess board"""
@@ -183,8 +298,9 @@ class ChessClientGUI:
         # Create the chess board
         self.board_canvas = tk.Canvas(self.board_frame, bg="white")
         self.board_canvas.pack(fill=tk.BOTH, expand=True)
-        self.board_canvas.bind("<Configure>", self.draw_board)
+        self.board_canvas.bind("<Configure>", self.schedule_board_resize)
         self.board_canvas.bind("<Button-1>", self.board_click)
+        self.board_canvas.bind("<Button-3>", self.cancel_premoves)
         
         # Player white info
         self.white_frame = ttk.Frame(self.game_info_frame)
@@ -203,6 +319,16 @@ class ChessClientGUI:
         self.resign_button = ttk.Button(self.game_controls_frame, text="Resign", command=self.resign, state=tk.DISABLED)
         self.resign_button.pack(side=tk.LEFT, padx=5)
         
+        self.draw_button = ttk.Button(self.game_controls_frame, text="Offer Draw", command=self.offer_draw, state=tk.DISABLED)
+        self.draw_button.pack(side=tk.LEFT, padx=5)
+        
+        # Only enabled while the position allows a claim
+        self.claim_draw_button = ttk.Button(self.game_controls_frame, text="Claim Draw", command=self.claim_draw, state=tk.DISABLED)
+        self.claim_draw_button.pack(side=tk.LEFT, padx=5)
+        
+        self.takeback_button = ttk.Button(self.game_controls_frame, text="Takeback", command=self.request_takeback, state=tk.DISABLED)
+        self.takeback_button.pack(side=tk.LEFT, padx=5)
+        
         self.position_eval = ttk.Label(self.game_controls_frame, text="Position: Even", font=("Arial", 10))
         self.position_eval.pack(side=tk.RIGHT, padx=5)
         
@@ -218,6 +344,9 @@ class ChessClientGUI:
         self.game_status = ttk.Label(game_info_frame, text="No active game", wraplength=250)
         self.game_status.pack(fill=tk.X, padx=5, pady=5)
         
+        self.latency_label = ttk.Label(game_info_frame, text="Move latency: -", wraplength=250)
+        self.latency_label.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
         # Move history frame
         move_history_frame = ttk.LabelFrame(self.right_frame, text="Move History")
         move_history_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -270,6 +399,7 @@ class ChessClientGUI:
         self.port = port
         self.chat_port = chat_port
         self.username = username
+        self.password = self.password_entry.get() or None
         
         # Try to connect
         if self.connect():
@@ -281,33 +411,49 @@ class ChessClientGUI:
     
     def connect(self):
         """Connect to the chess server"""
-        try:
-            self.game_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.game_socket.connect((self.host, self.port))
-            
-            # Send initial data with username
-            initial_data = {'username': self.username}
-            self.send_game_message(initial_data)
-            
-            # Start listening for game messages
-            listen_thread = threading.Thread(target=self.listen_for_game_messages)
-            listen_thread.daemon = True
-            listen_thread.start()
-            
-            self.is_connected = True
-            return True
-        except Exception as e:
-            print(f"Failed to connect to game server: {e}")
-            self.is_connected = False
-            return False
+        # The session reads on its own threads; everything it receives is
+        # handed to the UI thread. The GUI tracks our legal moves itself.
+        previous = self.session
+        self.session = ChessSession(self.host, self.port, self.username, self.chat_port,
+                                    legal_moves=False, inbox_size=0, password=self.password)
+        if previous:
+            # Reclaims our seat if a restart carried our game over
+            self.session.resume_token = previous.resume_token
+        self.session.on(ANY, lambda message: self.schedule_ui(self.handle_game_message, message))
+        self.session.on(ANY, lambda message: self.schedule_ui(self.handle_chat_message, message), channel=CHAT)
+        
+        self.is_connected = self.session.connect()
+        return self.is_connected
+    
+    def reconnect_after_restart(self):
+        """Log back in after a server restart, retrying until the new server is up"""
+        if self.is_connected or not self.server_restarting:
+            return
+        self.session.close()
+        if self.connect():
+            self.server_restarting = False
+            self.in_chat = False
+            self.status_bar.config(text=f"Reconnected to {self.host}:{self.port} as {self.username}")
+            self.connect_button.config(text="Disconnect", command=self.disconnect)
+            self.enable_lobby_buttons()
+            return
+        
+        self.reconnect_attempts += 1
+        if self.reconnect_attempts < RECONNECT_ATTEMPTS:
+            self.root.after(RECONNECT_DELAY_MS, self.reconnect_after_restart)
+        else:
+            self.server_restarting = False
+            self.status_bar.config(text="Could not reconnect after the server restart")
     
     def disconnect(self):
         """Disconnect from the server"""
         try:
-            if self.game_socket:
-                self.game_socket.close()
-            if self.chat_socket:
-                self.chat_socket.close()
+            if self.board_wall:
+                self.board_wall.close()
+            if self.live_games:
+                self.live_games.close()
+            if self.session:
+                self.session.close()
             
             self.status_bar.config(text="Disconnected")
             self.connect_button.config(text="Connect", command=self.handle_connect)
@@ -316,14 +462,11 @@ class ChessClientGUI:
             self.in_chat = False
             
             # Reset game and chat variables
-            self.client_id = None
             self.game_id = None
             self.color = None
             self.last_game_state = None
             self.board_fen = None
             self.current_lobby_id = None
-            self.chat_socket = None
-            self.game_socket = None
             self.game_status.config(text="No active game")
             
             # Clear game ID display
@@ -344,6 +487,10 @@ class ChessClientGUI:
         self.list_lobbies_button.config(state=tk.NORMAL)
         self.join_lobby_button.config(state=tk.NORMAL)
         self.spectate_button.config(state=tk.NORMAL)
+        self.board_wall_button.config(state=tk.NORMAL)
+        self.live_games_button.config(state=tk.NORMAL)
+        self.create_tournament_button.config(state=tk.NORMAL)
+        self.join_tournament_button.config(state=tk.NORMAL)
     
     def disable_all_buttons(self):
         """Disable all action buttons"""
@@ -351,15 +498,22 @@ class ChessClientGUI:
         self.list_lobbies_button.config(state=tk.DISABLED)
         self.join_lobby_button.config(state=tk.DISABLED)
         self.start_game_button.config(state=tk.DISABLED)
+        self.add_bot_button.config(state=tk.DISABLED)
         self.spectate_button.config(state=tk.DISABLED)
+        self.board_wall_button.config(state=tk.DISABLED)
+        self.live_games_button.config(state=tk.DISABLED)
+        self.create_tournament_button.config(state=tk.DISABLED)
+        self.join_tournament_button.config(state=tk.DISABLED)
+        self.start_tournament_button.config(state=tk.DISABLED)
         self.resign_button.config(state=tk.DISABLED)
+        self.set_game_buttons(tk.DISABLED)
         self.send_button.config(state=tk.DISABLED)
     
     # Network related functions
     def connect_to_chat(self, is_lobby=False, is_game=False):
         """Connect to the chat server"""
         # Check if we have the necessary information
-        if not self.client_id:
+        if not self.session or not self.session.client_id:
             self.add_to_chat("System", "Not connected to server")
             return False
             
@@ -380,179 +534,84 @@ class ChessClientGUI:
                 self.add_to_chat("System", "Must be in a game or lobby to chat")
                 return False
         
-        try:
-            # Close any existing chat connection
-            if self.chat_socket:
-                try:
-                    self.chat_socket.close()
-                except:
-                    pass
-                    
-            self.chat_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.chat_socket.connect((self.host, self.chat_port))  # Use the chat port
-            
-            # Send initial data
-            initial_data = {
-                'client_id': self.client_id
-            }
-            
-            if is_game:
-                initial_data['type'] = 'game_chat'
-                initial_data['game_id'] = self.game_id
-                self.add_to_chat("System", f"Connected to game chat for game {self.game_id}")
-            elif is_lobby:
-                initial_data['type'] = 'lobby_chat'
-                initial_data['lobby_id'] = self.current_lobby_id
-                self.add_to_chat("System", f"Connected to lobby chat for lobby {self.current_lobby_id}")
-                
-            self.send_chat_message_to_server(initial_data)
-            
-            # Start listening for chat messages
-            chat_thread = threading.Thread(target=self.listen_for_chat_messages)
-            chat_thread.daemon = True
-            chat_thread.start()
-            
-            self.send_button.config(state=tk.NORMAL)
-            self.in_chat = True
-            
-            return True
-        except ConnectionRefusedError:
+        # Any existing chat connection is replaced
+        if is_game:
+            connected = self.session.connect_chat(game_id=self.game_id)
+            description = f"game chat for game {self.game_id}"
+        else:
+            connected = self.session.connect_chat(lobby_id=self.current_lobby_id)
+            description = f"lobby chat for lobby {self.current_lobby_id}"
+        
+        if not connected:
             error_msg = f"Failed to connect to chat server. Make sure the server is running on port {self.chat_port}."
             print(error_msg)
             self.add_to_chat("System", error_msg)
             return False
-        except Exception as e:
-            print(f"Failed to connect to chat server: {e}")
-            self.add_to_chat("System", f"Failed to connect to chat: {e}")
-            return False
+        
+        self.add_to_chat("System", f"Connected to {description}")
+        self.send_button.config(state=tk.NORMAL)
+        self.in_chat = True
+        return True
     
-    def send_game_message(self, message):
-        """Send a message to the game server"""
-        try:
-            data = json.dumps(message)
-            self.game_socket.sendall(data.encode())
-        except Exception as e:
-            print(f"Failed to send game message: {e}")
-            self.status_bar.config(text=f"Error: {e}")
+    def check_sent(self, sent):
+        """Report a request the session couldn't send"""
+        if not sent:
+            self.status_bar.config(text="Error: not connected to server")
+        return sent
     
-    def send_chat_message_to_server(self, message):
-        """Send a message to the chat server"""
-        if not self.chat_socket:
-            print("Not connected to chat")
-            return
-        
+    def schedule_ui(self, handler, message):
+        """Queue a message for the UI thread, which applies a frame's worth at a time"""
+        self.ui_queue.put((handler, message))
+        with self.ui_lock:
+            if self.ui_flush_pending:
+                return
+            self.ui_flush_pending = True
         try:
-            data = json.dumps(message)
-            self.chat_socket.sendall(data.encode())
+            # Use after() to handle UI updates from the main thread
+            self.root.after(UI_FRAME_MS, self.flush_ui_queue)
         except Exception as e:
-            print(f"Failed to send chat message: {e}")
+            print(f"Error scheduling UI update: {e}")
     
-    def extract_json_objects(self, text):
-        """Find and extract valid JSON objects from text"""
-        json_objects = []
-        decoder = json.JSONDecoder()
-        pos = 0
-        
-        while pos < len(text):
+    def flush_ui_queue(self):
+        """Apply everything received since the last frame, in order.
+        
+        Of the game states for one game only the newest is applied, so a
+        burst of moves costs one redraw instead of one each. A skipped state
+        may be the one that confirmed our move, so its move_sent_at is
+        carried on to the state that is shown.
+        """
+        with self.ui_lock:
+            self.ui_flush_pending = False
+        
+        batch = []
+        while True:
             try:
-                obj, pos = decoder.raw_decode(text, pos)
-                json_objects.append(obj)
-            except json.JSONDecodeError:
-                pos += 1  # Skip a character and try again
-                
-        return json_objects
+                batch.append(self.ui_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        # The session completes partial states, so each one stands alone
+        newest = {}  # game_id -> index of its last state in the batch
+        for index, (_, message) in enumerate(batch):
+            if message.get('type') == 'game_state':
+                newest[message.get('game_id')] = index
+        
+        sent_at = {}  # game_id -> move_sent_at of a skipped state
+        for index, (handler, message) in enumerate(batch):
+            if message.get('type') == 'game_state':
+                game_id = message.get('game_id')
+                if newest[game_id] != index:
+                    if 'move_sent_at' in message:
+                        sent_at[game_id] = message['move_sent_at']
+                    self.states_skipped += 1
+                    continue
+                if game_id in sent_at and 'move_sent_at' not in message:
+                    message['move_sent_at'] = sent_at.pop(game_id)
+            try:
+                handler(message)
+            except Exception as e:
+                print(f"Error handling message: {e}")
     
-    def listen_for_game_messages(self):
-        """Listen for messages from the game server"""
-        try:
-            self.receive_buffer = ""
-            while True:
-                data = self.game_socket.recv(8192).decode('utf-8', errors='replace')
-                if not data:
-                    print("Disconnected from game server")
-                    self.root.after(0, lambda: self.status_bar.config(text="Disconnected from server"))
-                    break
-                
-                # Add received data to buffer
-                self.receive_buffer += data
-                
-                # Extract valid JSON objects
-                json_objects = self.extract_json_objects(self.receive_buffer)
-                
-                # Process each complete JSON object
-                for obj in json_objects:
-                    try:
-                        # Use after() to handle UI updates from the main thread
-                        self.root.after(0, lambda m=obj: self.handle_game_message(m))
-                    except Exception as e:
-                        print(f"Error handling message: {e}")
-                
-                # Clean buffer - remove processed valid JSON
-                last_brace = self.receive_buffer.rfind('}')
-                if last_brace >= 0:
-                    self.receive_buffer = self.receive_buffer[last_brace+1:]
-                    
-                # Prevent buffer from growing too large
-                if len(self.receive_buffer) > 10000:
-                    print("Warning: Clearing large buffer with invalid data")
-                    self.receive_buffer = ""
-                
-        except Exception as e:
-            print(f"Game connection closed: {e}")
-            self.root.after(0, lambda: self.status_bar.config(text=f"Connection error: {e}"))
-        finally:
-            self.root.after(0, lambda: self.connect_button.config(text="Connect", command=self.handle_connect))
-            self.root.after(0, self.disable_all_buttons)
-    
-    def listen_for_chat_messages(self):
-        """Listen for messages from the chat server"""
-        try:
-            chat_buffer = ""
-            while True:
-                try:
-                    data = self.chat_socket.recv(4096).decode('utf-8', errors='replace')
-                    if not data:
-                        print("Disconnected from chat server")
-                        self.root.after(0, lambda: self.add_to_chat("System", "Disconnected from chat"))
-                        self.root.after(0, lambda: self.try_reconnect_chat())
-                        break
-                    
-                    # Add received data to buffer
-                    chat_buffer += data
-                    
-                    # Extract valid JSON objects
-                    json_objects = self.extract_json_objects(chat_buffer)
-                    
-                    # Process each complete JSON object
-                    for obj in json_objects:
-                        try:
-                            self.root.after(0, lambda m=obj: self.handle_chat_message(m))
-                        except Exception as e:
-                            print(f"Error handling chat message: {e}")
-                    
-                    # Clean buffer - remove processed valid JSON
-                    last_brace = chat_buffer.rfind('}')
-                    if last_brace >= 0:
-                        chat_buffer = chat_buffer[last_brace+1:]
-                        
-                    # Prevent buffer from growing too large
-                    if len(chat_buffer) > 10000:
-                        chat_buffer = ""
-                    
-                except socket.timeout:
-                    pass
-                except Exception as e:
-                    print(f"Error receiving from chat server: {e}")
-                    self.root.after(0, lambda: self.try_reconnect_chat())
-                    break
-                    
-        except Exception as e:
-            print(f"Chat connection closed: {e}")
-            self.root.after(0, lambda: self.add_to_chat("System", f"Chat error: {e}"))
-            self.root.after(0, lambda: self.try_reconnect_chat())
-        finally:
-            self.chat_socket = None
-
     def try_reconnect_chat(self):
         """Try to reconnect to chat if disconnected but still in a game or lobby"""
         if not self.in_chat:
@@ -567,9 +626,16 @@ class ChessClientGUI:
         """Process a message from the game server"""
         message_type = message.get('type')
         
+        # Games on the board wall never touch the main board
+        if self.board_wall and message.get('game_id') in self.board_wall.boards:
+            self.board_wall.handle_message(message)
+            return
+        
         if message_type == 'connection_ack':
-            self.client_id = message.get('client_id')
-            self.status_bar.config(text=message.get('message', 'Connected to server'))
+            status = message.get('message', 'Connected to server')
+            if message.get('rating') is not None:
+                status += f" (rating {message['rating']})"
+            self.status_bar.config(text=status)
             
             # Clear game ID display
             self.update_game_id_display("")
@@ -578,6 +644,7 @@ class ChessClientGUI:
             lobby_id = message.get('lobby_id')
             self.status_bar.config(text=f"Lobby created with ID: {lobby_id}")
             self.start_game_button.config(state=tk.NORMAL)
+            self.add_bot_button.config(state=tk.NORMAL)
             # Store the current lobby ID
             self.current_lobby_id = lobby_id
             
@@ -626,13 +693,17 @@ class ChessClientGUI:
         elif message_type == 'game_started':
             self.game_id = message.get('game_id')
             self.color = message.get('color', "")  # Default to empty string
+            self.premoves = []
             opponent = message.get('opponent', "Unknown")  # Default value
             color_display = self.color.capitalize() if self.color else "Unknown"
             game_msg = f"Game started! You are playing as {color_display} against {opponent}"
+            if message.get('resumed'):
+                game_msg = f"Game resumed after a server restart. You are playing as {color_display} against {opponent}"
             
             self.game_status.config(text=game_msg)
             self.status_bar.config(text=f"Playing as {color_display}")
             self.resign_button.config(state=tk.NORMAL)
+            self.set_game_buttons(tk.NORMAL)
             
             # Update game ID display
             self.update_game_id_display(self.game_id)
@@ -641,26 +712,48 @@ class ChessClientGUI:
             if not self.in_chat:
                 self.connect_to_chat(is_game=True)
                 
-        elif message_type == 'game_announcement':
-            # New game announcement for spectating
-            game_id = message.get('game_id')
-            white_player = message.get('white_player')
-            black_player = message.get('black_player')
-            
-            # Add to chat with spectate instructions
-            announcement = f"New game started: {white_player} (White) vs {black_player} (Black)"
-            self.add_to_chat("System", announcement)
-            self.add_to_chat("System", f"Game ID for spectating: {game_id}")
-            self.add_to_chat("System", "To spectate, enter the Game ID in the Spectate section and click 'Spectate'")
-            
-            # Pre-fill the game ID entry if not in a game
-            if not self.game_id and not self.current_lobby_id:
-                self.game_id_entry.delete(0, tk.END)
-                self.game_id_entry.insert(0, game_id)
+        elif message_type == 'games_list' or message_type == 'games_update':
+            # Live game directory pages, with updates while the window is open
+            if self.live_games:
+                self.live_games.show(message)
         
         elif message_type == 'game_state':
             self._update_game_state(message)
         
+        elif message_type == 'history_range':
+            # The session merged in the part of the history we asked for
+            if 'move_history' in message and message.get('game_id') == self.game_id:
+                self.known_history = message['move_history']
+                self.update_move_history(self.known_history)
+        
+        elif message_type == 'tournament_created':
+            self.current_tournament_id = message.get('tournament_id')
+            self.tournament_id_entry.delete(0, tk.END)
+            self.tournament_id_entry.insert(0, self.current_tournament_id)
+            self.start_tournament_button.config(state=tk.NORMAL)
+            self.status_bar.config(text=f"Tournament created with ID: {self.current_tournament_id}")
+        
+        elif message_type == 'tournament_joined':
+            self.current_tournament_id = message.get('tournament_id')
+            count = message.get('player_count')
+            self.status_bar.config(text=f"Tournament {self.current_tournament_id}: {count} players registered")
+        
+        elif message_type == 'tournament_round':
+            round_text = f"Round {message.get('round')}/{message.get('total_rounds')}"
+            if message.get('bye'):
+                self.add_to_chat("System", f"{round_text}: you have a bye this round")
+            elif message.get('forfeit'):
+                self.add_to_chat("System", f"{round_text}: forfeited ({message.get('reason')})")
+            else:
+                self.add_to_chat("System", f"{round_text}: playing {message.get('color')} against {message.get('opponent')}")
+        
+        elif message_type == 'tournament_finished':
+            self.add_to_chat("System", "Tournament finished. Final standings:")
+            for position, entry in enumerate(message.get('standings', []), 1):
+                self.add_to_chat("System", f"{position}. {entry.get('player')} - {entry.get('score')}")
+            self.current_tournament_id = None
+            self.start_tournament_button.config(state=tk.DISABLED)
+        
         elif message_type == 'game_over':
             result = message.get('result', '')
             winner = message.get('winner')
@@ -669,6 +762,12 @@ class ChessClientGUI:
             self.game_status.config(text=f"Game Over: {message_text}")
             self.status_bar.config(text=f"Game ended: {result}")
             self.resign_button.config(state=tk.DISABLED)
+            self.set_game_buttons(tk.DISABLED)
+            
+            # Rated games report both players' new ratings
+            ratings = message.get('ratings')
+            if ratings and self.color:
+                message_text += f"\nYour rating is now {ratings[self.color]}"
             
             # Show dialog with results
             messagebox.showinfo("Game Over", message_text)
@@ -676,6 +775,7 @@ class ChessClientGUI:
             # Reset game info but keep connection
             self.game_id = None
             self.color = None
+            self.premoves = []
             self.last_game_state = None
             self.your_turn = False
             self.enable_lobby_buttons()
@@ -687,18 +787,53 @@ class ChessClientGUI:
             if not self.current_lobby_id:
                 self.send_button.config(state=tk.DISABLED)
                 self.in_chat = False
-                if self.chat_socket:
-                    try:
-                        self.chat_socket.close()
-                        self.chat_socket = None
-                    except:
-                        pass
+                self.session.close_chat()
         
         elif message_type == 'error':
             error_msg = message.get('message', 'Unknown error')
+            # Games the server wouldn't follow don't keep their boards
+            if self.board_wall and message.get('game_ids'):
+                self.board_wall.remove(message['game_ids'])
+            # Only a rejected move takes back the move we're showing
+            if message.get('message_type') == 'move':
+                self.revert_pending_move()
             self.status_bar.config(text=f"Error: {error_msg}")
             messagebox.showerror("Error", error_msg)
         
+        elif message_type == 'draw_offered':
+            if message.get('by') == self.color:
+                self.status_bar.config(text="Draw offered")
+            else:
+                accept = messagebox.askyesno("Draw Offer", "Your opponent offers a draw. Do you accept?")
+                self.check_sent(self.session.answer_draw(accept, message.get('game_id')))
+        
+        elif message_type == 'draw_declined':
+            self.status_bar.config(text="Draw declined, play on")
+        
+        elif message_type == 'takeback_requested':
+            if message.get('by') == self.color:
+                self.status_bar.config(text="Takeback requested")
+            else:
+                accept = messagebox.askyesno("Takeback", "Your opponent asks to take back their last move. Do you agree?")
+                self.check_sent(self.session.answer_takeback(accept, message.get('game_id')))
+        
+        elif message_type == 'takeback_declined':
+            self.status_bar.config(text="Takeback declined")
+        
+        elif message_type == 'premoves':
+            if message.get('game_id') == self.game_id:
+                self.premoves = message.get('premoves', [])
+                if message.get('cancelled'):
+                    self.status_bar.config(
+                        text=f"Premove {message['cancelled']} cancelled: {message.get('reason', '')}")
+                self.draw_board()
+        
+        elif message_type == 'rate_limited':
+            # The server dropped some of our requests; no dialog for this
+            if message.get('message_type') == 'move':
+                self.revert_pending_move()
+            self.status_bar.config(text=message.get('message', 'Too many requests'))
+        
         elif message_type == 'spectating':
             self.game_id = message.get('game_id')
             white_player = message.get('white_player')
@@ -720,12 +855,28 @@ class ChessClientGUI:
                 self.send_button.config(state=tk.DISABLED)
                 self.current_lobby_id = None
                 self.in_chat = False
-                if self.chat_socket:
-                    try:
-                        self.chat_socket.close()
-                        self.chat_socket = None
-                    except:
-                        pass
+                self.session.close_chat()
+        
+        elif message_type == 'server_draining':
+            # No new games from here; we'll be dropped and reconnect later
+            self.server_restarting = True
+            self.status_bar.config(text="Server restarting: no new games for now")
+            self.add_to_chat("System", message.get('message', 'The server is restarting'))
+            for button in (self.create_lobby_button, self.join_lobby_button, self.start_game_button,
+                           self.add_bot_button, self.create_tournament_button,
+                           self.join_tournament_button, self.start_tournament_button):
+                button.config(state=tk.DISABLED)
+        
+        elif message_type == 'disconnected':
+            print("Disconnected from game server")
+            self.is_connected = False
+            self.status_bar.config(text=f"Disconnected from server: {message.get('message', '')}")
+            self.connect_button.config(text="Connect", command=self.handle_connect)
+            self.disable_all_buttons()
+            if self.server_restarting:
+                self.status_bar.config(text="Server restarting, reconnecting...")
+                self.reconnect_attempts = 0
+                self.root.after(RECONNECT_DELAY_MS, self.reconnect_after_restart)
     
     def _update_game_state(self, message):
         """Update the game state display"""
@@ -735,6 +886,8 @@ class ChessClientGUI:
         # Only process if it's a new state or if it's specifically your turn
         if state_hash != self.last_game_state or message.get('your_turn', False):
             self.last_game_state = state_hash
+            self.last_server_state = message
+            self.pending_move = None
             
             # Extract game state data
             self.board_fen = message.get('board_fen')
@@ -745,8 +898,9 @@ class ChessClientGUI:
             white_time = int(message.get('white_time', 0))
             black_time = int(message.get('black_time', 0))
             in_check = message.get('in_check', False)
-            self.legal_moves = message.get('legal_moves', [])
+            self.load_position(self.board_fen)
             move_history = message.get('move_history', [])
+            self.known_history = move_history
             
             # Update player names and times
             self.white_name.config(text=f"White: {white_player}")
@@ -771,17 +925,31 @@ class ChessClientGUI:
             if move_history:
                 self.update_move_history(move_history)
             
+            # Threefold repetition and the fifty-move rule are claimed, not automatic
+            if self.color and not message.get('game_over'):
+                self.claim_draw_button.config(state=tk.NORMAL if message.get('draw_claimable') else tk.DISABLED)
+            
             # Ensure chat is enabled during the game
             if self.game_id and not self.in_chat:
                 self.connect_to_chat(is_game=True)
             
-            # Show check status if applicable
+            # Show check status if applicable, without a blocking dialog
+            self.check_square = None
             if in_check:
+                king = self.board.king(self.board.turn)
+                if king is not None:
+                    self.check_square = chess.square_name(king)
                 check_str = "You are in check!" if self.your_turn else f"{self.current_turn.capitalize()} is in check!"
-                messagebox.showinfo("Check", check_str)
+                self.status_bar.config(text=check_str)
             
             # Redraw the board
             self.draw_board()
+            
+            # Time from sending our move to showing the position the server
+            # confirmed it in
+            if 'move_sent_at' in message:
+                self.display_latency.record(time.perf_counter() - message['move_sent_at'])
+                self.latency_label.config(text=f"Move latency: {self.display_latency}")
     
     def handle_chat_message(self, message):
         """Process a message from the chat server"""
@@ -804,6 +972,14 @@ class ChessClientGUI:
             self.add_to_chat("System", f"Error: {error_msg}")
             self.in_chat = False
             self.send_button.config(state=tk.DISABLED)
+            
+        elif message_type == 'rate_limited':
+            self.add_to_chat("System", message.get('message', 'Too many messages'))
+            
+        elif message_type == 'disconnected':
+            print("Disconnected from chat server")
+            self.add_to_chat("System", "Disconnected from chat")
+            self.try_reconnect_chat()
     
     def _create_game_state_hash(self, state):
         """Create a hash of the game state to detect duplicates"""
@@ -822,7 +998,7 @@ class ChessClientGUI:
             messagebox.showerror("Error", "Not connected to server")
             return
         
-        self.send_game_message({'type': 'create_lobby'})
+        self.check_sent(self.session.create_lobby())
         # Chat connection will be established when lobby is created confirmation is received
     
     def list_lobbies(self):
@@ -831,7 +1007,7 @@ class ChessClientGUI:
             messagebox.showerror("Error", "Not connected to server")
             return
         
-        self.send_game_message({'type': 'list_lobbies'})
+        self.check_sent(self.session.list_lobbies())
     
     def join_selected_lobby(self):
         """Join the currently selected lobby"""
@@ -847,7 +1023,7 @@ class ChessClientGUI:
             return
             
         lobby_id = self.lobby_ids[lobby_index]
-        self.send_game_message({'type': 'join_lobby', 'lobby_id': lobby_id})
+        self.check_sent(self.session.join_lobby(lobby_id))
         # Chat connection will be established when lobby join confirmation is received
     
     def start_game(self):
@@ -856,7 +1032,40 @@ class ChessClientGUI:
             messagebox.showerror("Error", "Not in a lobby")
             return
         
-        self.send_game_message({'type': 'start_game', 'lobby_id': self.current_lobby_id})
+        self.check_sent(self.session.start_game(self.current_lobby_id))
+    
+    def create_tournament(self):
+        """Create a new tournament with the selected format"""
+        if not self.is_connected:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        self.check_sent(self.session.create_tournament(self.tournament_format_combo.get()))
+    
+    def join_tournament(self):
+        """Register for the tournament whose ID was entered"""
+        tournament_id = self.tournament_id_entry.get()
+        if not tournament_id:
+            messagebox.showerror("Error", "Please enter a tournament ID")
+            return
+        
+        self.check_sent(self.session.join_tournament(tournament_id))
+    
+    def start_tournament(self):
+        """Start the tournament we are hosting"""
+        if not self.current_tournament_id:
+            messagebox.showerror("Error", "Not hosting a tournament")
+            return
+        
+        self.check_sent(self.session.start_tournament(self.current_tournament_id))
+    
+    def add_bot(self):
+        """Ask the server to seat a bot opponent in the current lobby"""
+        if not self.current_lobby_id:
+            messagebox.showerror("Error", "Not in a lobby")
+            return
+        
+        self.check_sent(self.session.add_bot(self.bot_level_combo.get(), self.current_lobby_id))
     
     def spectate_game(self):
         """Spectate a game by ID"""
@@ -865,7 +1074,30 @@ class ChessClientGUI:
             messagebox.showerror("Error", "Please enter a game ID")
             return
         
-        self.send_game_message({'type': 'spectate', 'game_id': game_id})
+        # The session only asks for the moves we don't already have
+        self.check_sent(self.session.spectate(game_id))
+    
+    def open_board_wall(self):
+        """Open the window that follows many games at once"""
+        if not self.is_connected:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        if self.board_wall:
+            self.board_wall.window.lift()
+        else:
+            self.board_wall = BoardWall(self)
+    
+    def open_live_games(self):
+        """Open the live game directory"""
+        if not self.is_connected:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        if self.live_games:
+            self.live_games.window.lift()
+        else:
+            self.live_games = LiveGamesWindow(self)
     
     def resign(self):
         """Resign the current game"""
@@ -875,7 +1107,29 @@ class ChessClientGUI:
         
         confirm = messagebox.askyesno("Confirm Resignation", "Are you sure you want to resign?")
         if confirm:
-            self.send_game_message({'type': 'resign', 'game_id': self.game_id})
+            self.check_sent(self.session.resign(self.game_id))
+    
+    def offer_draw(self):
+        """Offer the opponent a draw"""
+        if self.game_id:
+            self.check_sent(self.session.offer_draw(self.game_id))
+    
+    def claim_draw(self):
+        """Claim a draw by threefold repetition or the fifty-move rule"""
+        if self.game_id:
+            self.check_sent(self.session.claim_draw(self.game_id))
+    
+    def request_takeback(self):
+        """Ask the opponent to let us take back our last move"""
+        if self.game_id:
+            self.check_sent(self.session.request_takeback(self.game_id))
+    
+    def set_game_buttons(self, state):
+        """Enable or disable the draw and takeback buttons"""
+        self.draw_button.config(state=state)
+        self.takeback_button.config(state=state)
+        if state == tk.DISABLED:
+            self.claim_draw_button.config(state=tk.DISABLED)
     
     def send_chat_message(self, event=None):
         """Send a chat message"""
@@ -883,21 +1137,11 @@ class ChessClientGUI:
         if not message:
             return
         
-        if not self.chat_socket:
+        lobby_id = None if self.game_id else self.current_lobby_id
+        if not self.session or not self.session.chat(message, self.game_id, lobby_id):
             self.add_to_chat("System", "Not connected to chat")
             return
         
-        chat_data = {
-            'type': 'chat',
-            'text': message
-        }
-
-        if self.game_id:
-            chat_data['game_id'] = self.game_id
-        elif self.current_lobby_id:
-            chat_data['lobby_id'] = self.current_lobby_id
-        
-        self.send_chat_message_to_server(chat_data)
         self.chat_entry.delete(0, tk.END)
     
     # UI Helper Functions
@@ -915,26 +1159,71 @@ class ChessClientGUI:
         self.chat_display.config(state=tk.DISABLED)
     
     def update_move_history(self, moves):
-        """Update the move history display"""
+        """Update the move history display, rewriting only the moves that changed"""
+        rendered = self.rendered_moves
+        
+        # How many of the moves on screen are still right; normally all of them.
+        # Moves only get appended, so the ply count and last move settle it;
+        # a takeback or resync falls back to comparing from the start.
+        same = len(rendered)
+        if same and (len(moves) < same or moves[same - 1] != rendered[-1]):
+            same = 0
+            limit = min(len(rendered), len(moves))
+            while same < limit and rendered[same] == moves[same]:
+                same += 1
+        if same == len(rendered) == len(moves):
+            return
+        
         self.move_history.config(state=tk.NORMAL)
-        self.move_history.delete(1.0, tk.END)
+        del rendered[same:]
+        rendered.extend(moves[same:])
+        
+        if same < self.history_start:
+            # Resync reaching above the visible window: render the window afresh
+            self.move_history.delete(1.0, tk.END)
+            self.history_start = self._history_window_start(len(moves))
+            same = self.history_start
+        else:
+            # Takeback or resync: drop everything from the first changed ply
+            self.move_history.delete(self._history_index(moves, same), tk.END)
         
-        # Format moves nicely
-        for i, move in enumerate(moves):
+        # Format the new moves nicely
+        for i in range(same, len(moves)):
             move_num = i // 2 + 1
             if i % 2 == 0:  # White's move
-                self.move_history.insert(tk.END, f"{move_num}. {move} ")
+                self.move_history.insert(tk.END, f"{move_num}. {moves[i]} ")
             else:  # Black's move
-                self.move_history.insert(tk.END, f"{move}\n")
+                self.move_history.insert(tk.END, f"{moves[i]}\n")
+        
+        # Long games keep only a window of recent moves in the widget
+        if len(moves) - self.history_start > HISTORY_WINDOW_PLIES + HISTORY_TRIM_PLIES:
+            start = self._history_window_start(len(moves))
+            self.move_history.delete(1.0, f"{(start - self.history_start) // 2 + 1}.0")
+            self.history_start = start
         
         self.move_history.see(tk.END)
         self.move_history.config(state=tk.DISABLED)
     
+    def _history_window_start(self, plies):
+        """First ply to show for a history of this length, at the start of a full move"""
+        start = max(0, plies - HISTORY_WINDOW_PLIES)
+        return start - start % 2
+    
+    def _history_index(self, moves, ply):
+        """Text index where the given ply starts in the move history"""
+        line = (ply - self.history_start) // 2 + 1
+        if ply % 2 == 0:
+            return f"{line}.0"
+        # Black's move follows "N. <white move> " on the same line
+        return f"{line}.{len(f'{ply // 2 + 1}. {moves[ply - 1]} ')}"
+    
     def clear_move_history(self):
         """Clear the move history display"""
         self.move_history.config(state=tk.NORMAL)
         self.move_history.delete(1.0, tk.END)
         self.move_history.config(state=tk.DISABLED)
+        self.rendered_moves = []
+        self.history_start = 0
     
     def evaluate_position(self, fen):
         """Simple position evaluator - real eval would use an engine"""
@@ -958,98 +1247,147 @@ class ChessClientGUI:
             return "Even"
     
     # Chess Board Related Functions
+    def schedule_board_resize(self, event=None):
+        """Redraw after a resize, once the configure events stop coming"""
+        if self.resize_job:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(RESIZE_DEBOUNCE_MS, self._finish_board_resize)
+    
+    def _finish_board_resize(self):
+        self.resize_job = None
+        self.draw_board()
+    
     def draw_board(self, event=None):
-        """Draw the chess board on the canvas"""
-        self.board_canvas.delete("all")
-        
-        # Calculate board dimensions
+        """Bring the chess board on the canvas up to date.
+        
+        Items are created on the first call. After that only the squares
+        whose color or piece changed are touched, and coordinates are only
+        recalculated when the size or orientation changed.
+        """
+        if not self.square_items:
+            self._create_board_items()
+        
+        self._layout_board()
+        
+        # Squares touched by queued premoves
+        premove_squares = set()
+        for move in self.premoves:
+            premove_squares.update((move[:2], move[2:4]))
+        
+        # Square colors
+        for square, item in self.square_items.items():
+            if square == self.selected_square:
+                color = SELECTED_SQUARE  # Highlight selected square
+            elif square in self.valid_targets:
+                color = TARGET_SQUARE  # Highlight valid move targets
+            elif square in premove_squares:
+                color = PREMOVE_SQUARE  # Part of a queued premove
+            elif square == self.check_square:
+                color = CHECK_SQUARE  # King in check
+            else:
+                # Light squares are those where file and rank differ in parity
+                file_index = ord(square[0]) - 97
+                rank_index = int(square[1]) - 1
+                color = LIGHT_SQUARE if (file_index + rank_index) % 2 else DARK_SQUARE
+            
+            if self.drawn_colors.get(square) != color:
+                self.board_canvas.itemconfig(item, fill=color)
+                self.drawn_colors[square] = color
+        
+        # Pieces
+        pieces = self._fen_pieces(self.board_fen) if self.board_fen else {}
+        for square, item in self.piece_items.items():
+            piece = pieces.get(square, '')
+            if self.drawn_pieces.get(square) != piece:
+                self.board_canvas.itemconfig(item, text=UNICODE_PIECES.get(piece, ''))
+                self.drawn_pieces[square] = piece
+    
+    def _create_board_items(self):
+        """Create the canvas items for squares, labels and pieces"""
+        for rank in range(1, 9):
+            for file in 'abcdefgh':
+                square = f"{file}{rank}"
+                self.square_items[square] = self.board_canvas.create_rectangle(0, 0, 0, 0, outline="")
+        
+        for _ in range(8):
+            self.rank_label_items.append(self.board_canvas.create_text(
+                0, 0, anchor=tk.NW, fill="#333333", font=("Arial", 8)))
+            self.file_label_items.append(self.board_canvas.create_text(
+                0, 0, anchor=tk.SE, fill="#333333", font=("Arial", 8)))
+        
+        # Pieces last so they sit above the squares and labels
+        for square in self.square_items:
+            self.piece_items[square] = self.board_canvas.create_text(0, 0, text="", fill="#000000")
+        
+        self.drawn_colors = {}
+        self.drawn_pieces = {}
+        self.board_layout = None
+    
+    def _layout_board(self):
+        """Position every item if the board size or orientation changed"""
+        # Make board square by using the smaller dimension, and center it
         canvas_width = self.board_canvas.winfo_width()
         canvas_height = self.board_canvas.winfo_height()
+        square_size = min(canvas_width, canvas_height) // 8
+        offset_x = (canvas_width - (square_size * 8)) // 2
+        offset_y = (canvas_height - (square_size * 8)) // 2
+        flipped = self.color == 'black'
         
-        # Make board square by using the smaller dimension
-        size = min(canvas_width, canvas_height)
-        self.square_size = size // 8
-        
-        # Center the board
-        offset_x = (canvas_width - (self.square_size * 8)) // 2
-        offset_y = (canvas_height - (self.square_size * 8)) // 2
-        
-        # Draw squares
-        for row in range(8):
-            for col in range(8):
-                x1 = offset_x + col * self.square_size
-                y1 = offset_y + row * self.square_size
-                x2 = x1 + self.square_size
-                y2 = y1 + self.square_size
-                
-                # Choose color: light squares are even, dark are odd
-                color = "#EEEED2" if (row + col) % 2 == 0 else "#769656"
-                
-                # Check if this square is selected
-                if self.selected_square == self._get_square_name(row, col):
-                    color = "#BBCC44"  # Highlight selected square
-                
-                # Check if this square is a valid target
-                elif self._get_square_name(row, col) in self.valid_targets:
-                    color = "#AABBFF"  # Highlight valid move targets
-                
-                # Draw the square
-                self.board_canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="")
-                
-                # Add coordinate labels
-                if col == 0:  # Rank numbers
-                    rank = 8 - row if self.color != 'black' else row + 1
-                    self.board_canvas.create_text(x1 + 5, y1 + 5, text=str(rank),
-                                                 anchor=tk.NW, fill="#333333", font=("Arial", 8))
-                
-                if row == 7:  # File letters
-                    file = chr(97 + col) if self.color != 'black' else chr(104 - col)
-                    self.board_canvas.create_text(x2 - 5, y2 - 5, text=file,
-                                                anchor=tk.SE, fill="#333333", font=("Arial", 8))
-        
-        # Draw pieces if we have a board state
-        if self.board_fen:
-            self._draw_pieces(offset_x, offset_y)
-    
-    def _draw_pieces(self, offset_x, offset_y):
-        """Draw chess pieces on the board"""
-        # Parse FEN into a board representation
-        rows = self.board_fen.split('/') if '/' in self.board_fen else self.board_fen.split(' ')[0].split('/')
-        
-        # Adjust the order based on player color
-        board_rows = rows if self.color != 'black' else list(reversed(rows))
-        
-        # Draw each piece
-        for row_idx, row_data in enumerate(board_rows):
-            col_idx = 0
+        layout = (square_size, offset_x, offset_y, flipped)
+        if layout == self.board_layout:
+            return
+        self.board_layout = layout
+        self.square_size = square_size
+        
+        font = ("Arial", max(int(square_size * 0.8), 1))
+        for square, item in self.square_items.items():
+            x1, y1 = self._square_origin(square)
+            self.board_canvas.coords(item, x1, y1, x1 + square_size, y1 + square_size)
+            self.board_canvas.coords(self.piece_items[square], x1 + square_size // 2, y1 + square_size // 2)
+            self.board_canvas.itemconfig(self.piece_items[square], font=font)
+        
+        # Coordinate labels
+        for index in range(8):
+            rank = 8 - index if not flipped else index + 1
+            self.board_canvas.coords(self.rank_label_items[index],
+                                     offset_x + 5, offset_y + index * square_size + 5)
+            self.board_canvas.itemconfig(self.rank_label_items[index], text=str(rank))
+            
+            file = chr(97 + index) if not flipped else chr(104 - index)
+            self.board_canvas.coords(self.file_label_items[index],
+                                     offset_x + (index + 1) * square_size - 5, offset_y + 8 * square_size - 5)
+            self.board_canvas.itemconfig(self.file_label_items[index], text=file)
+    
+    def _square_origin(self, square):
+        """Top left corner of a square on the canvas, for the current layout"""
+        square_size, offset_x, offset_y, flipped = self.board_layout
+        col = ord(square[0]) - 97
+        row = 8 - int(square[1])
+        
+        # Adjust for black's perspective
+        if flipped:
+            col = 7 - col
+            row = 7 - row
+        return offset_x + col * square_size, offset_y + row * square_size
+    
+    def _fen_pieces(self, fen):
+        """Get square name -> piece letter from the board part of a FEN"""
+        pieces = {}
+        for row, row_data in enumerate(fen.split(' ')[0].split('/')):
+            col = 0
             for char in row_data:
                 if char.isdigit():
                     # Skip empty squares
-                    col_idx += int(char)
+                    col += int(char)
                 else:
-                    # Draw piece
-                    x = offset_x + (col_idx * self.square_size) + (self.square_size // 2)
-                    y = offset_y + (row_idx * self.square_size) + (self.square_size // 2)
-                    
-                    # Adjust position if board is flipped for black
-                    if self.color == 'black':
-                        x = offset_x + ((7 - col_idx) * self.square_size) + (self.square_size // 2)
-                    
-                    # Get Unicode symbol for piece
-                    piece_symbol = UNICODE_PIECES.get(char, '')
-                    
-                    if piece_symbol:
-                        font_size = int(self.square_size * 0.8)
-                        self.board_canvas.create_text(x, y, text=piece_symbol,
-                                                    font=("Arial", font_size),
-                                                    fill="#000000" if char.isupper() else "#000000")
-                    
-                    col_idx += 1
+                    pieces[self._get_square_name(row, col)] = char
+                    col += 1
+        return pieces
     
     def board_click(self, event):
         """Handle clicks on the chess board"""
-        if not self.game_id or not self.your_turn:
-            return  # Not in a game or not your turn
+        if not self.game_id or not (self.your_turn or self.can_premove()):
+            return  # Not in a game, or spectating someone else's turn
         
         # Calculate board dimensions and offsets
         canvas_width = self.board_canvas.winfo_width()
@@ -1077,85 +1415,135 @@ class ChessClientGUI:
         # Convert to algebraic notation
         square = self._get_square_name(row, col)
         
+        # During the opponent's turn clicks queue premoves
+        if not self.your_turn:
+            self.premove_click(square)
+            return
+        
         # Handle piece selection or move
-        if not self.selected_square:
-            # Check if the clicked square has a legal move
-            has_moves = any(move.startswith(square) for move in self.legal_moves)
-            if has_moves:
-                self.selected_square = square
-                # Find valid target squares
-                self.valid_targets = []
-                for move in self.legal_moves:
-                    if move.startswith(square):
-                        target = move[2:4]  # e.g., "e2e4" -> "e4"
-                        self.valid_targets.append(target)
-                
-                self.draw_board()  # Redraw to highlight selection
-        else:
-            # Trying to make a move
-            move = f"{self.selected_square}{square}"
-            
-            # Check if this is a standard move or needs promotion
-            is_promotion = False
-            for legal_move in self.legal_moves:
-                # Check if base move matches
-                if legal_move.startswith(move):
-                    # Check if it's a promotion move (has extra character)
-                    if len(legal_move) > 4:
-                        is_promotion = True
-                        break
-            
-            if is_promotion:
+        targets = self.moves_by_square.get(self.selected_square, {}).get(square)
+        if targets:
+            move = targets[0]
+            if len(targets) > 1:
                 # Ask user for promotion piece
-                promotion_pieces = ['q', 'r', 'n', 'b']
                 promotion = simpledialog.askstring(
                     "Promotion", 
                     "Choose promotion piece (q=Queen, r=Rook, n=Knight, b=Bishop):",
                     parent=self.root
                 )
                 
-                if promotion and promotion.lower() in promotion_pieces:
-                    move += promotion.lower()
-                else:
-                    # Default to queen if invalid or canceled
-                    move += 'q'
+                # Default to queen if invalid or canceled
+                chosen = move[:4] + (promotion or '').lower()[:1]
+                move = chosen if chosen in targets else move[:4] + 'q'
             
-            # Check if move is legal
-            for legal_move in self.legal_moves:
-                if legal_move.startswith(move):
-                    # Send move to server
-                    self.send_game_message({
-                        'type': 'move',
-                        'game_id': self.game_id,
-                        'move': move
-                    })
-                    
-                    # Clear selection
-                    self.selected_square = None
-                    self.valid_targets = []
-                    self.draw_board()
-                    return
+            self.play_move(move)
             
-            # If we got here, either:
-            # 1. The move was not legal
-            # 2. User clicked another of their pieces to select it instead
+        elif square in self.moves_by_square:
+            # Select a piece that can move and highlight its targets
+            self.selected_square = square
+            self.valid_targets = list(self.moves_by_square[square])
+            self.draw_board()
             
-            # Check if new square is a valid starting square
-            has_moves = any(move.startswith(square) for move in self.legal_moves)
-            if has_moves:
+        else:
+            # Clear selection if clicking invalid target
+            self.selected_square = None
+            self.valid_targets = []
+            self.draw_board()
+    
+    def load_position(self, fen):
+        """Rebuild the local board from a FEN and index our legal moves"""
+        self.moves_by_square = {}
+        try:
+            self.board = chess.Board(fen)
+        except (TypeError, ValueError):
+            self.board = chess.Board()
+            return
+        
+        if self.your_turn:
+            for move in self.board.legal_moves:
+                uci = move.uci()
+                self.moves_by_square.setdefault(uci[:2], {}).setdefault(uci[2:4], []).append(uci)
+    
+    def play_move(self, move_uci):
+        """Send a move and show it right away, before the server confirms it"""
+        if not self.check_sent(self.session.move(move_uci, self.game_id)):
+            return  # The server never got it, so the board stays as it was
+        
+        # Apply it to the local model; the next game_state replaces this
+        # with the server's position, and an error puts the old one back
+        move = chess.Move.from_uci(move_uci)
+        san = self.board.san(move)
+        self.board.push(move)
+        self.pending_move = move_uci
+        self.board_fen = self.board.fen()
+        king = self.board.king(self.board.turn)
+        self.check_square = chess.square_name(king) if self.board.is_check() and king is not None else None
+        self.your_turn = False
+        self.moves_by_square = {}
+        self.selected_square = None
+        self.valid_targets = []
+        
+        self.known_history = self.known_history + [san]
+        self.update_move_history(self.known_history)
+        self.current_turn = 'white' if self.board.turn == chess.WHITE else 'black'
+        self.turn_label.config(text=f"Turn: {self.current_turn.capitalize()}")
+        self.status_bar.config(text=f"Waiting for {self.current_turn}")
+        self.draw_board()
+    
+    def revert_pending_move(self):
+        """Put back the last position the server sent after a rejected move"""
+        if self.pending_move and self.last_server_state:
+            self.pending_move = None
+            self.last_game_state = None
+            self._update_game_state(self.last_server_state)
+    
+    def can_premove(self):
+        """Check if we're playing (not spectating) an ongoing game"""
+        return self.color in ('white', 'black') and bool(self.board_fen)
+    
+    def premove_click(self, square):
+        """Select a piece or target square for a premove"""
+        pieces = self._premove_pieces()
+        
+        if not self.selected_square:
+            piece = pieces.get(square)
+            if piece and piece.isupper() == (self.color == 'white'):
                 self.selected_square = square
-                # Find valid target squares
-                self.valid_targets = []
-                for move in self.legal_moves:
-                    if move.startswith(square):
-                        target = move[2:4]  # e.g., "e2e4" -> "e4"
-                        self.valid_targets.append(target)
-            else:
-                # Clear selection if clicking invalid target
-                self.selected_square = None
                 self.valid_targets = []
-            
-            self.draw_board()  # Redraw board
+                self.draw_board()
+            return
+        
+        if square == self.selected_square:
+            self.selected_square = None
+            self.draw_board()
+            return
+        
+        # Premoves can't wait for a dialog, so pawns reaching the last rank
+        # always become queens
+        move = f"{self.selected_square}{square}"
+        if pieces.get(self.selected_square, '').lower() == 'p' and square[1] in '18':
+            move += 'q'
+        
+        self.check_sent(self.session.premove(move, self.game_id))
+        self.selected_square = None
+        self.draw_board()
+    
+    def _premove_pieces(self):
+        """Get square -> piece for the current position with premoves applied"""
+        pieces = self._fen_pieces(self.board_fen)
+        for move in self.premoves:
+            piece = pieces.pop(move[:2], None)
+            if piece:
+                pieces[move[2:4]] = piece
+        return pieces
+    
+    def cancel_premoves(self, event=None):
+        """Drop the current selection and any queued premoves"""
+        if self.premoves and self.game_id:
+            self.check_sent(self.session.cancel_premoves(self.game_id))
+        if not self.your_turn and self.selected_square:
+            self.selected_square = None
+            self.draw_board()
     
     def _get_square_name(self, row, col):
         """Convert row and column to algebraic notation (e.g., 'e4')"""
@@ -1187,6 +1575,343 @@ class ChessClientGUI:
         else:
             self.copy_id_button.config(state=tk.DISABLED)
 
+class LiveGamesWindow:
+    """Browsable list of games in progress, kept up to date while open.
+    
+    Opening the window subscribes to one page of the server's live game
+    directory; changing the order or page moves the subscription, and
+    closing it unsubscribes, so updates only flow while someone looks.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.offset = 0
+        self.total = 0
+        self.game_ids = []  # game_id of each listbox row
+        
+        self.window = tk.Toplevel(client.root)
+        self.window.title("Live Games")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        controls = ttk.Frame(self.window)
+        controls.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(controls, text="Sort by:").pack(side=tk.LEFT, padx=5)
+        self.sort_combo = ttk.Combobox(controls, values=GAME_SORTS, width=12, state="readonly")
+        self.sort_combo.set(GAME_SORTS[0])
+        self.sort_combo.bind("<<ComboboxSelected>>", lambda event: self.subscribe(0))
+        self.sort_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="< Prev", command=lambda: self.subscribe(self.offset - GAMES_PAGE_SIZE)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(controls, text="Next >", command=lambda: self.subscribe(self.offset + GAMES_PAGE_SIZE)).pack(side=tk.LEFT, padx=2)
+        self.page_label = ttk.Label(controls, text="")
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        
+        self.games_listbox = tk.Listbox(self.window, width=80, height=GAMES_PAGE_SIZE, selectmode=tk.EXTENDED)
+        self.games_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.games_listbox.bind("<Double-Button-1>", lambda event: self.spectate_selected())
+        
+        actions = ttk.Frame(self.window)
+        actions.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(actions, text="Spectate", command=self.spectate_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(actions, text="Add to Board Wall", command=self.add_selected_to_wall).pack(side=tk.LEFT, padx=5)
+        
+        self.subscribe(0)
+    
+    def subscribe(self, offset):
+        """Show (and follow) the page of the chosen order starting at offset"""
+        self.offset = max(0, min(offset, max(self.total - 1, 0) // GAMES_PAGE_SIZE * GAMES_PAGE_SIZE))
+        self.client.check_sent(self.client.session.subscribe_games(self.sort_combo.get(), self.offset, GAMES_PAGE_SIZE))
+    
+    def show(self, message):
+        """Show a page received from the server"""
+        self.total = message.get('total', 0)
+        self.offset = message.get('offset', 0)
+        games = message.get('games', [])
+        
+        # Keep the selection across updates of the same page
+        selected = {self.game_ids[index] for index in self.games_listbox.curselection() if index < len(self.game_ids)}
+        self.games_listbox.delete(0, tk.END)
+        self.game_ids = []
+        for entry in games:
+            details = [f"{entry.get('spectators', 0)} watching"]
+            if entry.get('ply') is not None:
+                details.append(f"move {entry['ply'] // 2 + 1}")
+            if entry.get('rating') is not None:
+                details.append(f"rating {entry['rating']}")
+            if entry.get('tournament'):
+                details.append("tournament")
+            self.games_listbox.insert(tk.END, f"{entry.get('white_player')} vs {entry.get('black_player')} ({', '.join(details)})")
+            if entry['game_id'] in selected:
+                self.games_listbox.selection_set(len(self.game_ids))
+            self.game_ids.append(entry['game_id'])
+        
+        if not games:
+            self.games_listbox.insert(tk.END, "No games in progress")
+        last = min(self.offset + len(games), self.total)
+        self.page_label.config(text=f"{self.offset + 1 if games else 0}-{last} of {self.total}")
+    
+    def selected_ids(self):
+        """Get the game IDs of the selected rows"""
+        return [self.game_ids[index] for index in self.games_listbox.curselection() if index < len(self.game_ids)]
+    
+    def spectate_selected(self):
+        """Spectate the first selected game on the main board"""
+        game_ids = self.selected_ids()
+        if game_ids:
+            self.client.game_id_entry.delete(0, tk.END)
+            self.client.game_id_entry.insert(0, game_ids[0])
+            self.client.spectate_game()
+    
+    def add_selected_to_wall(self):
+        """Follow the selected games on the board wall"""
+        game_ids = self.selected_ids()
+        if game_ids:
+            self.client.open_board_wall()
+            if self.client.board_wall:
+                self.client.board_wall.follow(game_ids)
+    
+    def close(self):
+        """Stop the directory updates and close the window"""
+        if self.client.session:
+            self.client.session.unsubscribe_games()
+        self.client.live_games = None
+        self.window.destroy()
+
+class MiniBoard:
+    """One miniature board on the board wall, updated in place like the main board"""
+    def __init__(self, canvas, game_id, x, y, font):
+        self.canvas = canvas
+        self.game_id = game_id
+        self.x = x
+        self.y = y
+        self.square_items = {}  # square name -> rectangle item
+        self.piece_items = {}  # square name -> text item
+        self.drawn_pieces = {}  # square name -> FEN piece letter currently shown
+        self.check_square = None
+        self.players = game_id[:8]
+        self.result = None  # Set once the game is over
+        self.caption_text = None
+        
+        centers = {}
+        for rank in range(1, 9):
+            for file_index, file in enumerate('abcdefgh'):
+                square = f"{file}{rank}"
+                x1 = x + file_index * WALL_SQUARE
+                y1 = y + (8 - rank) * WALL_SQUARE
+                self.square_items[square] = canvas.create_rectangle(
+                    x1, y1, x1 + WALL_SQUARE, y1 + WALL_SQUARE, fill=self._square_color(square), outline="")
+                centers[square] = (x1 + WALL_SQUARE // 2, y1 + WALL_SQUARE // 2)
+        
+        # Pieces last so they sit above the squares
+        for square, (center_x, center_y) in centers.items():
+            self.piece_items[square] = canvas.create_text(center_x, center_y, text="", font=font, fill="#000000")
+        
+        self.caption = canvas.create_text(x, y + 8 * WALL_SQUARE + 3, anchor=tk.NW, width=8 * WALL_SQUARE,
+                                          font=("Arial", 8), fill="#333333")
+        self.set_caption("Waiting for the game...")
+    
+    def _square_color(self, square):
+        """Plain color of a square"""
+        file_index = ord(square[0]) - 97
+        rank_index = int(square[1]) - 1
+        return LIGHT_SQUARE if (file_index + rank_index) % 2 else DARK_SQUARE
+    
+    def items(self):
+        """Every canvas item making up this board"""
+        return list(self.square_items.values()) + list(self.piece_items.values()) + [self.caption]
+    
+    def move_to(self, x, y):
+        """Move the whole board to a new cell of the wall"""
+        if (x, y) != (self.x, self.y):
+            for item in self.items():
+                self.canvas.move(item, x - self.x, y - self.y)
+            self.x, self.y = x, y
+    
+    def destroy(self):
+        """Take the board off the canvas"""
+        for item in self.items():
+            self.canvas.delete(item)
+    
+    def set_caption(self, status):
+        """Show the players and a status line under the board"""
+        text = f"{self.players}\n{self.result or status}"
+        if text != self.caption_text:
+            self.canvas.itemconfig(self.caption, text=text)
+            self.caption_text = text
+    
+    def update(self, state, pieces):
+        """Show a game state, touching only the squares that changed"""
+        # Pieces
+        for square, item in self.piece_items.items():
+            piece = pieces.get(square, '')
+            if self.drawn_pieces.get(square) != piece:
+                self.canvas.itemconfig(item, text=UNICODE_PIECES.get(piece, ''))
+                self.drawn_pieces[square] = piece
+        
+        # Only the king in check is ever highlighted
+        turn = state.get('turn', 'white')
+        check_square = None
+        if state.get('in_check'):
+            king = 'K' if turn == 'white' else 'k'
+            check_square = next((square for square, piece in pieces.items() if piece == king), None)
+        if check_square != self.check_square:
+            if self.check_square:
+                self.canvas.itemconfig(self.square_items[self.check_square], fill=self._square_color(self.check_square))
+            if check_square:
+                self.canvas.itemconfig(self.square_items[check_square], fill=CHECK_SQUARE)
+            self.check_square = check_square
+        
+        self.players = f"{state.get('white_player', '?')} vs {state.get('black_player', '?')}"
+        status = f"{turn.capitalize()} to move, ply {state.get('ply', len(state.get('move_history', [])))}"
+        self.set_caption(status + (" - check" if check_square else ""))
+
+class BoardWall:
+    """Window following many games at once over the client's one connection.
+    
+    Every game gets a miniature board on a single shared canvas, and all
+    boards draw their pieces with one shared font. States arriving together
+    are collapsed to the newest per game before anything is drawn. Boards
+    are removed with a right click or all finished ones at once, and
+    finished games give up their boards to new ones when the wall is full.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.boards = {}  # game_id -> MiniBoard
+        self.dirty = {}  # game_id -> newest game_state not drawn yet
+        self.redraw_pending = False
+        
+        self.window = tk.Toplevel(client.root)
+        self.window.title("Board Wall")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        controls = ttk.Frame(self.window)
+        controls.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(controls, text="Game IDs:").pack(side=tk.LEFT, padx=5)
+        self.ids_entry = ttk.Entry(controls, width=60)
+        self.ids_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.ids_entry.bind("<Return>", self.follow_entered)
+        ttk.Button(controls, text="Follow", command=self.follow_entered).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Remove Finished", command=self.remove_finished).pack(side=tk.LEFT, padx=5)
+        self.count_label = ttk.Label(controls, text="No games")
+        self.count_label.pack(side=tk.LEFT, padx=5)
+        
+        self.width = WALL_COLUMNS * (8 * WALL_SQUARE + WALL_GAP) + WALL_GAP
+        self.canvas = tk.Canvas(self.window, width=self.width, height=600, bg="white")
+        scrollbar = ttk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.canvas.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.config(yscrollcommand=scrollbar.set)
+        self.canvas.bind("<Button-3>", self.remove_clicked)
+        
+        # Shared by every piece on every board
+        self.piece_font = tkfont.Font(root=self.window, family="Arial", size=-int(WALL_SQUARE * 0.8))
+    
+    def follow_entered(self, event=None):
+        """Follow the games whose IDs were pasted into the entry"""
+        game_ids = re.findall(UUID_PATTERN, self.ids_entry.get())
+        if not game_ids:
+            messagebox.showerror("Error", "Please enter one or more game IDs", parent=self.window)
+            return
+        self.follow(game_ids)
+        self.ids_entry.delete(0, tk.END)
+    
+    def follow(self, game_ids):
+        """Add boards for games and subscribe to them in one request"""
+        # The game on the main board stays there
+        new_ids = [game_id for game_id in dict.fromkeys(game_ids)
+                   if game_id not in self.boards and game_id != self.client.game_id]
+        
+        # Finished games make way for new ones once the wall is full
+        overflow = len(self.boards) + len(new_ids) - MAX_WALL_BOARDS
+        if overflow > 0:
+            self.remove([game_id for game_id, board in self.boards.items() if board.result][:overflow])
+        new_ids = new_ids[:MAX_WALL_BOARDS - len(self.boards)]
+        if not new_ids:
+            return
+        
+        for game_id in new_ids:
+            self.boards[game_id] = MiniBoard(self.canvas, game_id, *self.cell_origin(len(self.boards)),
+                                             self.piece_font)
+        self.layout()
+        self.client.check_sent(self.client.session.watch(new_ids))
+    
+    def remove(self, game_ids):
+        """Take games off the wall and stop following them"""
+        removed = [game_id for game_id in game_ids if game_id in self.boards]
+        if not removed:
+            return
+        for game_id in removed:
+            self.boards.pop(game_id).destroy()
+            self.dirty.pop(game_id, None)
+        if self.client.session:
+            self.client.session.unwatch(removed)
+        self.layout()
+    
+    def remove_finished(self):
+        """Take every finished game off the wall"""
+        self.remove([game_id for game_id, board in self.boards.items() if board.result])
+    
+    def remove_clicked(self, event):
+        """Take the board under a right click off the wall"""
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        for game_id, board in self.boards.items():
+            if board.x <= x < board.x + 8 * WALL_SQUARE and board.y <= y < board.y + 8 * WALL_SQUARE + WALL_CAPTION:
+                self.remove([game_id])
+                return
+    
+    def cell_origin(self, index):
+        """Top left corner of the wall's index-th cell"""
+        cell_width = 8 * WALL_SQUARE + WALL_GAP
+        cell_height = 8 * WALL_SQUARE + WALL_CAPTION + WALL_GAP
+        return (WALL_GAP + (index % WALL_COLUMNS) * cell_width,
+                WALL_GAP + (index // WALL_COLUMNS) * cell_height)
+    
+    def layout(self):
+        """Pack the boards into the wall's cells, in the order they were added"""
+        for index, board in enumerate(self.boards.values()):
+            board.move_to(*self.cell_origin(index))
+        
+        rows = (len(self.boards) + WALL_COLUMNS - 1) // WALL_COLUMNS
+        cell_height = 8 * WALL_SQUARE + WALL_CAPTION + WALL_GAP
+        self.canvas.config(scrollregion=(0, 0, self.width, rows * cell_height + WALL_GAP))
+        self.count_label.config(text=f"{len(self.boards)} games" if self.boards else "No games")
+    
+    def handle_message(self, message):
+        """Take a message about one of the wall's games"""
+        board = self.boards[message['game_id']]
+        message_type = message.get('type')
+        
+        if message_type == 'game_state':
+            self.dirty[board.game_id] = message
+            if not self.redraw_pending:
+                # Draw once the whole frame's messages have been taken
+                self.redraw_pending = True
+                self.client.root.after_idle(self.redraw)
+        
+        elif message_type == 'spectating':
+            board.players = f"{message.get('white_player')} vs {message.get('black_player')}"
+            board.set_caption("Waiting for the game...")
+        
+        elif message_type == 'game_over':
+            board.result = f"Game over: {message.get('result')}"
+            if message.get('winner'):
+                board.result += f", {message['winner']} wins"
+            board.set_caption("")
+    
+    def redraw(self):
+        """Draw the newest state of every game that changed"""
+        self.redraw_pending = False
+        dirty, self.dirty = self.dirty, {}
+        for game_id, state in dirty.items():
+            board = self.boards.get(game_id)
+            if board:
+                board.update(state, self.client._fen_pieces(state.get('board_fen') or '8/8/8/8/8/8/8/8'))
+    
+    def close(self):
+        """Unsubscribe from every game and close the window"""
+        if self.boards and self.client.session:
+            self.client.session.unwatch(list(self.boards))
+        self.client.board_wall = None
+        self.window.destroy()
+
 def main():
     root = tk.Tk()
     app = ChessClientGUI(root)
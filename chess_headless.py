@@ -0,0 +1,682 @@
+
+import abc
+import asyncio
+import collections
+import inspect
+import json
+import logging
+import socket
+import threading
+import time
+import chess
+from chess_protocol import (ENCODING_JSON, SUPPORTED_COMPRESSIONS, SUPPORTED_ENCODINGS, MessageDecoder,
+                            ProtocolError, StreamDecompressor, encode_message, history_digest)
+
+# Failures are reported through logging, so scripts and tests choose what
+# they see; a lost connection also reaches listeners as 'disconnected'
+logger = logging.getLogger(__name__)
+
+# Messages arrive on one of two connections; listeners subscribe per channel
+GAME = 'game'
+CHAT = 'chat'
+
+# Register a listener for this type to receive every message on a channel
+ANY = '*'
+
+# Received messages kept for wait_for(), per session. Scripts and tests that
+# only use listeners can pass inbox_size=0 to keep nothing.
+INBOX_SIZE = 64
+WAIT_TIMEOUT = 10.0
+
+RECV_SIZE = 8192
+
+# The server is trusted to send messages of any size: a long game's state and
+# history can outgrow any fixed cap, and dropping one would desync the session
+SERVER_MESSAGE_LIMIT = None
+
+# Move latencies kept for the percentiles
+RECENT_LATENCIES = 200
+
+class LatencyStats:
+    """Running figures for one kind of latency, in seconds"""
+    def __init__(self, recent=RECENT_LATENCIES):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.recent = collections.deque(maxlen=recent)
+
+    def record(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.worst = max(self.worst, elapsed)
+        self.recent.append(elapsed)
+
+    def percentile(self, fraction):
+        """Latency below which this fraction of the recent samples fall"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def __str__(self):
+        if not self.count:
+            return "no samples"
+        return (f"{self.total / self.count * 1000:.0f}ms avg, {self.percentile(0.5) * 1000:.0f}ms p50, "
+                f"{self.percentile(0.95) * 1000:.0f}ms p95, {self.worst * 1000:.0f}ms max ({self.count})")
+
+class ClientSession(abc.ABC):
+    """Connection state, game tracking and requests shared by both session kinds.
+
+    A session follows the protocol and keeps track of what the server told
+    it (client id, lobby, current game, position, full move history), but
+    does no I/O itself. Every message is tracked first and then handed to
+    the listeners registered with on(), so a listener always sees state
+    that already includes the message. Partial game states are completed
+    from the history the session already has, so listeners only ever see
+    full move lists.
+    """
+    def __init__(self, host='localhost', port=5555, username=None, chat_port=None,
+                 legal_moves=False, inbox_size=INBOX_SIZE, password=None):
+        self.host = host
+        self.port = port
+        self.chat_port = chat_port or port + 1  # Chat is on the next port by default
+        self.username = username
+        self.password = password  # None plays as an unrated guest
+        self.legal_moves = legal_moves  # Ask the server to list our legal moves
+        self.listeners = {}  # (channel, message type) -> [callbacks]
+        self.inbox = collections.deque(maxlen=inbox_size)  # (channel, message) not yet claimed
+        self.move_latency = LatencyStats()  # Our move sent -> the server's state with it received
+        self.resume_token = None  # Kept across connections to reclaim a guest seat after a restart
+        self.reset()
+
+    def reset(self):
+        """Forget everything learned from a previous connection"""
+        self.is_connected = False
+        self.client_id = None
+        self.rating = None  # Ours, for registered players
+        self.wire_encoding = ENCODING_JSON  # Negotiated with the server at login
+        self.game_decoder = MessageDecoder(SERVER_MESSAGE_LIMIT)
+        self.chat_decoder = MessageDecoder(SERVER_MESSAGE_LIMIT)
+        self.lobby_id = None
+        self.tournament_id = None
+        self.game_id = None
+        self.color = None  # 'white' or 'black' while playing, None when spectating
+        self.board = chess.Board()
+        self.your_turn = False
+        self.last_state = None
+        self.premoves = []
+        self.move_sent = None  # (game_id, ply, perf_counter) of our move the server hasn't confirmed
+        self.history = []  # SAN moves of history_game_id
+        self.history_game_id = None
+        self.watched = {}  # game_id -> newest game_state of games followed with watch()
+        self.directory = {}  # game_id -> live game directory entry on the page we look at
+        self.directory_order = []  # game_ids of that page in order
+        self.directory_total = 0  # Games listed in the whole directory
+
+    # Listeners
+    def on(self, message_type, callback, channel=GAME):
+        """Call callback(message) for each message of a type (or ANY) on a channel"""
+        self.listeners.setdefault((channel, message_type), []).append(callback)
+        return callback
+
+    def off(self, message_type, callback, channel=GAME):
+        """Stop calling a listener registered with on()"""
+        callbacks = self.listeners.get((channel, message_type), [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def listeners_for(self, channel, message):
+        """Get the listeners a message should be handed to, in call order"""
+        return (self.listeners.get((channel, message.get('type')), []) +
+                self.listeners.get((channel, ANY), []))
+
+    def claim(self, message_type, channel=GAME):
+        """Take the oldest unclaimed message of a type from the inbox, or None"""
+        for index, (message_channel, message) in enumerate(self.inbox):
+            if message_channel == channel and message.get('type') == message_type:
+                del self.inbox[index]
+                return message
+        return None
+
+    # Protocol
+    def hello(self):
+        """Build the first message of a game connection"""
+        hello = {'username': self.username, 'encodings': SUPPORTED_ENCODINGS,
+                 'compression': SUPPORTED_COMPRESSIONS, 'legal_moves': self.legal_moves}
+        if self.password:
+            hello['password'] = self.password
+        if self.resume_token:
+            hello['resume_token'] = self.resume_token
+        return hello
+
+    def chat_hello(self, game_id=None, lobby_id=None):
+        """Build the first message of a chat connection, or None if there's nothing to join"""
+        game_id = game_id or (None if lobby_id else self.game_id)
+        lobby_id = lobby_id or self.lobby_id
+        if game_id:
+            return {'type': 'game_chat', 'client_id': self.client_id, 'game_id': game_id}
+        if lobby_id:
+            return {'type': 'lobby_chat', 'client_id': self.client_id, 'lobby_id': lobby_id}
+        return None
+
+    def track(self, message):
+        """Update the session from a game server message before listeners see it"""
+        message_type = message.get('type')
+
+        # Watched games are kept apart from the game we play or spectate
+        if message.get('game_id') in self.watched:
+            if message_type == 'game_state':
+                self.watched[message['game_id']] = message
+            return
+
+        if message_type == 'connection_ack':
+            self.client_id = message.get('client_id')
+            self.rating = message.get('rating')
+            # Switch encodings here, before any following bytes are read or sent
+            self.wire_encoding = message.get('encoding', ENCODING_JSON)
+            if message.get('compression'):
+                self.game_decoder.decompressor = StreamDecompressor()
+
+        elif message_type == 'resume_token':
+            self.resume_token = message.get('token')
+
+        elif message_type in ('lobby_created', 'lobby_joined'):
+            self.lobby_id = message.get('lobby_id')
+
+        elif message_type == 'lobby_closed':
+            self.lobby_id = None
+
+        elif message_type in ('game_started', 'spectating'):
+            self.game_id = message.get('game_id')
+            self.color = message.get('color') if message_type == 'game_started' else None
+            self.premoves = []
+            if self.history_game_id != self.game_id:
+                self.history = []
+                self.history_game_id = self.game_id
+
+        elif message_type == 'game_state':
+            # Partial states only carry the moves after history_from
+            history = message.get('move_history', [])
+            if 'history_from' in message:
+                if message.get('game_id') == self.history_game_id:
+                    history = self.history[:message['history_from']] + history
+                message['move_history'] = history
+                del message['history_from']
+            self.history = history
+            self.history_game_id = message.get('game_id')
+
+            # The first state past the ply we moved at confirms our move;
+            # listeners can time their own part from move_sent_at
+            if self.move_sent and message.get('game_id') == self.move_sent[0] \
+                    and len(history) > self.move_sent[1]:
+                message['move_sent_at'] = self.move_sent[2]
+                self.move_latency.record(time.perf_counter() - self.move_sent[2])
+                self.move_sent = None
+            self.last_state = message
+            self.your_turn = message.get('your_turn', False)
+            try:
+                self.board = chess.Board(message.get('board_fen'))
+            except (TypeError, ValueError):
+                self.board = chess.Board()
+
+        elif message_type == 'history_range':
+            # Fill in the part of the history we asked for
+            if message.get('game_id') == self.history_game_id:
+                start = message.get('from', 0)
+                moves = message.get('moves', [])
+                self.history = self.history[:start] + moves + self.history[start + len(moves):]
+                message['move_history'] = self.history
+
+        elif message_type == 'premoves':
+            if message.get('game_id') == self.game_id:
+                self.premoves = message.get('premoves', [])
+
+        elif message_type == 'error':
+            self.move_sent = None  # A rejected move is never confirmed
+
+        elif message_type == 'game_over':
+            if message.get('ratings') and self.color:
+                self.rating = message['ratings'][self.color]
+            self.game_id = None
+            self.color = None
+            self.premoves = []
+            self.your_turn = False
+
+        elif message_type == 'games_list':
+            self.directory = {entry['game_id']: entry for entry in message.get('games', [])}
+            self.directory_order = list(self.directory)
+            self.directory_total = message.get('total', 0)
+
+        elif message_type == 'games_update':
+            # Only the entries that changed are sent; fill in the full page
+            for entry in message.get('changed', []):
+                self.directory[entry['game_id']] = entry
+            self.directory_order = message.get('order', [])
+            self.directory = {game_id: self.directory[game_id] for game_id in self.directory_order
+                              if game_id in self.directory}
+            self.directory_total = message.get('total', 0)
+            message['games'] = list(self.directory.values())
+
+        elif message_type == 'tournament_created' or message_type == 'tournament_joined':
+            self.tournament_id = message.get('tournament_id')
+
+        elif message_type == 'tournament_finished':
+            self.tournament_id = None
+
+    # Requests. Replies arrive as messages; see on() and wait_for().
+    @abc.abstractmethod
+    def send_game_message(self, message):
+        """Send a message on the game connection; True if it went out"""
+
+    @abc.abstractmethod
+    def send_chat_message(self, message):
+        """Send a message on the chat connection; True if it went out"""
+
+    def create_lobby(self):
+        return self.send_game_message({'type': 'create_lobby'})
+
+    def list_lobbies(self):
+        return self.send_game_message({'type': 'list_lobbies'})
+
+    def join_lobby(self, lobby_id):
+        return self.send_game_message({'type': 'join_lobby', 'lobby_id': lobby_id})
+
+    def start_game(self, lobby_id=None):
+        return self.send_game_message({'type': 'start_game', 'lobby_id': lobby_id or self.lobby_id})
+
+    def add_bot(self, level, lobby_id=None):
+        return self.send_game_message({'type': 'add_bot', 'lobby_id': lobby_id or self.lobby_id, 'level': level})
+
+    def create_tournament(self, tournament_format='swiss'):
+        return self.send_game_message({'type': 'create_tournament', 'format': tournament_format})
+
+    def list_tournaments(self):
+        return self.send_game_message({'type': 'list_tournaments'})
+
+    def join_tournament(self, tournament_id):
+        return self.send_game_message({'type': 'join_tournament', 'tournament_id': tournament_id})
+
+    def start_tournament(self, tournament_id=None):
+        return self.send_game_message({'type': 'start_tournament',
+                                       'tournament_id': tournament_id or self.tournament_id})
+
+    def move(self, move_uci, game_id=None):
+        game_id = game_id or self.game_id
+        self.move_sent = (game_id, len(self.history), time.perf_counter())
+        return self.send_game_message({'type': 'move', 'game_id': game_id, 'move': move_uci})
+
+    def premove(self, move_uci, game_id=None):
+        return self.send_game_message({'type': 'premove', 'game_id': game_id or self.game_id, 'move': move_uci})
+
+    def cancel_premoves(self, game_id=None):
+        return self.send_game_message({'type': 'cancel_premoves', 'game_id': game_id or self.game_id})
+
+    def resign(self, game_id=None):
+        return self.send_game_message({'type': 'resign', 'game_id': game_id or self.game_id})
+
+    def offer_draw(self, game_id=None):
+        return self.send_game_message({'type': 'offer_draw', 'game_id': game_id or self.game_id})
+
+    def answer_draw(self, accept, game_id=None):
+        return self.send_game_message({'type': 'answer_draw', 'game_id': game_id or self.game_id, 'accept': accept})
+
+    def claim_draw(self, game_id=None):
+        return self.send_game_message({'type': 'claim_draw', 'game_id': game_id or self.game_id})
+
+    def request_takeback(self, game_id=None):
+        return self.send_game_message({'type': 'request_takeback', 'game_id': game_id or self.game_id})
+
+    def answer_takeback(self, accept, game_id=None):
+        return self.send_game_message({'type': 'answer_takeback', 'game_id': game_id or self.game_id,
+                                       'accept': accept})
+
+    def spectate(self, game_id):
+        """Follow a game, only asking for the moves we don't already have"""
+        request = {'type': 'spectate', 'game_id': game_id}
+        if game_id == self.history_game_id and self.history:
+            request['have_plies'] = len(self.history)
+            request['history_digest'] = history_digest(self.history)
+        return self.send_game_message(request)
+
+    def list_games(self, sort='spectators', offset=0, limit=20):
+        """Get one page of the live game directory"""
+        return self.send_game_message({'type': 'list_games', 'sort': sort, 'offset': offset, 'limit': limit})
+
+    def subscribe_games(self, sort='spectators', offset=0, limit=20):
+        """Get one page of the live game directory and its changes from then on"""
+        return self.send_game_message({'type': 'subscribe_games', 'sort': sort, 'offset': offset, 'limit': limit})
+
+    def unsubscribe_games(self):
+        return self.send_game_message({'type': 'unsubscribe_games'})
+
+    def watch(self, game_ids):
+        """Follow several games at once over this connection, besides the current game"""
+        game_ids = [game_id for game_id in game_ids if game_id not in self.watched]
+        if not game_ids:
+            return True
+        for game_id in game_ids:
+            self.watched[game_id] = None
+        return self.send_game_message({'type': 'spectate_games', 'game_ids': game_ids})
+
+    def unwatch(self, game_ids):
+        """Stop following games added with watch()"""
+        game_ids = [game_id for game_id in game_ids if game_id in self.watched]
+        if not game_ids:
+            return True
+        for game_id in game_ids:
+            del self.watched[game_id]
+        return self.send_game_message({'type': 'unspectate_games', 'game_ids': game_ids})
+
+    def request_history(self, start=0, end=None, game_id=None):
+        request = {'type': 'history_request', 'game_id': game_id or self.game_id, 'from': start}
+        if end is not None:
+            request['to'] = end
+        return self.send_game_message(request)
+
+    def chat(self, text, game_id=None, lobby_id=None):
+        """Say something in the game chat, or the lobby chat outside a game"""
+        message = {'type': 'chat', 'text': text}
+        game_id = game_id or (None if lobby_id else self.game_id)
+        if game_id:
+            message['game_id'] = game_id
+        elif lobby_id or self.lobby_id:
+            message['lobby_id'] = lobby_id or self.lobby_id
+        return self.send_chat_message(message)
+
+class ChessSession(ClientSession):
+    """Blocking client session with a reader thread per connection.
+
+    Listeners run on the reader threads, in the order messages arrive; a
+    GUI should hand them over to its own thread.
+    """
+    def __init__(self, *args, **kwargs):
+        self.game_socket = None
+        self.chat_socket = None
+        self.send_lock = threading.Lock()
+        self.chat_send_lock = threading.Lock()
+        self.inbox_ready = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def connect(self, timeout=None):
+        """Connect to the game server and log in, returning whether it worked"""
+        self.reset()
+        try:
+            self.game_socket = socket.create_connection((self.host, self.port), timeout)
+            self.game_socket.settimeout(None)
+            # Moves are tiny; don't let Nagle hold them back waiting for an ACK
+            self.game_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.game_socket.sendall(encode_message(self.hello()))
+
+            # Start listening for game messages
+            listen_thread = threading.Thread(target=self.listen, args=(GAME, self.game_socket, self.game_decoder))
+            listen_thread.daemon = True
+            listen_thread.start()
+
+            self.is_connected = True
+            return True
+        except Exception as e:
+            logger.warning("Failed to connect to game server: %s", e)
+            self.game_socket = None
+            return False
+
+    def connect_chat(self, game_id=None, lobby_id=None, timeout=None):
+        """Join the chat of a game or lobby (the current one by default), replacing any other"""
+        hello = self.chat_hello(game_id, lobby_id)
+        if not hello:
+            return False
+
+        self.close_chat()
+        try:
+            chat_socket = socket.create_connection((self.host, self.chat_port), timeout)
+            chat_socket.settimeout(None)
+            chat_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            chat_socket.sendall(json.dumps(hello).encode())
+            self.chat_socket = chat_socket
+            self.chat_decoder = MessageDecoder(SERVER_MESSAGE_LIMIT)
+
+            # Start listening for chat messages
+            chat_thread = threading.Thread(target=self.listen, args=(CHAT, chat_socket, self.chat_decoder))
+            chat_thread.daemon = True
+            chat_thread.start()
+            return True
+        except Exception as e:
+            logger.warning("Failed to connect to chat server: %s", e)
+            return False
+
+    def close_chat(self):
+        """Leave the chat without reporting it as a lost connection"""
+        chat_socket, self.chat_socket = self.chat_socket, None
+        if chat_socket:
+            try:
+                chat_socket.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Disconnect from the game and chat servers"""
+        self.close_chat()
+        game_socket, self.game_socket = self.game_socket, None
+        self.is_connected = False
+        if game_socket:
+            try:
+                game_socket.close()
+            except Exception:
+                pass
+
+    def send_game_message(self, message):
+        """Send a message to the game server, returning whether it went out"""
+        if not self.game_socket:
+            return False
+        try:
+            with self.send_lock:
+                self.game_socket.sendall(encode_message(message, self.wire_encoding))
+            return True
+        except Exception as e:
+            logger.warning("Failed to send game message: %s", e)
+            return False
+
+    def send_chat_message(self, message):
+        """Send a message to the chat server, returning whether it went out"""
+        if not self.chat_socket:
+            return False
+        try:
+            with self.chat_send_lock:
+                self.chat_socket.sendall(json.dumps(message).encode())
+            return True
+        except Exception as e:
+            logger.warning("Failed to send chat message: %s", e)
+            return False
+
+    def listen(self, channel, sock, decoder):
+        """Read one connection until it closes, delivering each message"""
+        reason = "Connection closed by server"
+        try:
+            while True:
+                data = sock.recv(RECV_SIZE)
+                if not data:
+                    break
+
+                # Each complete message is delivered before the next one is
+                # decoded, so negotiated settings apply from the right byte
+                for message in decoder.feed(data):
+                    self.deliver(channel, message)
+        except ProtocolError as e:
+            # Nothing after a bad frame can be trusted to line up with
+            # message boundaries, so the connection is dropped
+            logger.warning("Dropping %s connection after a bad frame: %s", channel, e)
+            reason = f"Bad data from server: {e}"
+            try:
+                sock.close()
+            except Exception:
+                pass
+        except Exception as e:
+            reason = str(e)
+
+        # Only report connections we didn't close or replace ourselves
+        current = self.game_socket if channel == GAME else self.chat_socket
+        if current is sock:
+            if channel == GAME:
+                self.is_connected = False
+                self.game_socket = None
+            else:
+                self.chat_socket = None
+            self.deliver(channel, {'type': 'disconnected', 'message': reason})
+
+    def deliver(self, channel, message):
+        """Track a message, hand it to the listeners and make it available to wait_for()"""
+        if channel == GAME:
+            self.track(message)
+        for callback in self.listeners_for(channel, message):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Error in %s listener", message.get('type'))
+        if self.inbox.maxlen:
+            with self.inbox_ready:
+                self.inbox.append((channel, message))
+                self.inbox_ready.notify_all()
+
+    def wait_for(self, message_type, timeout=WAIT_TIMEOUT, channel=GAME):
+        """Block until a message of a type arrives (or already has), returning it or None"""
+        with self.inbox_ready:
+            return self.inbox_ready.wait_for(lambda: self.claim(message_type, channel), timeout)
+
+class AsyncChessSession(ClientSession):
+    """Client session on an asyncio event loop, for running many clients in one thread.
+
+    Requests are written without waiting; await drain() to apply
+    backpressure. Listeners may be plain functions or coroutines, which are
+    awaited before the next message is read.
+    """
+    def __init__(self, *args, **kwargs):
+        self.game_writer = None
+        self.chat_writer = None
+        self.game_task = None
+        self.chat_task = None
+        self.inbox_ready = None  # Created on the session's loop
+        super().__init__(*args, **kwargs)
+
+    async def connect(self, timeout=None):
+        """Connect to the game server and log in, returning whether it worked"""
+        self.reset()
+        self.inbox_ready = asyncio.Condition()
+        try:
+            # asyncio already turns Nagle off on TCP connections
+            reader, self.game_writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout)
+            self.game_writer.write(encode_message(self.hello()))
+            self.game_task = asyncio.ensure_future(self.listen(GAME, reader, self.game_writer, self.game_decoder))
+            self.is_connected = True
+            return True
+        except Exception as e:
+            logger.warning("Failed to connect to game server: %s", e)
+            self.game_writer = None
+            return False
+
+    async def connect_chat(self, game_id=None, lobby_id=None, timeout=None):
+        """Join the chat of a game or lobby (the current one by default), replacing any other"""
+        hello = self.chat_hello(game_id, lobby_id)
+        if not hello:
+            return False
+
+        self.close_chat()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.chat_port), timeout)
+            writer.write(json.dumps(hello).encode())
+            self.chat_writer = writer
+            self.chat_decoder = MessageDecoder(SERVER_MESSAGE_LIMIT)
+            self.chat_task = asyncio.ensure_future(self.listen(CHAT, reader, writer, self.chat_decoder))
+            return True
+        except Exception as e:
+            logger.warning("Failed to connect to chat server: %s", e)
+            return False
+
+    def close_chat(self):
+        """Leave the chat without reporting it as a lost connection"""
+        writer, self.chat_writer = self.chat_writer, None
+        if writer:
+            writer.close()
+
+    def close(self):
+        """Disconnect from the game and chat servers"""
+        self.close_chat()
+        writer, self.game_writer = self.game_writer, None
+        self.is_connected = False
+        if writer:
+            writer.close()
+
+    async def drain(self):
+        """Wait until the game connection's send buffer has room again"""
+        if self.game_writer:
+            await self.game_writer.drain()
+
+    def send_game_message(self, message):
+        """Queue a message to the game server, returning whether it was accepted"""
+        if not self.game_writer or self.game_writer.is_closing():
+            return False
+        self.game_writer.write(encode_message(message, self.wire_encoding))
+        return True
+
+    def send_chat_message(self, message):
+        """Queue a message to the chat server, returning whether it was accepted"""
+        if not self.chat_writer or self.chat_writer.is_closing():
+            return False
+        self.chat_writer.write(json.dumps(message).encode())
+        return True
+
+    async def listen(self, channel, reader, writer, decoder):
+        """Read one connection until it closes, delivering each message"""
+        reason = "Connection closed by server"
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for message in decoder.feed(data):
+                    await self.deliver(channel, message)
+        except asyncio.CancelledError:
+            raise
+        except ProtocolError as e:
+            # Nothing after a bad frame can be trusted to line up with
+            # message boundaries, so the connection is dropped
+            logger.warning("Dropping %s connection after a bad frame: %s", channel, e)
+            reason = f"Bad data from server: {e}"
+        except Exception as e:
+            reason = str(e)
+
+        # Only report connections we didn't close or replace ourselves
+        current = self.game_writer if channel == GAME else self.chat_writer
+        if current is writer:
+            writer.close()
+            if channel == GAME:
+                self.is_connected = False
+                self.game_writer = None
+            else:
+                self.chat_writer = None
+            await self.deliver(channel, {'type': 'disconnected', 'message': reason})
+
+    async def deliver(self, channel, message):
+        """Track a message, hand it to the listeners and make it available to wait_for()"""
+        if channel == GAME:
+            self.track(message)
+        for callback in self.listeners_for(channel, message):
+            try:
+                result = callback(message)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Error in %s listener", message.get('type'))
+        if self.inbox.maxlen:
+            async with self.inbox_ready:
+                self.inbox.append((channel, message))
+                self.inbox_ready.notify_all()
+
+    async def wait_for(self, message_type, timeout=WAIT_TIMEOUT, channel=GAME):
+        """Wait until a message of a type arrives (or already has), returning it or None"""
+        async with self.inbox_ready:
+            try:
+                return await asyncio.wait_for(
+                    self.inbox_ready.wait_for(lambda: self.claim(message_type, channel)), timeout)
+            except asyncio.TimeoutError:
+                return None
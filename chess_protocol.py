@@ -0,0 +1,678 @@
+
+import json
+import re
+import struct
+import time
+import uuid
+import zlib
+
+# Wire encodings a connection can negotiate, in order of preference. JSON
+# (plain concatenated objects) is always available as the fallback.
+ENCODING_JSON = 'json'
+ENCODING_BINARY = 'binary'
+SUPPORTED_ENCODINGS = [ENCODING_BINARY, ENCODING_JSON]
+
+# Optional stream compression, negotiated separately from the encoding.
+# Messages under the threshold (moves, acks) are sent as they are.
+COMPRESSION_ZLIB = 'zlib'
+SUPPORTED_COMPRESSIONS = [COMPRESSION_ZLIB]
+COMPRESSION_THRESHOLD = 256
+COMPRESSION_LEVEL = 6
+
+# Binary frames start with a byte that never appears in the ASCII JSON we
+# send, so JSON objects and frames can share one stream:
+#   magic (1) | kind (1) | payload length (4, big endian) | payload
+FRAME_MAGIC = 0xFF
+FRAME_HEADER = struct.Struct('>BBI')
+
+KIND_JSON = 0        # Payload is a UTF-8 JSON object
+KIND_GAME_STATE = 1  # Payload is a packed game_state
+KIND_MOVE = 2        # Payload is a packed move
+KIND_COMPRESSED = 3  # Payload is a zlib-compressed message (JSON object or frame)
+
+# Largest message a decoder takes by default, in bytes. A peer sending more
+# (an object that never closes, a frame header claiming gigabytes) is broken
+# or hostile: the decoder raises ProtocolError instead of buffering it.
+# Decoders made with max_message_size=None take messages of any size.
+MAX_MESSAGE_SIZE = 1 << 20
+
+# Packed board squares: one nibble per square, a8 first like FEN
+PIECE_CODES = {'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+               'p': 9, 'n': 10, 'b': 11, 'r': 12, 'q': 13, 'k': 14}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+CASTLING_BITS = {'K': 1, 'Q': 2, 'k': 4, 'q': 8}
+PROMOTION_CODES = {'n': 2, 'b': 3, 'r': 4, 'q': 5}
+CODE_PROMOTIONS = {code: piece for piece, code in PROMOTION_CODES.items()}
+WINNER_CODES = {None: 0, 'white': 1, 'black': 2}
+CODE_WINNERS = {code: winner for winner, code in WINNER_CODES.items()}
+
+# game_state flags
+FLAG_YOUR_TURN = 1
+FLAG_IN_CHECK = 2
+FLAG_BLACK_TO_MOVE = 4
+FLAG_GAME_OVER = 8
+FLAG_LEGAL_MOVES = 16
+FLAG_HISTORY_FROM = 32
+FLAG_EXTRAS = 64
+
+# Fields the packed game_state carries natively; anything else rides along
+# as a small JSON object so new fields never break the binary encoding
+GAME_STATE_FIELDS = {'type', 'game_id', 'board_fen', 'turn', 'your_turn', 'in_check',
+                     'legal_moves', 'white_player', 'black_player', 'white_time',
+                     'black_time', 'ply', 'move_history', 'history_from', 'game_over',
+                     'result', 'winner'}
+
+STATE_HEADER = struct.Struct('>16sH')        # game_id, flags
+BOARD_TAIL = struct.Struct('>BBHH')          # castling, ep square, halfmove, fullmove
+CLOCKS = struct.Struct('>IIH')               # white ms, black ms, ply
+MOVE_FRAME = struct.Struct('>16sH')          # game_id, move code
+
+class ProtocolError(Exception):
+    """Raised when a binary frame can't be decoded"""
+    pass
+
+def square_index(name):
+    """Square name ('e4') to 0-63, a1 = 0"""
+    return (ord(name[0]) - 97) + (ord(name[1]) - 49) * 8
+
+def square_name(index):
+    """0-63 to square name"""
+    return chr(97 + index % 8) + chr(49 + index // 8)
+
+def encode_move_code(move_uci):
+    """Pack a UCI move into 16 bits: from, to and promotion piece"""
+    code = MOVE_CODES.get(move_uci)
+    if code is None:
+        raise ValueError(f"Not a UCI move: {move_uci}")
+    return code
+
+def decode_move_code(code):
+    """Unpack a 16 bit move code to UCI"""
+    move = CODE_MOVES.get(code)
+    if move is None:
+        raise ValueError(f"Bad move code: {code}")
+    return move
+
+def build_move_tables():
+    """Precompute code <-> UCI for every from/to/promotion combination"""
+    codes = {}
+    for from_square in range(64):
+        for to_square in range(64):
+            move = square_name(from_square) + square_name(to_square)
+            code = from_square | (to_square << 6)
+            codes[move] = code
+            for piece, promotion in PROMOTION_CODES.items():
+                codes[move + piece] = code | (promotion << 12)
+    return codes, {code: move for move, code in codes.items()}
+
+MOVE_CODES, CODE_MOVES = build_move_tables()
+
+# FEN board text -> one byte per square in a single str.translate call
+FEN_SQUARE_TABLE = {ord(piece): chr(code) for piece, code in PIECE_CODES.items()}
+FEN_SQUARE_TABLE.update({ord(str(n)): '\0' * n for n in range(1, 9)})
+FEN_SQUARE_TABLE[ord('/')] = None
+
+# Decoded FEN rows by their 4 packed bytes; positions share most rows
+ROW_CACHE = {}
+ROW_CACHE_LIMIT = 50000
+
+def pack_board(fen):
+    """Pack a FEN into 32 bytes of squares plus castling, ep and counters"""
+    parts = fen.split(' ')
+    try:
+        squares = parts[0].translate(FEN_SQUARE_TABLE).encode('latin-1')
+    except UnicodeEncodeError:
+        raise ValueError(f"Bad FEN board: {fen}")
+    if len(squares) != 64 or max(squares) > 14:
+        raise ValueError(f"Bad FEN board: {fen}")
+
+    packed = bytes((high << 4) | low for high, low in zip(squares[0::2], squares[1::2]))
+    castling = sum(CASTLING_BITS[c] for c in parts[2] if c in CASTLING_BITS) if len(parts) > 2 else 0
+    ep = square_index(parts[3]) if len(parts) > 3 and parts[3] != '-' else 0xFF
+    halfmove = int(parts[4]) if len(parts) > 4 else 0
+    fullmove = int(parts[5]) if len(parts) > 5 else 1
+    return packed + BOARD_TAIL.pack(castling, ep, halfmove, fullmove)
+
+def unpack_board(data, offset, black_to_move):
+    """Rebuild the FEN from a packed board, returning (fen, new offset)"""
+    rows = []
+    for start in range(offset, offset + 32, 4):
+        packed_row = bytes(data[start:start + 4])
+        row = ROW_CACHE.get(packed_row)
+        if row is None:
+            row = unpack_row(packed_row)
+            if len(ROW_CACHE) < ROW_CACHE_LIMIT:
+                ROW_CACHE[packed_row] = row
+        rows.append(row)
+    offset += 32
+
+    castling, ep, halfmove, fullmove = BOARD_TAIL.unpack_from(data, offset)
+    offset += BOARD_TAIL.size
+    castling_text = ''.join(c for c, bit in CASTLING_BITS.items() if castling & bit) or '-'
+    ep_text = square_name(ep) if ep != 0xFF else '-'
+    turn = 'b' if black_to_move else 'w'
+    fen = f"{'/'.join(rows)} {turn} {castling_text} {ep_text} {halfmove} {fullmove}"
+    return fen, offset
+
+def unpack_row(packed_row):
+    """Turn 4 packed bytes into one FEN row"""
+    row = ''
+    empty = 0
+    for byte in packed_row:
+        for code in (byte >> 4, byte & 15):
+            if code == 0:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            row += CODE_PIECES[code]
+    if empty:
+        row += str(empty)
+    return row
+
+def pack_string(text, length_format='>B'):
+    """Length-prefixed UTF-8 string"""
+    data = (text or '').encode('utf-8')
+    return struct.pack(length_format, len(data)) + data
+
+def unpack_string(data, offset, length_format='>B'):
+    """Read a length-prefixed UTF-8 string, returning (text, new offset)"""
+    size = struct.calcsize(length_format)
+    (length,) = struct.unpack_from(length_format, data, offset)
+    offset += size
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+def encode_game_state(state):
+    """Pack a game_state message"""
+    flags = 0
+    if state.get('your_turn'):
+        flags |= FLAG_YOUR_TURN
+    if state.get('in_check'):
+        flags |= FLAG_IN_CHECK
+    if state.get('turn') == 'black':
+        flags |= FLAG_BLACK_TO_MOVE
+    if state.get('game_over'):
+        flags |= FLAG_GAME_OVER
+    if 'legal_moves' in state:
+        flags |= FLAG_LEGAL_MOVES
+    if 'history_from' in state:
+        flags |= FLAG_HISTORY_FROM
+    extras = {key: value for key, value in state.items() if key not in GAME_STATE_FIELDS}
+    if extras:
+        flags |= FLAG_EXTRAS
+
+    parts = [
+        STATE_HEADER.pack(uuid.UUID(state['game_id']).bytes, flags),
+        pack_board(state['board_fen']),
+        CLOCKS.pack(int(state.get('white_time', 0) * 1000), int(state.get('black_time', 0) * 1000),
+                    state.get('ply', len(state.get('move_history', [])))),
+        pack_string(state.get('white_player')),
+        pack_string(state.get('black_player'))
+    ]
+
+    if flags & FLAG_LEGAL_MOVES:
+        moves = state['legal_moves']
+        parts.append(struct.pack(f'>H{len(moves)}H', len(moves), *[MOVE_CODES[m] for m in moves]))
+
+    # SAN never contains spaces, so the history travels as one string
+    parts.append(pack_string(' '.join(state.get('move_history', [])), '>I'))
+
+    if flags & FLAG_HISTORY_FROM:
+        parts.append(struct.pack('>H', state['history_from']))
+    if flags & FLAG_GAME_OVER:
+        parts.append(pack_string(state.get('result')))
+        parts.append(struct.pack('>B', WINNER_CODES[state.get('winner')]))
+    if flags & FLAG_EXTRAS:
+        parts.append(pack_string(json.dumps(extras), '>I'))
+
+    return b''.join(parts)
+
+def decode_game_state(data):
+    """Unpack a game_state message"""
+    game_id, flags = STATE_HEADER.unpack_from(data, 0)
+    offset = STATE_HEADER.size
+    fen, offset = unpack_board(data, offset, flags & FLAG_BLACK_TO_MOVE)
+    white_ms, black_ms, ply = CLOCKS.unpack_from(data, offset)
+    offset += CLOCKS.size
+    white_player, offset = unpack_string(data, offset)
+    black_player, offset = unpack_string(data, offset)
+
+    state = {
+        'type': 'game_state',
+        'game_id': str(uuid.UUID(bytes=game_id)),
+        'board_fen': fen,
+        'turn': 'black' if flags & FLAG_BLACK_TO_MOVE else 'white',
+        'your_turn': bool(flags & FLAG_YOUR_TURN),
+        'in_check': bool(flags & FLAG_IN_CHECK),
+        'white_player': white_player,
+        'black_player': black_player,
+        'white_time': ms_to_seconds(white_ms),
+        'black_time': ms_to_seconds(black_ms),
+        'ply': ply
+    }
+
+    if flags & FLAG_LEGAL_MOVES:
+        (count,) = struct.unpack_from('>H', data, offset)
+        codes = struct.unpack_from(f'>{count}H', data, offset + 2)
+        offset += 2 + count * 2
+        state['legal_moves'] = [CODE_MOVES[code] for code in codes]
+
+    history, offset = unpack_string(data, offset, '>I')
+    state['move_history'] = history.split(' ') if history else []
+
+    if flags & FLAG_HISTORY_FROM:
+        (state['history_from'],) = struct.unpack_from('>H', data, offset)
+        offset += 2
+    if flags & FLAG_GAME_OVER:
+        state['game_over'] = True
+        state['result'], offset = unpack_string(data, offset)
+        state['winner'] = CODE_WINNERS[data[offset]]
+        offset += 1
+    if flags & FLAG_EXTRAS:
+        extras, offset = unpack_string(data, offset, '>I')
+        state.update(json.loads(extras))
+
+    return state
+
+def ms_to_seconds(ms):
+    """Milliseconds to seconds, kept as an int when whole"""
+    return ms // 1000 if ms % 1000 == 0 else ms / 1000
+
+def encode_move(message):
+    """Pack a move message"""
+    return MOVE_FRAME.pack(uuid.UUID(message['game_id']).bytes, encode_move_code(message['move']))
+
+def decode_move(data):
+    """Unpack a move message"""
+    game_id, code = MOVE_FRAME.unpack_from(data, 0)
+    return {'type': 'move', 'game_id': str(uuid.UUID(bytes=game_id)), 'move': decode_move_code(code)}
+
+BINARY_ENCODERS = {'game_state': (KIND_GAME_STATE, encode_game_state),
+                   'move': (KIND_MOVE, encode_move)}
+BINARY_DECODERS = {KIND_GAME_STATE: decode_game_state, KIND_MOVE: decode_move}
+
+def frame(kind, payload):
+    """Wrap a payload in a binary frame"""
+    return FRAME_HEADER.pack(FRAME_MAGIC, kind, len(payload)) + payload
+
+def encode_message(message, encoding=ENCODING_JSON):
+    """Encode a message dict for the wire in the given encoding"""
+    if encoding != ENCODING_BINARY:
+        return json.dumps(message).encode()
+
+    kind, encoder = BINARY_ENCODERS.get(message.get('type'), (KIND_JSON, None))
+    if encoder:
+        try:
+            return frame(kind, encoder(message))
+        except (KeyError, ValueError, TypeError, struct.error):
+            pass  # Unusual content (e.g. a non-UUID game id): send as JSON
+    return frame(KIND_JSON, json.dumps(message).encode())
+
+def split_frame(buffer, decompressor=None, max_size=MAX_MESSAGE_SIZE):
+    """Take one frame off the front of buffer.
+
+    Returns (message, rest), or (None, buffer) if the frame isn't complete.
+    Compressed frames need the connection's StreamDecompressor. A frame
+    whose payload is over max_size bytes (unless max_size is None) raises
+    ProtocolError as soon as its header arrives.
+    """
+    if len(buffer) < FRAME_HEADER.size:
+        return None, buffer
+    magic, kind, length = FRAME_HEADER.unpack_from(buffer, 0)
+    if magic != FRAME_MAGIC:
+        raise ProtocolError("Frame does not start with the frame marker")
+    if max_size is not None and length > max_size:
+        raise ProtocolError(f"Frame of {length} bytes is over the {max_size} byte limit")
+    end = FRAME_HEADER.size + length
+    if len(buffer) < end:
+        return None, buffer
+    return decode_frame(kind, bytes(buffer[FRAME_HEADER.size:end]), decompressor), buffer[end:]
+
+def decode_frame(kind, payload, decompressor=None):
+    """Decode a frame payload into a message dict"""
+    try:
+        if kind == KIND_COMPRESSED:
+            if decompressor is None:
+                raise ProtocolError("Compressed frame on a connection without compression")
+            return decode_wire(decompressor.decompress(payload))
+        if kind == KIND_JSON:
+            return json.loads(payload.decode('utf-8'))
+        return BINARY_DECODERS[kind](payload)
+    except (KeyError, ValueError, struct.error, zlib.error) as e:
+        raise ProtocolError(f"Bad frame of kind {kind}: {e}")
+
+def decode_wire(data):
+    """Decode one complete message as encode_message produced it"""
+    if data[:1] == bytes([FRAME_MAGIC]):
+        message, rest = split_frame(data)
+        if message is None or rest:
+            raise ProtocolError("Compressed payload is not exactly one frame")
+        return message
+    return json.loads(data.decode('utf-8'))
+
+def history_digest(moves):
+    """Checksum of a move list, so a client and the server can tell they agree on it"""
+    return zlib.crc32(' '.join(moves).encode())
+
+# Formats shared by message schemas
+UUID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+UCI_PATTERN = r'[a-h][1-8][a-h][1-8][nbrq]?'
+
+class Field:
+    """One field of a message schema.
+
+    Everything that can be prepared ahead (type tuples, regular expressions,
+    choice sets) is built here once, so checking a message is only a few
+    comparisons per field.
+    """
+    def __init__(self, name, kind, required=False, default=None, pattern=None,
+                 min_length=None, max_length=None, minimum=None, maximum=None, choices=None):
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.pattern = re.compile(pattern) if pattern else None
+        self.min_length = min_length
+        self.max_length = max_length
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = frozenset(choices) if choices is not None else None
+
+    def check(self, value):
+        """Get an error for a present value, or None if it's valid"""
+        # bool is an int subclass; true/false is never a valid number here
+        if not isinstance(value, self.kind) or (isinstance(value, bool) and self.kind is not bool):
+            return f"'{self.name}' must be of type {self.kind.__name__}"
+        if self.min_length is not None and len(value) < self.min_length:
+            return f"'{self.name}' is too short"
+        if self.max_length is not None and len(value) > self.max_length:
+            return f"'{self.name}' is too long"
+        if self.pattern and not self.pattern.fullmatch(value):
+            return f"'{self.name}' is not in the expected format"
+        if self.minimum is not None and value < self.minimum:
+            return f"'{self.name}' must be at least {self.minimum}"
+        if self.maximum is not None and value > self.maximum:
+            return f"'{self.name}' must be at most {self.maximum}"
+        if self.choices is not None and value not in self.choices:
+            return f"'{self.name}' is not a valid choice"
+        return None
+
+class MessageSchema:
+    """The fields of one message type, in the order its handler takes them"""
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def parse(self, message):
+        """Validate a message and pull out its fields.
+
+        Returns (values, None) with one value per field (defaults filled in),
+        or (None, error) for the first problem found. Unknown fields are
+        ignored.
+        """
+        values = []
+        for field in self.fields:
+            value = message.get(field.name)
+            if value is None:
+                if field.required:
+                    return None, f"'{field.name}' is required"
+                values.append(field.default)
+                continue
+            error = field.check(value)
+            if error:
+                return None, error
+            values.append(value)
+        return values, None
+
+class MessageDecoder:
+    """Splits a received byte stream into messages, JSON objects and frames alike.
+
+    Bytes are scanned once as they arrive: the decoder remembers how far it
+    got, how deeply nested the current object is and whether it is inside a
+    string, so a message split over many reads is never rescanned. Messages
+    over max_message_size bytes raise ProtocolError (None means no limit);
+    after that (or any ProtocolError) the stream can't be trusted and should
+    be dropped. Bytes between messages that can't start one are dropped.
+    """
+    OUTSIDE = re.compile(rb'[{\xff]')       # Start of a JSON object or a frame
+    STRUCTURE = re.compile(rb'[{}"\\]')     # Bytes that matter inside an object
+    IN_STRING = re.compile(rb'["\\]')       # Bytes that matter inside a string
+
+    def __init__(self, max_message_size=MAX_MESSAGE_SIZE):
+        self.decompressor = None  # Set once compression is negotiated
+        self.max_message_size = max_message_size
+        self.buffer = bytearray()
+        self.reset()
+
+    def reset(self):
+        """Forget any partly received object"""
+        self.position = 0    # Next byte to scan
+        self.depth = 0       # Brace depth of the current object
+        self.in_string = False
+
+    def feed(self, data):
+        """Add received bytes, yielding each message they complete.
+
+        Messages are produced one at a time, so a caller can act on one
+        (e.g. switch on compression after connection_ack) before the next
+        is decoded.
+        """
+        self.buffer += data
+        while True:
+            if self.depth == 0:
+                match = self.OUTSIDE.search(self.buffer)
+                if not match:
+                    self.buffer.clear()
+                    return
+                if match.start():
+                    del self.buffer[:match.start()]
+
+                if self.buffer[0] == FRAME_MAGIC:
+                    try:
+                        message, rest = split_frame(self.buffer, self.decompressor, self.max_message_size)
+                    except ProtocolError:
+                        self.buffer.clear()  # No way to find the next message
+                        raise
+                    if message is None:
+                        return  # Wait for the rest of the frame
+                    self.buffer = bytearray(rest)
+                    yield message
+                    continue
+
+                self.depth = 1
+                self.position = 1
+
+            try:
+                end = self.scan()
+            except ProtocolError:
+                self.buffer.clear()
+                self.reset()
+                raise
+            if end is None:
+                return  # Wait for the rest of the object
+
+            data = bytes(self.buffer[:end])
+            del self.buffer[:end]
+            self.reset()
+            try:
+                yield json.loads(data.decode('utf-8'))
+            except ValueError:
+                pass  # Skip a malformed object and carry on with the next
+
+    def scan(self):
+        """Advance through the current object, returning its end once complete.
+
+        Raises ProtocolError once the object runs past max_message_size.
+        """
+        buffer = self.buffer
+        while True:
+            pattern = self.IN_STRING if self.in_string else self.STRUCTURE
+            match = pattern.search(buffer, self.position)
+            if not match:
+                self.position = max(self.position, len(buffer))
+                if self.max_message_size is not None and self.position > self.max_message_size:
+                    raise ProtocolError(f"Message is over the {self.max_message_size} byte limit")
+                return None
+
+            char = buffer[match.start()]
+            self.position = match.end()
+            if char == 0x5C:    # Backslash: skip the escaped byte
+                self.position += 1
+            elif char == 0x22:  # Quote
+                self.in_string = not self.in_string
+            elif char == 0x7B:  # {
+                self.depth += 1
+            else:               # }
+                self.depth -= 1
+                if self.depth == 0:
+                    if self.max_message_size is not None and self.position > self.max_message_size:
+                        raise ProtocolError(f"Message is over the {self.max_message_size} byte limit")
+                    return self.position
+
+def choose_encoding(offered):
+    """Pick the server's preferred encoding among those a client offers"""
+    if isinstance(offered, list):
+        for encoding in SUPPORTED_ENCODINGS:
+            if encoding in offered:
+                return encoding
+    return ENCODING_JSON
+
+def choose_compression(offered):
+    """Pick a compression among those a client offers, or None"""
+    if isinstance(offered, list):
+        for compression in SUPPORTED_COMPRESSIONS:
+            if compression in offered:
+                return compression
+    return None
+
+class StreamCompressor:
+    """Compresses one connection's outgoing messages with a shared zlib context.
+
+    The context persists between messages, so repeated text (move history,
+    player names, lobby entries) compresses against everything sent before.
+    Each message is sync-flushed so the peer can decode it on arrival. Calls
+    must happen in the same order the results are written to the socket.
+    """
+    def __init__(self, threshold=COMPRESSION_THRESHOLD, level=COMPRESSION_LEVEL):
+        self.threshold = threshold
+        self.compressor = zlib.compressobj(level)
+        self.messages = 0
+        self.compressed_messages = 0
+        self.bytes_in = 0   # Encoded size before compression
+        self.bytes_out = 0  # Size actually written
+
+    def compress(self, data):
+        """Get the bytes to send for one encoded message"""
+        self.messages += 1
+        self.bytes_in += len(data)
+        if len(data) >= self.threshold:
+            payload = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            data = frame(KIND_COMPRESSED, payload)
+            self.compressed_messages += 1
+        self.bytes_out += len(data)
+        return data
+
+    def ratio(self):
+        """Bytes written per byte encoded (lower is better)"""
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    def stats(self):
+        """Get the totals as a dictionary"""
+        return {
+            'messages': self.messages,
+            'compressed_messages': self.compressed_messages,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.ratio(), 3)
+        }
+
+class StreamDecompressor:
+    """The receiving side of a StreamCompressor"""
+    def __init__(self):
+        self.decompressor = zlib.decompressobj()
+
+    def decompress(self, payload):
+        return self.decompressor.decompress(payload)
+
+def sample_game_state(plies=60):
+    """A realistic mid-game state for benchmarking"""
+    history = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O', 'Be7',
+               'Re1', 'b5', 'Bb3', 'd6', 'c3', 'O-O', 'h3', 'Nb8', 'd4', 'Nbd7']
+    legal_moves = ['a1a2', 'a1a3', 'b1a3', 'b1c3', 'b1d2', 'c1d2', 'c1e3', 'c1f4', 'c1g5', 'c1h6',
+                   'd1c2', 'd1d2', 'd1d3', 'd1e2', 'e1e2', 'e1e3', 'e1f1', 'f3d2', 'f3e5', 'f3g5',
+                   'f3h2', 'f3h4', 'g1f1', 'g1h1', 'g1h2', 'a2a3', 'a2a4', 'b2b3', 'b2b4', 'c3c4',
+                   'd4d5', 'd4e5', 'g2g3', 'g2g4', 'h3h4']
+    return {
+        'type': 'game_state',
+        'game_id': str(uuid.uuid4()),
+        'board_fen': 'r1bq1rk1/2pnbppp/p2p1n2/1p2p3/3PP3/1BP2N1P/PP3PP1/RNBQR1K1 w - - 1 11',
+        'turn': 'white',
+        'your_turn': True,
+        'in_check': False,
+        'legal_moves': legal_moves,
+        'white_player': 'alice',
+        'black_player': 'bob',
+        'white_time': 512,
+        'black_time': 498,
+        'ply': plies,
+        'move_history': (history * (plies // len(history) + 1))[:plies]
+    }
+
+def benchmark(iterations=20000):
+    """Compare JSON and binary encode/decode cost and size"""
+    messages = {
+        'game_state (60 plies)': sample_game_state(60),
+        'game_state (200 plies)': sample_game_state(200),
+        'move': {'type': 'move', 'game_id': str(uuid.uuid4()), 'move': 'e7e8q'}
+    }
+
+    print(f"{'message':<24}{'encoding':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for name, message in messages.items():
+        for encoding in (ENCODING_JSON, ENCODING_BINARY):
+            data = encode_message(message, encoding)
+            if encoding == ENCODING_JSON:
+                decode = lambda: json.loads(data.decode())
+            else:
+                decode = lambda: split_frame(data)
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                encode_message(message, encoding)
+            encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                decode()
+            decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+            print(f"{name:<24}{encoding:<10}{len(data):>8}{encode_us:>12.2f}{decode_us:>12.2f}")
+
+def benchmark_compression(plies=120):
+    """Total bytes for a game's stream of states, with and without compression"""
+    states = [sample_game_state(ply) for ply in range(1, plies + 1)]
+    for state in states:
+        state['game_id'] = states[0]['game_id']
+
+    print(f"\n{plies} consecutive game states")
+    print(f"{'encoding':<10}{'compression':<13}{'bytes':>10}{'compressed':>12}{'total us':>12}")
+    for encoding in (ENCODING_JSON, ENCODING_BINARY):
+        for threshold in (None, COMPRESSION_THRESHOLD):
+            compressor = StreamCompressor(threshold) if threshold else None
+            decompressor = StreamDecompressor()
+            start = time.perf_counter()
+            total = 0
+            for state in states:
+                data = encode_message(state, encoding)
+                if compressor:
+                    data = compressor.compress(data)
+                    if data[:1] == bytes([FRAME_MAGIC]) and data[1] == KIND_COMPRESSED:
+                        split_frame(data, decompressor)
+                total += len(data)
+            elapsed_us = (time.perf_counter() - start) * 1e6
+            compressed = compressor.compressed_messages if compressor else 0
+            print(f"{encoding:<10}{COMPRESSION_ZLIB if compressor else 'none':<13}{total:>10}"
+                  f"{compressed:>12}{elapsed_us:>12.0f}")
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_compression()
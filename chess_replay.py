@@ -0,0 +1,281 @@
+
+import argparse
+import concurrent.futures
+import io
+import json
+import os
+import sys
+import time
+import chess
+import chess.pgn
+
+# Games are shipped to worker processes in batches so the per-task pickling
+# and scheduling overhead is paid once per batch instead of once per game
+DEFAULT_BATCH_SIZE = 200
+
+# PGN results mapped to the winner field used by the server's game states
+PGN_WINNERS = {'1-0': 'white', '0-1': 'black', '1/2-1/2': None}
+
+class ReplayStats:
+    """Running totals for a bulk replay"""
+    def __init__(self):
+        self.start_time = time.time()
+        self.games = 0
+        self.valid_games = 0
+        self.invalid_games = 0
+        self.plies = 0
+
+    def record(self, result):
+        """Add a single replay result to the totals"""
+        self.games += 1
+        self.plies += result.get('plies', 0)
+        if result.get('valid'):
+            self.valid_games += 1
+        else:
+            self.invalid_games += 1
+
+    def elapsed(self):
+        """Seconds since the replay started"""
+        return max(time.time() - self.start_time, 1e-9)
+
+    def games_per_second(self):
+        return self.games / self.elapsed()
+
+    def plies_per_second(self):
+        return self.plies / self.elapsed()
+
+    def summary(self):
+        """Get the totals as a dictionary"""
+        return {
+            'games': self.games,
+            'valid_games': self.valid_games,
+            'invalid_games': self.invalid_games,
+            'plies': self.plies,
+            'elapsed': round(self.elapsed(), 3),
+            'games_per_second': round(self.games_per_second(), 1),
+            'plies_per_second': round(self.plies_per_second(), 1)
+        }
+
+    def __str__(self):
+        return (f"{self.games} games ({self.invalid_games} invalid), {self.plies} plies "
+                f"in {self.elapsed():.2f}s: {self.games_per_second():.1f} games/s, "
+                f"{self.plies_per_second():.1f} plies/s")
+
+def game_outcome(board, recorded_result=None):
+    """Get (result, winner) for a final position in the server's terms"""
+    if board.is_checkmate():
+        return "checkmate", "black" if board.turn == chess.WHITE else "white"
+    if board.is_stalemate():
+        return "stalemate", None
+    if board.is_insufficient_material():
+        return "insufficient material", None
+    if board.is_seventyfive_moves():
+        return "seventy-five-move rule", None
+    if board.is_fivefold_repetition():
+        return "fivefold repetition", None
+    if recorded_result == '1/2-1/2':
+        # Drawn where a draw could be claimed: take it as the claim
+        if board.is_fifty_moves():
+            return "fifty-move rule", None
+        if board.is_repetition():
+            return "threefold repetition", None
+    if recorded_result in PGN_WINNERS:
+        # Decided off the board (resignation, time, agreement)
+        return "recorded", PGN_WINNERS[recorded_result]
+    return None, None
+
+def replay_uci(game_id, moves, white="?", black="?", recorded_result=None):
+    """Validate a list of UCI moves and build the server's game record"""
+    board = chess.Board()
+    move_history = []
+    for ply, move_uci in enumerate(moves):
+        try:
+            move = chess.Move.from_uci(move_uci)
+        except ValueError:
+            return replay_error(game_id, ply, move_uci, "Malformed move", move_history)
+        if not board.is_legal(move):
+            return replay_error(game_id, ply, move_uci, "Illegal move", move_history)
+        move_history.append(board.san(move))
+        board.push(move)
+    return replay_result(game_id, board, move_history, white, black, recorded_result)
+
+def replay_pgn(game_id, pgn_text):
+    """Validate a single PGN game and build the server's game record"""
+    game = chess.pgn.read_game(io.StringIO(pgn_text))
+    if game is None:
+        return replay_error(game_id, 0, None, "No game found", [])
+
+    headers = game.headers
+    white = headers.get('White', '?')
+    black = headers.get('Black', '?')
+
+    # python-chess collects SAN problems instead of raising; report the first
+    if game.errors:
+        plies = sum(1 for _ in game.mainline_moves())
+        return replay_error(game_id, plies, None, str(game.errors[0]), [])
+
+    board = game.board()
+    move_history = []
+    for move in game.mainline_moves():
+        move_history.append(board.san(move))
+        board.push(move)
+    return replay_result(game_id, board, move_history, white, black, headers.get('Result'))
+
+def replay_result(game_id, board, move_history, white, black, recorded_result):
+    """Build a successful replay record matching ChessGame's fields"""
+    result, winner = game_outcome(board, recorded_result)
+    return {
+        'game_id': game_id,
+        'valid': True,
+        'white_player': white,
+        'black_player': black,
+        'board_fen': board.fen(),
+        'move_history': move_history,
+        'plies': len(move_history),
+        'game_over': result is not None,
+        'result': result,
+        'winner': winner
+    }
+
+def replay_error(game_id, ply, move, error, move_history):
+    """Build a failed replay record pointing at the offending ply"""
+    return {
+        'game_id': game_id,
+        'valid': False,
+        'error': error,
+        'ply': ply,
+        'move': move,
+        'plies': len(move_history)
+    }
+
+def replay_record(record):
+    """Replay one input record, never raising"""
+    game_id = record.get('game_id')
+    if 'error' in record:
+        return replay_error(game_id, 0, None, record['error'], [])
+    try:
+        if 'pgn' in record:
+            return replay_pgn(game_id, record['pgn'])
+        return replay_uci(game_id, record.get('moves', []),
+                          record.get('white_player', '?'), record.get('black_player', '?'),
+                          record.get('result'))
+    except Exception as e:
+        return replay_error(game_id, 0, None, f"Unexpected error: {e}", [])
+
+def replay_batch(records):
+    """Replay a batch of records in a worker process"""
+    return [replay_record(record) for record in records]
+
+def batched(records, batch_size):
+    """Group an iterable of records into lists of at most batch_size"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def replay_games(records, workers=None, batch_size=DEFAULT_BATCH_SIZE, stats=None):
+    """Validate many games in parallel, yielding results as batches finish.
+
+    records is any iterable of dicts holding either 'pgn' (one game's PGN
+    text) or 'moves' (a list of UCI strings), plus an optional 'game_id'.
+    Results are yielded in completion order, not input order. Only a few
+    batches per worker are kept in flight so huge inputs stream in constant
+    memory. Pass a ReplayStats to collect throughput figures.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    batches = batched(records, batch_size)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for batch in batches:
+            in_flight.add(pool.submit(replay_batch, batch))
+            if len(in_flight) < max_in_flight:
+                continue
+            done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield from collect(future, stats)
+
+        for future in concurrent.futures.as_completed(in_flight):
+            yield from collect(future, stats)
+
+def collect(future, stats):
+    """Yield the results of a finished batch, updating stats"""
+    for result in future.result():
+        if stats:
+            stats.record(result)
+        yield result
+
+def iter_pgn_records(stream):
+    """Split a PGN stream into per-game records without parsing the moves.
+
+    Parsing happens in the workers; here we only cut the text at each
+    '[Event ' tag that follows the movetext of the previous game.
+    """
+    lines = []
+    in_movetext = False
+    index = 0
+    for line in stream:
+        if line.startswith('[Event ') and in_movetext:
+            yield {'game_id': str(index), 'pgn': ''.join(lines)}
+            index += 1
+            lines = []
+            in_movetext = False
+        elif line.strip() and not line.startswith('['):
+            in_movetext = True
+        lines.append(line)
+    if any(line.strip() for line in lines):
+        yield {'game_id': str(index), 'pgn': ''.join(lines)}
+
+def iter_uci_records(stream):
+    """Read UCI games: JSON objects per line, or space separated moves"""
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            # A bad line becomes a per-game error instead of ending the run
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'error': f"Malformed record: {e}"}
+            record.setdefault('game_id', str(index))
+            yield record
+        else:
+            yield {'game_id': str(index), 'moves': line.split()}
+
+def main():
+    """Command line entry point for bulk validation"""
+    parser = argparse.ArgumentParser(description="Validate and replay chess games in bulk")
+    parser.add_argument('input', help="PGN file, or UCI file with --uci ('-' for stdin)")
+    parser.add_argument('--uci', action='store_true', help="Input holds one UCI game per line")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--output', default='-', help="Where to write JSON lines results ('-' for stdout)")
+    parser.add_argument('--errors-only', action='store_true', help="Only write games that failed validation")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', errors='replace')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    records = iter_uci_records(source) if args.uci else iter_pgn_records(source)
+    stats = ReplayStats()
+
+    try:
+        for result in replay_games(records, args.workers, args.batch_size, stats):
+            if args.errors_only and result.get('valid'):
+                continue
+            output.write(json.dumps(result) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(stats, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,491 @@ import time
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import chess
+import chess.polyglot
 import queue
 import datetime
 import os
 import signal
 import sys
+import random
+import select
+import secrets
+import hashlib
+import hmac
+import concurrent.futures
+from chess_accounts import MAX_PASSWORD_LENGTH, USER_DB_PATH, UserStore
+from chess_protocol import (ENCODING_JSON, UCI_PATTERN, UUID_PATTERN, Field, MessageDecoder,
+                            MessageSchema, ProtocolError, StreamCompressor, choose_compression,
+                            choose_encoding, encode_message, history_digest)
+
+# Bot strength levels: search depth, time budget per move (seconds) and how
+# far (in centipawns) below the best move a bot may randomly wander
+BOT_LEVELS = {
+    'beginner': {'depth': 1, 'time_budget': 0.5, 'blunder_margin': 300},
+    'casual': {'depth': 2, 'time_budget': 1.0, 'blunder_margin': 80},
+    'club': {'depth': 3, 'time_budget': 2.0, 'blunder_margin': 20},
+    'expert': {'depth': 4, 'time_budget': 4.0, 'blunder_margin': 0},
+}
+DEFAULT_BOT_LEVEL = 'casual'
+
+# Spectators are served by relay threads so that a move only costs the
+# mover's thread the writes to the two players
+SPECTATOR_RELAY_WORKERS = 4
+MAX_SPECTATORS_PER_GAME = 20000
+# A spectator whose connection can't take an update within this many
+# seconds is dropped, so one slow reader doesn't hold up the rest
+SPECTATOR_SEND_TIMEOUT = 2.0
+SEND_NOWAIT = getattr(socket, 'MSG_DONTWAIT', 0)  # send() flag: take what fits and return
+
+# Games one connection may follow at once with spectate_games
+MAX_WATCHED_GAMES = 64
+
+# Live game directory: page sizes, the orders it can be browsed in, and how
+# often subscribers are sent the changes to the page they're looking at
+DIRECTORY_PAGE_SIZE = 20
+MAX_DIRECTORY_PAGE_SIZE = 100
+DIRECTORY_SORTS = ('spectators', 'rating', 'newest', 'moves')
+DIRECTORY_PUSH_INTERVAL = 1.0
+
+# Listening sockets. Each port gets ACCEPT_WORKERS acceptor threads, each
+# with its own socket where SO_REUSEPORT lets the kernel spread connections
+# across them. The backlog absorbs connection storms such as a tournament
+# starting (the kernel caps it at net.core.somaxconn).
+LISTEN_BACKLOG = 1024
+ACCEPT_WORKERS = 4
+ACCEPT_ERROR_PAUSE = 0.1  # After a failed accept (usually out of file descriptors)
+
+# Accepted connections send small messages that shouldn't wait for Nagle,
+# and use keepalives so dead peers are noticed within a few minutes
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 15
+KEEPALIVE_PROBES = 4
+
+# Moves a player may queue during the opponent's turn
+MAX_PREMOVES = 3
+
+# Game lifecycle. A game is pending from when its seats are filled until
+# play starts, active while it's played, finished once it has a result and
+# archived when it's dropped from memory. States only move forward, so an
+# end reported twice (a resignation racing the final move) counts once.
+GAME_PENDING = 'pending'
+GAME_ACTIVE = 'active'
+GAME_FINISHED = 'finished'
+GAME_ARCHIVED = 'archived'
+GAME_STATES = (GAME_PENDING, GAME_ACTIVE, GAME_FINISHED, GAME_ARCHIVED)
+GAME_IN_PROGRESS = (GAME_PENDING, GAME_ACTIVE)
+GAME_ARCHIVE_DELAY = 60  # Seconds a finished game is kept for its spectators
+
+# Draws. Threefold repetition and the fifty-move rule let a player claim a
+# draw; fivefold repetition, the seventy-five-move rule and positions where
+# neither side can mate end the game without anyone asking.
+CLAIM_REPETITIONS = 3
+CLAIM_HALFMOVES = 100
+AUTOMATIC_REPETITIONS = 5
+AUTOMATIC_HALFMOVES = 150
+
+# Threads that check passwords, so slow hashing never holds up a connection
+# thread and a burst of logins can't take every core
+LOGIN_WORKERS = 2
+
+# Game results that count for ratings, as white's score
+RATED_SCORES = {'white': 1.0, 'black': 0.0, None: 0.5}
+
+# Graceful restarts. A draining server stops taking new games and gives the
+# active ones DRAIN_TIMEOUT seconds to finish; any still running are then
+# checkpointed to CHECKPOINT_DIR, where the next server picks them up (this
+# one started again, or a new process already sharing the ports through
+# SO_REUSEPORT). Players get RESUME_TIMEOUT seconds to log back in and take
+# their seats before they forfeit; a seat goes back to its account, or to
+# the guest holding the resume token sent at the checkpoint.
+DRAIN_TIMEOUT = 300
+CHECKPOINT_DIR = 'checkpoints'
+RESUME_TIMEOUT = 120
+DRAIN_REFUSED = {'create_lobby', 'join_lobby', 'start_game', 'add_bot', 'create_tournament',
+                 'join_tournament', 'add_tournament_bots', 'start_tournament'}
+
+# Token-bucket limits as (tokens per second, burst). Every connection has a
+# bucket per message type (types not listed share one default bucket); the
+# global buckets cap expensive operations across all connections together.
+RATE_LIMITS = {
+    'move': (5, 10),
+    'premove': (5, 10),
+    'cancel_premoves': (2, 5),
+    'resign': (1, 3),
+    'offer_draw': (0.2, 2),
+    'answer_draw': (1, 3),
+    'claim_draw': (1, 3),
+    'request_takeback': (0.2, 2),
+    'answer_takeback': (1, 3),
+    'list_lobbies': (1, 5),
+    'list_tournaments': (1, 5),
+    'list_games': (1, 5),
+    'subscribe_games': (0.5, 3),
+    'spectate': (1, 5),
+    'spectate_games': (0.5, 3),
+    'unspectate_games': (1, 5),
+    'history_request': (2, 10),
+    'create_lobby': (0.5, 3),
+    'create_tournament': (0.2, 2),
+    'add_bot': (0.5, 3),
+    'add_tournament_bots': (0.5, 3),
+}
+DEFAULT_RATE_LIMIT = (5, 10)
+GLOBAL_RATE_LIMITS = {
+    'list_lobbies': (200, 400),
+    'list_tournaments': (100, 200),
+    'list_games': (200, 400),
+    'spectate': (100, 200),
+}
+CHAT_RATE_LIMIT = (2, 8)
+# Rejected messages a connection may rack up (refilling at this rate)
+# before it is disconnected
+VIOLATION_LIMIT = (1, 30)
+
+# Largest message a client may send, in bytes. Clients only send small
+# requests (the biggest, spectate_games, is a few kilobytes), so anything
+# near this is an attack on memory and the connection is dropped.
+MAX_CLIENT_MESSAGE_SIZE = 64 * 1024
+
+# Message routing: type -> (handler method, schema). The schema's fields are
+# passed to the handler as positional arguments after the client, so a
+# handler only ever sees values of the right type and format.
+GAME_ID_FIELD = Field('game_id', str, required=True, pattern=UUID_PATTERN)
+LOBBY_ID_FIELD = Field('lobby_id', str, required=True, pattern=UUID_PATTERN)
+TOURNAMENT_ID_FIELD = Field('tournament_id', str, required=True, pattern=UUID_PATTERN)
+BOT_LEVEL_FIELD = Field('level', str, default=DEFAULT_BOT_LEVEL, choices=BOT_LEVELS)
+ACCEPT_FIELD = Field('accept', bool, required=True)
+
+DIRECTORY_VIEW_SCHEMA = MessageSchema(
+    Field('sort', str, default=DIRECTORY_SORTS[0], choices=DIRECTORY_SORTS),
+    Field('offset', int, default=0, minimum=0),
+    Field('limit', int, default=DIRECTORY_PAGE_SIZE, minimum=1, maximum=MAX_DIRECTORY_PAGE_SIZE))
+
+GAME_MESSAGE_HANDLERS = {
+    'create_lobby': ('handle_create_lobby', MessageSchema()),
+    'list_lobbies': ('handle_list_lobbies', MessageSchema()),
+    'join_lobby': ('handle_join_lobby', MessageSchema(LOBBY_ID_FIELD)),
+    'start_game': ('handle_start_game', MessageSchema(LOBBY_ID_FIELD)),
+    'add_bot': ('handle_add_bot', MessageSchema(LOBBY_ID_FIELD, BOT_LEVEL_FIELD)),
+    'create_tournament': ('handle_create_tournament', MessageSchema(
+        Field('format', str, default='swiss', choices=('swiss', 'round_robin')),
+        Field('rounds', int, minimum=1, maximum=100))),
+    'list_tournaments': ('handle_list_tournaments', MessageSchema()),
+    'join_tournament': ('handle_join_tournament', MessageSchema(TOURNAMENT_ID_FIELD)),
+    'add_tournament_bots': ('handle_add_tournament_bots', MessageSchema(
+        TOURNAMENT_ID_FIELD, BOT_LEVEL_FIELD, Field('count', int, default=1, minimum=1, maximum=64))),
+    'start_tournament': ('handle_start_tournament', MessageSchema(TOURNAMENT_ID_FIELD)),
+    'move': ('handle_game_move', MessageSchema(
+        GAME_ID_FIELD, Field('move', str, required=True, pattern=UCI_PATTERN))),
+    'premove': ('handle_premove', MessageSchema(
+        GAME_ID_FIELD, Field('move', str, required=True, pattern=UCI_PATTERN))),
+    'cancel_premoves': ('handle_cancel_premoves', MessageSchema(GAME_ID_FIELD)),
+    'resign': ('handle_resignation', MessageSchema(GAME_ID_FIELD)),
+    'offer_draw': ('handle_offer_draw', MessageSchema(GAME_ID_FIELD)),
+    'answer_draw': ('handle_answer_draw', MessageSchema(GAME_ID_FIELD, ACCEPT_FIELD)),
+    'claim_draw': ('handle_claim_draw', MessageSchema(GAME_ID_FIELD)),
+    'request_takeback': ('handle_takeback_request', MessageSchema(GAME_ID_FIELD)),
+    'answer_takeback': ('handle_answer_takeback', MessageSchema(GAME_ID_FIELD, ACCEPT_FIELD)),
+    'spectate': ('handle_spectate_request', MessageSchema(
+        GAME_ID_FIELD, Field('have_plies', int, default=0, minimum=0), Field('history_digest', int))),
+    'spectate_games': ('handle_spectate_games', MessageSchema(
+        Field('game_ids', list, required=True, min_length=1, max_length=MAX_WATCHED_GAMES))),
+    'unspectate_games': ('handle_unspectate_games', MessageSchema(
+        Field('game_ids', list, required=True, min_length=1, max_length=MAX_WATCHED_GAMES))),
+    'list_games': ('handle_list_games', DIRECTORY_VIEW_SCHEMA),
+    'subscribe_games': ('handle_subscribe_games', DIRECTORY_VIEW_SCHEMA),
+    'unsubscribe_games': ('handle_unsubscribe_games', MessageSchema()),
+    'history_request': ('handle_history_request', MessageSchema(
+        GAME_ID_FIELD, Field('from', int, default=0, minimum=0), Field('to', int, minimum=0))),
+}
+
+CHAT_MESSAGE_HANDLERS = {
+    'chat': ('handle_chat', MessageSchema(
+        Field('text', str, required=True, max_length=500),
+        Field('game_id', str, pattern=UUID_PATTERN),
+        Field('lobby_id', str, pattern=UUID_PATTERN))),
+}
+
+# The first message on a game connection
+HELLO_SCHEMA = MessageSchema(
+    Field('username', str, required=True, min_length=1, max_length=64),
+    Field('password', str, max_length=MAX_PASSWORD_LENGTH),
+    Field('encodings', list),
+    Field('compression', list),
+    Field('legal_moves', bool, default=True),
+    Field('resume_token', str, max_length=64))
+
+PIECE_VALUES = {
+    chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330,
+    chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0
+}
+MATE_SCORE = 100000
+CENTER_SQUARES = chess.SquareSet([chess.D4, chess.E4, chess.D5, chess.E5])
+
+def tune_connection(sock):
+    """Set the TCP options every accepted connection gets"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE), ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL),
+                          ('TCP_KEEPCNT', KEEPALIVE_PROBES)):
+        if hasattr(socket, option):  # Not every platform can tune these
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+def send_within(sock, data, timeout):
+    """Send all of data, raising socket.timeout if it takes longer than timeout.
+
+    The socket's own timeout is left alone, since its reader thread is
+    blocked in recv() on it.
+    """
+    deadline = time.monotonic() + timeout
+    view = memoryview(data)
+    while view:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([], [sock], [], remaining)[1]:
+            raise socket.timeout(f"{len(view)} bytes not sent within {timeout}s")
+        try:
+            # A blocking send() would wait for room for all of it
+            view = view[sock.send(view, SEND_NOWAIT):]
+        except BlockingIOError:
+            pass
+
+def token_hash(token):
+    """Hash of a resume token, as saved in checkpoints"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def listen_drops():
+    """Connections the kernel dropped because a listen queue was full, or None if unknown.
+
+    Counted across the whole host (Linux only), so servers compare it with
+    the count they saw at startup.
+    """
+    try:
+        with open('/proc/net/netstat') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for names, values in zip(lines[::2], lines[1::2]):
+        if names.startswith('TcpExt:'):
+            fields = dict(zip(names.split()[1:], values.split()[1:]))
+            return int(fields.get('ListenDrops', 0))
+    return None
+
+class SearchTimeout(Exception):
+    """Raised inside the bot search when the time budget is exhausted"""
+    pass
+
+def evaluate_board(board):
+    """Static evaluation in centipawns from the side to move's point of view"""
+    score = 0
+    for piece_type, value in PIECE_VALUES.items():
+        score += value * (len(board.pieces(piece_type, chess.WHITE)) -
+                          len(board.pieces(piece_type, chess.BLACK)))
+
+    # Small bonus for occupying the center
+    for square in CENTER_SQUARES:
+        piece = board.piece_at(square)
+        if piece:
+            score += 15 if piece.color == chess.WHITE else -15
+
+    return score if board.turn == chess.WHITE else -score
+
+def ordered_moves(board):
+    """Legal moves with captures and promotions searched first"""
+    moves = list(board.legal_moves)
+    moves.sort(key=lambda m: (board.is_capture(m), m.promotion is not None), reverse=True)
+    return moves
+
+def negamax(board, depth, alpha, beta, deadline):
+    """Alpha-beta negamax search, raises SearchTimeout past the deadline"""
+    if time.time() > deadline:
+        raise SearchTimeout()
+
+    moves = ordered_moves(board)
+    if not moves:
+        # Checkmate (prefer faster mates) or stalemate
+        return -MATE_SCORE - depth if board.is_check() else 0
+    if depth == 0:
+        return evaluate_board(board)
+
+    best = -MATE_SCORE * 2
+    for move in moves:
+        board.push(move)
+        score = -negamax(board, depth - 1, -beta, -alpha, deadline)
+        board.pop()
+        if score > best:
+            best = score
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            break
+    return best
+
+def bot_search(fen, max_depth, time_budget, blunder_margin=0):
+    """Pick a move for the position using iterative deepening.
+
+    Runs in a worker process, so it only takes and returns plain values.
+    Returns the chosen move in UCI notation, or None if there are no moves.
+    """
+    board = chess.Board(fen)
+    root_moves = ordered_moves(board)
+    if not root_moves:
+        return None
+
+    deadline = time.time() + time_budget
+    scores = {move: 0 for move in root_moves}
+
+    for depth in range(1, max_depth + 1):
+        depth_scores = {}
+        try:
+            for move in root_moves:
+                board.push(move)
+                depth_scores[move] = -negamax(board, depth - 1, -MATE_SCORE * 2, MATE_SCORE * 2, deadline)
+                board.pop()
+        except SearchTimeout:
+            break  # Keep the scores from the last completed depth
+        scores = depth_scores
+        # Search the best moves first at the next depth
+        root_moves.sort(key=lambda m: scores[m], reverse=True)
+
+    best_score = max(scores.values())
+    candidates = [m for m, s in scores.items() if s >= best_score - blunder_margin]
+    return random.choice(candidates).uci()
+
+class TokenBucket:
+    """Allows bursts up to capacity, refilling at rate tokens per second"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def consume(self, tokens=1):
+        """Take tokens if available, returning whether they were"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+class HandlerStats:
+    """Call count and time spent in one message handler"""
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.slowest = 0.0
+        
+    def record(self, elapsed):
+        self.calls += 1
+        self.total_time += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        
+    def __str__(self):
+        average_ms = self.total_time / self.calls * 1000 if self.calls else 0
+        return (f"{self.calls} calls, {self.total_time * 1000:.1f}ms total, "
+                f"{average_ms:.2f}ms avg, {self.slowest * 1000:.2f}ms max")
+
+class AcceptStats:
+    """Connections accepted and dropped, and how long accepting them took"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.errors = 0  # accept() failures and connections we couldn't set up
+        self.latency = HandlerStats()  # accept() returning -> connection thread reading
+        self.drops_at_start = listen_drops()
+        
+    def record_accept(self):
+        with self.lock:
+            self.accepted += 1
+            
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+            
+    def record_latency(self, elapsed):
+        with self.lock:
+            self.latency.record(elapsed)
+            
+    def listen_drops(self):
+        """Connections the kernel dropped since startup, or None if unknown"""
+        drops = listen_drops()
+        if drops is None or self.drops_at_start is None:
+            return None
+        return drops - self.drops_at_start
+        
+    def __str__(self):
+        drops = self.listen_drops()
+        dropped = f"{self.errors} failed, {drops if drops is not None else '?'} dropped by the kernel"
+        return f"{self.accepted} accepted ({dropped}); accept latency: {self.latency}"
+
+class WriteBatch:
+    """Messages one thread has sent during a tick, held back per connection.
+
+    A tick is the handling of everything read from one socket at once (or
+    one bot move). While a thread has a batch open, ChessClient.send queues
+    the encoded message here; closing the batch writes each connection's
+    messages with a single sendall, so a move's state, premove update and
+    game_over reach a player as one write instead of three. Nothing is
+    written while a game's lock is held either.
+    """
+    def __init__(self):
+        self.pending = {}  # connection -> encoded messages in the order they were sent
+        
+    def add(self, connection, data):
+        self.pending.setdefault(connection, []).append(data)
+        
+    def take(self, connection):
+        """Remove and return what's waiting for one connection"""
+        return self.pending.pop(connection, [])
+        
+    def flush(self):
+        """Write everything out; returns (messages, writes)"""
+        messages = 0
+        for connection, chunks in self.pending.items():
+            connection.write(chunks)
+            messages += len(chunks)
+        writes = len(self.pending)
+        self.pending = {}
+        return messages, writes
+
+class SharedMessage:
+    """A message sent unchanged to many clients, encoded once per encoding"""
+    def __init__(self, message, version=None):
+        self.message = message
+        self.version = version
+        self.payloads = {}  # encoding -> wire bytes
+
+    def get_type(self):
+        return self.message.get('type')
+
+    def encoded(self, encoding=ENCODING_JSON):
+        """Get the wire bytes, encoding on first use"""
+        payload = self.payloads.get(encoding)
+        if payload is None:
+            payload = encode_message(self.message, encoding)
+            self.payloads[encoding] = payload
+        return payload
+
+# Positions are told apart by their Polyglot Zobrist hash, kept up to date
+# move by move instead of hashed from scratch
+ZOBRIST = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+ZOBRIST_HASHER = chess.polyglot.ZobristHasher(ZOBRIST)
+CASTLING_HASHES = {}  # castling rights bitmask -> its part of the hash
+
+def zobrist_piece(piece, square):
+    """Hash of one piece standing on one square"""
+    return ZOBRIST[64 * ((piece.piece_type - 1) * 2 + piece.color) + square]
+
+def zobrist_state(board):
+    """Hash of everything but the pieces: castling rights, en passant file and turn"""
+    castling = CASTLING_HASHES.get(board.castling_rights)
+    if castling is None:
+        castling = CASTLING_HASHES[board.castling_rights] = ZOBRIST_HASHER.hash_castling(board)
+    en_passant = ZOBRIST_HASHER.hash_ep_square(board) if board.ep_square is not None else 0
+    return castling ^ en_passant ^ ZOBRIST_HASHER.hash_turn(board)
 
 class ChessGame:
     def __init__(self, game_id, white_player, black_player, time_control=600):
@@ -22,18 +502,68 @@ class ChessGame:
         self.black_time = time_control
         self.board = chess.Board()
         self.last_move_time = time.time()
+        self.start_time = self.last_move_time
         self.move_history = []
-        self.is_active = True
+        self.status = GAME_PENDING
         self.spectators = set()
         self.time_control = time_control
+        self.tournament = None
+        self.spectator_delay = 0  # Seconds spectator updates are held back
+        
+        # Every change to the position bumps the version; the shared state
+        # and spectator snapshot are built at most once per version
+        self.version = 0
+        self._state_cache = None
+        self._snapshot = None
+        self._legal_cache = None  # (version, {uci: chess.Move})
+        
+        # Repetitions are counted as the game goes: Zobrist hash -> times the
+        # position occurred. Every position's (pieces hash, full hash) is
+        # stacked too, so a takeback can undo its count.
+        pieces_hash = ZOBRIST_HASHER.hash_board(self.board)
+        key = pieces_hash ^ zobrist_state(self.board)
+        self.positions = [(pieces_hash, key)]
+        self.repetitions = {key: 1}
+        
+        # Standing offers, as the color that made them
+        self.draw_offer = None
+        self.takeback_request = None
+        
+        # A move and the premoves it triggers are applied under this lock
+        self.lock = threading.RLock()
+        self.premoves = {chess.WHITE: [], chess.BLACK: []}  # color -> queued UCI moves
+        
+    @property
+    def is_active(self):
+        """Check if the game is being played"""
+        return self.status == GAME_ACTIVE
+        
+    def advance(self, status):
+        """Move the game on to a later lifecycle state.
+        
+        Returns False if the game is already in that state or past it, so
+        whatever a transition sets off happens once however often it's asked for.
+        """
+        with self.lock:
+            if GAME_STATES.index(status) <= GAME_STATES.index(self.status):
+                return False
+            self.status = status
+            return True
+        
+    def legal_moves_by_uci(self):
+        """Get this ply's legal moves keyed by UCI, generated once per version"""
+        if not self._legal_cache or self._legal_cache[0] != self.version:
+            self._legal_cache = (self.version, {move.uci(): move for move in self.board.legal_moves})
+        return self._legal_cache[1]
         
     def make_move(self, move_uci):
-        # Check if move is legal
+        # Check if move is legal: one lookup in this ply's table, so illegal
+        # or malformed moves are rejected without parsing anything
+        move = self.legal_moves_by_uci().get(move_uci)
+        if move is None:
+            return False, "Illegal move"
+        
         try:
-            move = chess.Move.from_uci(move_uci)
-            if move not in self.board.legal_moves:
-                return False, "Illegal move"
-            
             # Update timers
             current_time = time.time()
             elapsed = current_time - self.last_move_time
@@ -42,63 +572,151 @@ class ChessGame:
                 self.white_time -= int(elapsed)
                 if self.white_time <= 0:
                     self.white_time = 0
+                    self.version += 1
                     return False, "White ran out of time"
             else:
                 self.black_time -= int(elapsed)
                 if self.black_time <= 0:
                     self.black_time = 0
+                    self.version += 1
                     return False, "Black ran out of time"
             
-            # Make the move
-            san_move = self.board.san(move)
-            self.board.push(move)
-            self.move_history.append(san_move)
+            self.push(move)
             self.last_move_time = current_time
             
+            # Moving turns down the opponent's draw offer; a takeback asked
+            # for before this move no longer takes back the right moves
+            mover = 'black' if self.board.turn == chess.WHITE else 'white'
+            if self.draw_offer != mover:
+                self.draw_offer = None
+            self.takeback_request = None
+            
             return True, None
         except Exception as e:
             return False, str(e)
     
+    def push(self, move):
+        """Play a legal move, keeping the history and repetition counts up to date"""
+        board = self.board
+        
+        # Only the squares the move touches change the pieces hash
+        squares = [move.from_square, move.to_square]
+        if board.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            if board.is_kingside_castling(move):
+                squares += [chess.square(7, rank), chess.square(5, rank)]
+            else:
+                squares += [chess.square(0, rank), chess.square(3, rank)]
+        elif board.is_en_passant(move):
+            squares.append(chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square)))
+        before = [(square, board.piece_at(square)) for square in squares]
+        
+        # The move is known to be legal, so SAN is worked out while pushing
+        # instead of by a separate board.san() pass
+        self.move_history.append(board.san_and_push(move))
+        
+        pieces_hash = self.positions[-1][0]
+        for square, piece in before:
+            if piece:
+                pieces_hash ^= zobrist_piece(piece, square)
+            piece = board.piece_at(square)
+            if piece:
+                pieces_hash ^= zobrist_piece(piece, square)
+        key = pieces_hash ^ zobrist_state(board)
+        self.positions.append((pieces_hash, key))
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        self.version += 1
+        
+    def take_back(self, plies):
+        """Undo the last plies moves"""
+        for _ in range(plies):
+            self.board.pop()
+            self.move_history.pop()
+            _, key = self.positions.pop()
+            self.repetitions[key] -= 1
+            if not self.repetitions[key]:
+                del self.repetitions[key]
+        
+        # The position went backwards: nothing built for the old version
+        # may be served again
+        self.version += 1
+        self._legal_cache = None
+        self.draw_offer = None
+        self.takeback_request = None
+        self.premoves = {chess.WHITE: [], chess.BLACK: []}
+        
+        # The clock starts over for whoever is to move now
+        self.last_move_time = time.time()
+        
+    def repetition_count(self):
+        """How many times the current position has occurred"""
+        return self.repetitions[self.positions[-1][1]]
+        
+    def claimable_draw(self):
+        """Get the rule a player could claim a draw under right now, or None"""
+        if self.repetition_count() >= CLAIM_REPETITIONS:
+            return "threefold repetition"
+        if self.board.halfmove_clock >= CLAIM_HALFMOVES:
+            return "fifty-move rule"
+        return None
+        
     def get_state(self, for_client=None):
         """Get the current game state"""
+        if not self._state_cache or self._state_cache[0] != self.version:
+            self._state_cache = (self.version, self._build_state())
+        state = dict(self._state_cache[1])
+        
+        # Determine if this is a specific player's turn. Legal moves only go
+        # to that player, and only if their client doesn't work them out
+        if for_client and self.color_of(for_client) == self.board.turn:
+            state['your_turn'] = True
+            if not getattr(for_client, 'wants_legal_moves', True):
+                del state['legal_moves']
+        else:
+            del state['legal_moves']
+        
+        return state
+    
+    def spectator_snapshot(self):
+        """Get the spectator state for the current ply, encoded once"""
+        if not self._snapshot or self._snapshot.version != self.version:
+            self._snapshot = SharedMessage(self.get_state(), self.version)
+        return self._snapshot
+    
+    def get_history_range(self, start, end=None):
+        """Get SAN moves from ply start up to (not including) ply end"""
+        return self.move_history[start:end]
+    
+    def _build_state(self):
+        """Build the state shared by everyone at the current ply"""
         turn = "white" if self.board.turn == chess.WHITE else "black"
         
         # Determine if the player is in check
         in_check = self.board.is_check()
         
-        # Generate legal moves for the current player
-        legal_moves = []
-        for move in self.board.legal_moves:
-            legal_moves.append(move.uci())
-        
-        # Determine if this is a specific player's turn
-        your_turn = False
-        if for_client:
-            if turn == "white" and for_client == self.white_player:
-                your_turn = True
-            elif turn == "black" and for_client == self.black_player:
-                your_turn = True
+        # Legal moves for the current player, from the table make_move uses
+        legal_moves = list(self.legal_moves_by_uci())
         
         # Check for game over conditions
         game_over = False
         result = None
         winner = None
-        if self.board.is_checkmate():
+        if not legal_moves and in_check:
             game_over = True
             result = "checkmate"
             winner = "black" if self.board.turn == chess.WHITE else "white"
-        elif self.board.is_stalemate():
+        elif not legal_moves:
             game_over = True
             result = "stalemate"
         elif self.board.is_insufficient_material():
             game_over = True
             result = "insufficient material"
-        elif self.board.is_fifty_moves():
+        elif self.board.halfmove_clock >= AUTOMATIC_HALFMOVES:
             game_over = True
-            result = "fifty-move rule"
-        elif self.board.is_repetition():
+            result = "seventy-five-move rule"
+        elif self.repetition_count() >= AUTOMATIC_REPETITIONS:
             game_over = True
-            result = "threefold repetition"
+            result = "fivefold repetition"
         
         # Create the state object
         state = {
@@ -106,14 +724,15 @@ class ChessGame:
             'game_id': self.game_id,
             'board_fen': self.board.fen(),
             'turn': turn,
-            'your_turn': your_turn,
+            'your_turn': False,
             'in_check': in_check,
             'legal_moves': legal_moves,
             'white_player': self.white_player.username if self.white_player else "?",
             'black_player': self.black_player.username if self.black_player else "?",
             'white_time': self.white_time,
             'black_time': self.black_time,
-            'move_history': self.move_history
+            'ply': len(self.move_history),
+            'move_history': list(self.move_history)
         }
         
         # If game is over, add that information
@@ -121,9 +740,35 @@ class ChessGame:
             state['game_over'] = True
             state['result'] = result
             state['winner'] = winner
+        elif self.claimable_draw():
+            state['draw_claimable'] = True
         
         return state
     
+    def color_of(self, client):
+        """Get a player's color, or None for anyone else"""
+        if client == self.white_player:
+            return chess.WHITE
+        if client == self.black_player:
+            return chess.BLACK
+        return None
+    
+    def queue_premove(self, color, move_uci):
+        """Queue a move for a player to make on their next turn"""
+        if len(self.premoves[color]) >= MAX_PREMOVES:
+            return False
+        self.premoves[color].append(move_uci)
+        return True
+    
+    def take_premove(self, color):
+        """Remove and return a player's next queued move, if any"""
+        if self.premoves[color]:
+            return self.premoves[color].pop(0)
+        return None
+    
+    def clear_premoves(self, color):
+        self.premoves[color] = []
+    
     def is_player(self, client):
         """Check if client is a player in this game"""
         return client == self.white_player or client == self.black_player
@@ -137,8 +782,11 @@ class ChessGame:
         return None
     
     def add_spectator(self, client):
-        """Add a spectator to the game"""
+        """Add a spectator to the game if there's room"""
+        if len(self.spectators) >= MAX_SPECTATORS_PER_GAME:
+            return False
         self.spectators.add(client)
+        return True
     
     def remove_spectator(self, client):
         """Remove a spectator from the game"""
@@ -191,6 +839,168 @@ class GameLobby:
         """Get the number of players in the lobby"""
         return len(self.players)
 
+class Tournament:
+    """A Swiss or round-robin tournament played as rounds of concurrent games.
+
+    Scores are updated as each game finishes, and the round is complete as
+    soon as the last of its games reports a result.
+    """
+    SWISS_WINDOW = 8  # How far down the score group to look for a new opponent
+
+    def __init__(self, tournament_id, host, format="swiss", rounds=None, time_control=600):
+        self.tournament_id = tournament_id
+        self.host = host
+        self.format = format  # swiss, round_robin
+        self.requested_rounds = rounds
+        self.time_control = time_control
+        self.players = []
+        self.scores = {}  # client_id -> points
+        self.opponents = {}  # client_id -> set of opponent client_ids
+        self.white_games = {}  # client_id -> number of games played as white
+        self.had_bye = set()
+        self.withdrawn = set()
+        self.current_round = 0
+        self.total_rounds = 0
+        self.pending_games = {}  # game_id -> (white client_id, black client_id) still being played
+        self.status = "registering"  # registering, running, finished
+        self.lock = threading.RLock()
+        self.add_player(host)
+
+    def add_player(self, player):
+        """Register a player before the tournament starts"""
+        if self.status != "registering" or player.client_id in self.scores:
+            return False
+        self.players.append(player)
+        self.scores[player.client_id] = 0.0
+        self.opponents[player.client_id] = set()
+        self.white_games[player.client_id] = 0
+        return True
+
+    def withdraw(self, player):
+        """Remove a player from future pairings"""
+        self.withdrawn.add(player.client_id)
+
+    def is_playing(self, player):
+        """Check if a player is registered and hasn't withdrawn"""
+        return player.client_id in self.scores and player.client_id not in self.withdrawn
+
+    def forfeit(self, present):
+        """Score a pairing that couldn't be played: whoever could play gets the point"""
+        with self.lock:
+            if present:
+                self.scores[present.client_id] += 1.0
+
+    def start(self):
+        """Close registration and work out the number of rounds"""
+        count = len(self.players)
+        if self.format == "round_robin":
+            self.total_rounds = count - 1 if count % 2 == 0 else count
+        else:
+            self.total_rounds = self.requested_rounds or max(1, (count - 1).bit_length())
+        self.status = "running"
+
+    def active_players(self):
+        """Players still taking part in pairings"""
+        return [p for p in self.players if p.client_id not in self.withdrawn]
+
+    def pair_next_round(self):
+        """Pair the next round, returning (pairings, bye_player)"""
+        self.current_round += 1
+        if self.format == "round_robin":
+            pairs = self._pair_round_robin()
+        else:
+            pairs = self._pair_swiss()
+
+        pairings = []
+        bye = None
+        for first, second in pairs:
+            if first is None or second is None:
+                bye = first or second
+                continue
+            if first.client_id in self.withdrawn or second.client_id in self.withdrawn:
+                # Opponent withdrew: the remaining player scores the point
+                remaining = second if first.client_id in self.withdrawn else first
+                if remaining.client_id not in self.withdrawn:
+                    self.scores[remaining.client_id] += 1.0
+                continue
+            pairings.append(self._assign_colors(first, second))
+
+        if bye:
+            self.had_bye.add(bye.client_id)
+            self.scores[bye.client_id] += 1.0
+        return pairings, bye
+
+    def _pair_round_robin(self):
+        """Circle method: the first player stays put, the rest rotate"""
+        seats = list(self.players)
+        if len(seats) % 2:
+            seats.append(None)
+        shift = (self.current_round - 1) % (len(seats) - 1)
+        rest = seats[1:]
+        rest = rest[-shift:] + rest[:-shift] if shift else rest
+        seats = [seats[0]] + rest
+        half = len(seats) // 2
+        return [(seats[i], seats[-1 - i]) for i in range(half)]
+
+    def _pair_swiss(self):
+        """Pair neighbours in the standings, avoiding rematches nearby"""
+        ranked = sorted(self.active_players(), key=lambda p: -self.scores[p.client_id])
+        pairs = []
+
+        # Odd count: the lowest ranked player without a bye sits out
+        if len(ranked) % 2:
+            for index in range(len(ranked) - 1, -1, -1):
+                if ranked[index].client_id not in self.had_bye:
+                    pairs.append((ranked.pop(index), None))
+                    break
+            else:
+                pairs.append((ranked.pop(), None))
+
+        unpaired = ranked
+        while unpaired:
+            player = unpaired.pop(0)
+            played = self.opponents[player.client_id]
+            choice = 0
+            for index, candidate in enumerate(unpaired[:self.SWISS_WINDOW]):
+                if candidate.client_id not in played:
+                    choice = index
+                    break
+            pairs.append((player, unpaired.pop(choice)))
+        return pairs
+
+    def _assign_colors(self, first, second):
+        """Give white to whichever player has had it less often"""
+        if self.white_games[first.client_id] > self.white_games[second.client_id]:
+            first, second = second, first
+        self.white_games[first.client_id] += 1
+        self.opponents[first.client_id].add(second.client_id)
+        self.opponents[second.client_id].add(first.client_id)
+        return first, second
+
+    def record_result(self, game, winner):
+        """Score a finished game; returns True when it completed the round"""
+        with self.lock:
+            if game.game_id not in self.pending_games:
+                return False  # Already scored
+            white_id, black_id = self.pending_games.pop(game.game_id)
+            if winner == "white":
+                self.scores[white_id] += 1.0
+            elif winner == "black":
+                self.scores[black_id] += 1.0
+            else:
+                self.scores[white_id] += 0.5
+                self.scores[black_id] += 0.5
+            return not self.pending_games
+
+    def is_last_round(self):
+        """Check if the current round is the final one"""
+        return self.current_round >= self.total_rounds
+
+    def standings(self):
+        """Get players ordered by score"""
+        ranked = sorted(self.players, key=lambda p: -self.scores[p.client_id])
+        return [{'player': p.username, 'score': self.scores[p.client_id]} for p in ranked]
+
 class ChessClient:
     def __init__(self, client_socket, address, server):
         self.socket = client_socket
@@ -200,28 +1010,112 @@ class ChessClient:
         self.client_id = str(uuid.uuid4())
         self.current_game = None
         self.current_lobby = None
+        self.watched_games = set()  # Games followed with spectate_games, besides current_game
+        self.account = None  # chess_accounts.Account for registered players
+        self.rating = None  # Guests are unrated
         self.is_authenticated = False
+        self.login_pending = False  # Password being checked on the login pool
+        self.resume_token = None  # Claims a guest's seat in a game restored after a restart
         self.last_activity = time.time()
-        
-    def authenticate(self, username):
-        """Set the username and mark as authenticated"""
-        self.username = username
+        self.encoding = ENCODING_JSON  # Wire encoding negotiated at login
+        self.compressor = None  # StreamCompressor when compression was negotiated
+        self.wants_legal_moves = True  # False for clients that generate their own
+        self.send_lock = threading.Lock()  # Keeps compressed output in stream order
+        
+        # Flood protection
+        self.is_connected = True
+        self.rate_buckets = {}  # message type -> TokenBucket
+        self.violation_bucket = TokenBucket(*VIOLATION_LIMIT)
+        self.rate_violations = 0
+        self.throttled = False
+        
+    def authenticate(self, username, account=None):
+        """Set the username and account, and mark as authenticated"""
+        self.username = account.display_name if account else username
+        self.account = account
+        self.rating = account.rating if account else None
         self.is_authenticated = True
         
-    def send(self, message):
-        """Send a message to the client"""
+    def send(self, message, timeout=None):
+        """Send a message to the client, or queue it if this thread has a write batch open"""
         try:
-            if isinstance(message, dict):
-                message = json.dumps(message)
-            self.socket.sendall(message.encode())
+            if isinstance(message, SharedMessage):
+                data = message.encoded(self.encoding)
+            elif isinstance(message, dict):
+                data = encode_message(message, self.encoding)
+            else:
+                data = message.encode()
+        except Exception as e:
+            self.server.log(f"Error encoding message for {self.username}: {e}")
+            return False
+        
+        batch = self.server.current_write_batch()
+        if batch is not None:
+            batch.add(self, data)
+            return True
+        return self.write([data], timeout)
+    
+    def write(self, chunks, timeout=None):
+        """Write encoded messages to the socket with one call.
+        
+        With a timeout, gives up and returns False if the socket can't take
+        everything in time. The message may then be cut short on the wire,
+        so the caller has to drop the connection.
+        """
+        try:
+            if not self.send_lock.acquire(timeout=-1 if timeout is None else timeout):
+                raise socket.timeout("another write is still in progress")
+            try:
+                if self.compressor:
+                    # Each message is still compressed on its own, in order
+                    chunks = [self.compressor.compress(data) for data in chunks]
+                if timeout is None:
+                    self.socket.sendall(b''.join(chunks))
+                else:
+                    send_within(self.socket, b''.join(chunks), timeout)
+            finally:
+                self.send_lock.release()
             self.last_activity = time.time()
             return True
         except Exception as e:
             self.server.log(f"Error sending to {self.username}: {e}")
             return False
     
+    def flush(self):
+        """Write out what this thread's batch holds for us now, instead of at the end of the tick"""
+        batch = self.server.current_write_batch()
+        if batch is not None:
+            pending = batch.take(self)
+            if pending:
+                self.write(pending)
+    
+    def allow_message(self, message_type):
+        """Take a token from this connection's bucket for a message type"""
+        if message_type not in RATE_LIMITS:
+            message_type = None  # Unlisted types share one bucket
+        bucket = self.rate_buckets.get(message_type)
+        if bucket is None:
+            bucket = TokenBucket(*RATE_LIMITS.get(message_type, DEFAULT_RATE_LIMIT))
+            self.rate_buckets[message_type] = bucket
+        return bucket.consume()
+    
+    def compression_stats(self):
+        """Get this connection's compression totals, or None if uncompressed"""
+        return self.compressor.stats() if self.compressor else None
+    
     def disconnect(self):
         """Disconnect the client from the server"""
+        # Whatever this tick still holds for us (often the reason we're
+        # being dropped) goes out first
+        self.flush()
+        
+        self.is_connected = False
+        try:
+            # Shut down first: close() alone leaves the socket open while
+            # our reader thread is still blocked in recv()
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
         try:
             self.socket.close()
         except:
@@ -246,6 +1140,13 @@ class ChatClient:
         self.client_id = None
         self.game_client = None  # Reference to the associated game client
         
+        # Flood protection
+        self.is_connected = True
+        self.chat_bucket = TokenBucket(*CHAT_RATE_LIMIT)
+        self.violation_bucket = TokenBucket(*VIOLATION_LIMIT)
+        self.rate_violations = 0
+        self.throttled = False
+        
     def send(self, message):
         """Send a message to the client"""
         try:
@@ -259,11 +1160,421 @@ class ChatClient:
     
     def disconnect(self):
         """Disconnect the client from the chat server"""
+        self.is_connected = False
+        try:
+            # Shut down first: close() alone leaves the socket open while
+            # our reader thread is still blocked in recv()
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
         try:
             self.socket.close()
         except:
             pass
 
+class BotPlayer:
+    """A server-side opponent that takes a seat in a game like a ChessClient.
+
+    Messages sent to the bot are inspected instead of written to a socket.
+    When a game state says it's the bot's turn, the search is submitted to
+    the server's process pool and the chosen move is applied later by the
+    server's bot thread, so searching never blocks a networking thread.
+    """
+    def __init__(self, server, level=DEFAULT_BOT_LEVEL):
+        self.server = server
+        self.level = level
+        self.settings = BOT_LEVELS[level]
+        self.client_id = str(uuid.uuid4())
+        self.username = f"Bot-{level}-{self.client_id[:4]}"
+        self.current_game = None
+        self.rating = None
+        self.current_lobby = None
+        self.is_authenticated = True
+        self.is_bot = True
+        self.wants_legal_moves = False  # The search works from the FEN
+        self.last_activity = time.time()
+        self.pending_fen = None
+
+    def send(self, message):
+        """Handle a message from the server, starting a search on our turn"""
+        if isinstance(message, SharedMessage):
+            message = message.message
+        if isinstance(message, dict) and message.get('type') == 'game_state':
+            if message.get('your_turn') and not message.get('game_over'):
+                self.request_move(message)
+        self.last_activity = time.time()
+        return True
+
+    def request_move(self, state):
+        """Submit a search for the current position to the bot pool"""
+        fen = state.get('board_fen')
+        if not fen or fen == self.pending_fen or not self.server.bot_pool:
+            return
+        self.pending_fen = fen
+
+        # Never spend more than a small slice of the remaining clock
+        remaining = state.get('white_time') if state.get('turn') == 'white' else state.get('black_time')
+        time_budget = min(self.settings['time_budget'], max(0.1, (remaining or 0) / 30))
+
+        try:
+            future = self.server.bot_pool.submit(
+                bot_search, fen, self.settings['depth'], time_budget, self.settings['blunder_margin'])
+        except Exception as e:
+            self.server.log(f"Bot {self.username} could not start a search: {e}")
+            self.pending_fen = None
+            return
+
+        game_id = state.get('game_id')
+        future.add_done_callback(lambda f: self.server.bot_results.put((self, game_id, fen, f)))
+
+    def disconnect(self):
+        """Bots have no connection; just leave any game or lobby"""
+        if self.current_game:
+            self.server.handle_player_leave_game(self)
+        if self.current_lobby:
+            self.server.handle_player_leave_lobby(self)
+
+    def __str__(self):
+        return f"{self.username}({self.client_id})"
+
+class AbsentPlayer:
+    """Keeps a seat in a restored game until its player logs back in.
+
+    Stands in for the ChessClient wherever a game touches its players and
+    drops everything sent to it. The player takes the seat back by logging
+    in under the same name: registered players into the same account, and
+    guests with the resume token they were sent as the game was checkpointed.
+    """
+    def __init__(self, username, account_name=None, token_hash=None):
+        self.username = username
+        self.account_name = account_name  # Account the seat belongs to, None for a guest
+        self.token_hash = token_hash  # Hash of the guest's resume token
+        self.client_id = str(uuid.uuid4())
+        self.current_game = None
+        self.current_lobby = None
+        self.account = None
+        self.rating = None
+        self.is_authenticated = True
+        self.wants_legal_moves = False
+        self.last_activity = time.time()
+
+    def send(self, message):
+        """Nobody to deliver to until the player is back"""
+        return True
+
+    def disconnect(self):
+        """Nothing to close"""
+        pass
+
+    def __str__(self):
+        return f"{self.username}(absent)"
+
+class SpectatorRelay:
+    """Delivers game updates to one share of the spectators of every game.
+
+    The game owner publishes each update once per relay. The relay encodes
+    it once and writes it to its own spectators, optionally after the
+    game's spectator delay. When several states of the same game are
+    waiting to go out, only the newest one is sent. Spectators who can't
+    take an update within SPECTATOR_SEND_TIMEOUT are disconnected rather
+    than left to stall everyone after them.
+    """
+    def __init__(self, server, index):
+        self.server = server
+        self.index = index
+        self.queue = queue.Queue()
+        self.subscribers = {}  # game_id -> set of spectators
+        self.lock = threading.Lock()
+        self.pending = []  # (due_time, game_id, message, target) waiting to go out
+        self.running = False
+        self.thread = None
+        self.messages_sent = 0
+        self.states_coalesced = 0
+        self.spectators_dropped = 0
+
+    def subscribe(self, game_id, client):
+        """Start relaying a game's updates to a spectator"""
+        with self.lock:
+            self.subscribers.setdefault(game_id, set()).add(client)
+
+    def unsubscribe(self, game_id, client):
+        """Stop relaying a game's updates to a spectator"""
+        with self.lock:
+            spectators = self.subscribers.get(game_id)
+            if spectators:
+                spectators.discard(client)
+                if not spectators:
+                    del self.subscribers[game_id]
+
+    def drop_game(self, game_id):
+        """Forget all spectators of a game"""
+        with self.lock:
+            self.subscribers.pop(game_id, None)
+
+    def has_spectators(self, game_id):
+        """Check if this relay serves anyone watching the game"""
+        return game_id in self.subscribers
+
+    def publish(self, game_id, message, delay=0, target=None):
+        """Queue a message for the game's spectators (or just target)"""
+        if not isinstance(message, SharedMessage):
+            message = SharedMessage(message)
+        self.queue.put((time.time() + delay, game_id, message, target))
+
+    def start(self):
+        """Start the relay thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the relay thread"""
+        self.running = False
+        self.queue.put(None)
+
+    def run(self):
+        """Relay loop: collect published updates and deliver the due ones"""
+        while self.running:
+            timeout = 1.0
+            if self.pending:
+                timeout = max(0, self.pending[0][0] - time.time())
+            try:
+                item = self.queue.get(timeout=timeout)
+                # Take everything that's already queued so it can be coalesced
+                while item is not None:
+                    self.pending.append(item)
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+                
+            try:
+                self.deliver_due()
+            except Exception as e:
+                self.server.log(f"Error in spectator relay {self.index}: {e}")
+
+    def deliver_due(self):
+        """Send every update whose delay has passed"""
+        now = time.time()
+        self.pending.sort(key=lambda item: item[0])
+        split = 0
+        while split < len(self.pending) and self.pending[split][0] <= now:
+            split += 1
+        due, self.pending = self.pending[:split], self.pending[split:]
+        
+        # Only the newest broadcast state of each game is worth sending
+        latest_state = {}
+        for index, (_, game_id, message, target) in enumerate(due):
+            if target is None and message.get_type() == 'game_state':
+                latest_state[game_id] = index
+                
+        for index, (_, game_id, message, target) in enumerate(due):
+            if target is None and message.get_type() == 'game_state' and latest_state[game_id] != index:
+                self.states_coalesced += 1
+                continue
+                
+            if target is not None:
+                spectators = [target]
+            else:
+                with self.lock:
+                    spectators = list(self.subscribers.get(game_id, ()))
+            if not spectators:
+                continue
+                
+            # Shared messages are encoded once for all spectators
+            for spectator in spectators:
+                if spectator.send(message, timeout=SPECTATOR_SEND_TIMEOUT):
+                    self.messages_sent += 1
+                else:
+                    self.drop_spectator(spectator)
+    
+    def drop_spectator(self, spectator):
+        """Disconnect a spectator whose updates couldn't be written"""
+        with self.lock:
+            for game_id in [game_id for game_id, spectators in self.subscribers.items() if spectator in spectators]:
+                self.subscribers[game_id].discard(spectator)
+                if not self.subscribers[game_id]:
+                    del self.subscribers[game_id]
+        if not spectator.is_connected:
+            return  # Already gone
+        self.spectators_dropped += 1
+        self.server.log(f"Dropping spectator {spectator.username}: not keeping up with game updates")
+        spectator.disconnect()
+
+class GameDirectory:
+    """Index of the games in progress, for finding games to spectate.
+
+    Games are marked dirty as they start, change and end; their entries and
+    the sort orders are only rebuilt when someone looks. Subscribers watch
+    one page of one order, and once per push interval each subscriber whose
+    page changed is sent just the entries that differ. Subscribers looking
+    at the same page get the same update, built and encoded once, and
+    clients that aren't browsing cost nothing.
+    """
+    SORT_KEYS = {
+        'spectators': lambda entry: (-entry['spectators'], -entry['started']),
+        'rating': lambda entry: (entry['rating'] is None, -(entry['rating'] or 0), -entry['started']),
+        'newest': lambda entry: -entry['started'],
+        'moves': lambda entry: (-(entry['ply'] or 0), -entry['started']),
+    }
+
+    def __init__(self, server):
+        self.server = server
+        self.lock = threading.Lock()
+        self.games = {}  # game_id -> ChessGame listed
+        self.entries = {}  # game_id -> entry dict, replaced whenever it's rebuilt
+        self.revisions = {}  # game_id -> number bumped on each rebuild
+        self.revision = 0
+        self.dirty = set()  # game_ids whose entry needs rebuilding
+        self.orders = {}  # sort -> game_ids in order, dropped when anything changes
+        self.stale = False  # Something changed since the last push
+        self.subscribers = {}  # client -> (sort, offset, limit, (total, page signature) last sent)
+        self.running = False
+        self.thread = None
+        self.updates_sent = 0
+
+    def add(self, game):
+        """List a game that just started"""
+        with self.lock:
+            self.games[game.game_id] = game
+            self.dirty.add(game.game_id)
+            self.stale = True
+
+    def touch(self, game):
+        """Note that a listed game changed (a move, a spectator)"""
+        with self.lock:
+            if game.game_id in self.games:
+                self.dirty.add(game.game_id)
+                self.stale = True
+
+    def remove(self, game_id):
+        """Stop listing a game"""
+        with self.lock:
+            if self.games.pop(game_id, None):
+                self.entries.pop(game_id, None)
+                self.revisions.pop(game_id, None)
+                self.dirty.discard(game_id)
+                self.orders = {}
+                self.stale = True
+
+    def build_entry(self, game):
+        """Get the directory entry for a game"""
+        ratings = [player.rating for player in (game.white_player, game.black_player)
+                   if player and player.rating is not None]
+        return {
+            'game_id': game.game_id,
+            'white_player': game.white_player.username if game.white_player else None,
+            'black_player': game.black_player.username if game.black_player else None,
+            'rating': round(sum(ratings) / len(ratings)) if ratings else None,
+            'spectators': len(game.spectators),
+            # Delayed broadcasts don't give away how far the game has got
+            'ply': None if game.spectator_delay else len(game.move_history),
+            'started': game.start_time,
+            'tournament': game.tournament is not None
+        }
+
+    def refresh(self):
+        """Rebuild the dirty entries; call with the lock held"""
+        if not self.dirty:
+            return
+        for game_id in self.dirty:
+            game = self.games.get(game_id)
+            if game:
+                self.revision += 1
+                self.entries[game_id] = self.build_entry(game)
+                self.revisions[game_id] = self.revision
+        self.dirty.clear()
+        self.orders = {}
+
+    def order(self, sort):
+        """Get the listed game_ids in a sort order; call with the lock held"""
+        if sort not in self.orders:
+            key = self.SORT_KEYS[sort]
+            self.orders[sort] = [entry['game_id'] for entry in sorted(self.entries.values(), key=key)]
+        return self.orders[sort]
+
+    def view(self, sort, offset, limit):
+        """Get the total and the (game_id, revision) pairs of a page; call with the lock held"""
+        game_ids = self.order(sort)[offset:offset + limit]
+        return (len(self.entries), tuple((game_id, self.revisions[game_id]) for game_id in game_ids))
+
+    def page(self, sort, offset, limit, subscriber=None):
+        """Get one page of the directory as a games_list message, optionally subscribing to it"""
+        with self.lock:
+            self.refresh()
+            view = self.view(sort, offset, limit)
+            if subscriber:
+                self.subscribers[subscriber] = (sort, offset, limit, view)
+            return {
+                'type': 'games_list',
+                'sort': sort,
+                'offset': offset,
+                'total': view[0],
+                'games': [self.entries[game_id] for game_id, _ in view[1]]
+            }
+
+    def unsubscribe(self, client):
+        """Stop sending a client directory updates"""
+        with self.lock:
+            self.subscribers.pop(client, None)
+
+    def push(self):
+        """Send every subscriber whose page changed what's different about it"""
+        outgoing = []
+        with self.lock:
+            if not self.subscribers or not self.stale:
+                return
+            self.stale = False
+            self.refresh()
+
+            updates = {}
+            for client, (sort, offset, limit, sent) in list(self.subscribers.items()):
+                current = self.view(sort, offset, limit)
+                if current == sent:
+                    continue
+
+                # Subscribers that saw the same page and now see the same
+                # page share one message
+                key = (sort, offset, limit, sent, current)
+                if key not in updates:
+                    seen = dict(sent[1])
+                    updates[key] = SharedMessage({
+                        'type': 'games_update',
+                        'sort': sort,
+                        'offset': offset,
+                        'total': current[0],
+                        'order': [game_id for game_id, _ in current[1]],
+                        'changed': [self.entries[game_id] for game_id, revision in current[1]
+                                    if seen.get(game_id) != revision],
+                        'removed': [game_id for game_id in seen if game_id not in self.entries]
+                    })
+                self.subscribers[client] = (sort, offset, limit, current)
+                outgoing.append((client, updates[key]))
+
+        for client, message in outgoing:
+            client.send(message)
+        self.updates_sent += len(outgoing)
+
+    def start(self):
+        """Start the push thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the push thread"""
+        self.running = False
+
+    def run(self):
+        """Push loop: send the directory changes once per interval"""
+        while self.running:
+            time.sleep(DIRECTORY_PUSH_INTERVAL)
+            try:
+                self.push()
+            except Exception as e:
+                self.server.log(f"Error in game directory: {e}")
+
 class ChessServerGUI:
     def __init__(self, root):
         self.root = root
@@ -280,16 +1591,67 @@ class ChessServerGUI:
         self.chat_clients = {}  # client_id -> ChatClient
         self.games = {}  # game_id -> ChessGame
         self.lobbies = {}  # lobby_id -> GameLobby
+        self.tournaments = {}  # tournament_id -> Tournament
         
-        # Server sockets
-        self.game_socket = None
-        self.chat_socket = None
+        # Server sockets, one per acceptor where the ports can be shared
+        self.listen_backlog = LISTEN_BACKLOG
+        self.accept_workers = ACCEPT_WORKERS
+        self.game_sockets = []
+        self.chat_sockets = []
+        self.accept_stats = AcceptStats()
         
         # Threading
         self.running = False
         self.threads = []
         self.log_queue = queue.Queue()
         
+        # Bot players search in a process pool; finished searches are queued
+        # and applied by the bot thread
+        self.bot_workers = max(1, (os.cpu_count() or 2) - 1)
+        self.bot_pool = None
+        self.bot_results = queue.Queue()
+        
+        # Spectator relays, and the delay applied to spectator updates
+        self.spectator_relays = []
+        self.spectator_delay = 0
+        
+        # Games in progress, browsable by clients looking for one to spectate
+        self.game_directory = GameDirectory(self)
+        
+        # Player accounts and ratings, opened with the server; passwords are
+        # checked on the login pool
+        self.user_db_path = USER_DB_PATH
+        self.user_store = None
+        self.login_pool = None
+        
+        # Graceful restarts: drain mode, and seats of restored games waiting
+        # for their players
+        self.checkpoint_dir = CHECKPOINT_DIR
+        self.draining = False
+        self.drain_deadline = None
+        self.drain_notice = None  # The server_draining message, once draining
+        self.absent_seats = {}  # lower-cased username -> (game, color, deadline)
+        
+        # Flood protection shared by all connections, and its counters
+        self.global_rate_buckets = {message_type: TokenBucket(*limit)
+                                    for message_type, limit in GLOBAL_RATE_LIMITS.items()}
+        self.rate_limited_messages = 0
+        self.rate_limit_disconnects = 0
+        
+        # Message routing tables, bound to this server's handlers
+        self.game_handlers = {message_type: (getattr(self, name), schema)
+                              for message_type, (name, schema) in GAME_MESSAGE_HANDLERS.items()}
+        self.chat_handlers = {message_type: (getattr(self, name), schema)
+                              for message_type, (name, schema) in CHAT_MESSAGE_HANDLERS.items()}
+        self.handler_stats = {}  # message type -> HandlerStats
+        self.invalid_messages = 0
+        self.unknown_messages = 0
+        
+        # Per-thread write batches, and how much they saved
+        self.write_batches = threading.local()
+        self.batched_messages = 0
+        self.batched_writes = 0
+        
         # Setup UI
         self.setup_ui()
         
@@ -322,6 +1684,23 @@ class ChessServerGUI:
         self.chat_port_entry.insert(0, str(self.chat_port))
         self.chat_port_entry.grid(row=1, column=1, padx=5, pady=2, sticky=tk.W)
         
+        # Spectator delay
+        ttk.Label(settings_frame, text="Spectator Delay (s):").grid(row=2, column=0, padx=5, pady=2, sticky=tk.W)
+        self.spectator_delay_entry = ttk.Entry(settings_frame, width=6)
+        self.spectator_delay_entry.insert(0, str(self.spectator_delay))
+        self.spectator_delay_entry.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
+        
+        # Listen backlog and acceptor threads per port
+        ttk.Label(settings_frame, text="Listen Backlog:").grid(row=3, column=0, padx=5, pady=2, sticky=tk.W)
+        self.backlog_entry = ttk.Entry(settings_frame, width=6)
+        self.backlog_entry.insert(0, str(self.listen_backlog))
+        self.backlog_entry.grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
+        
+        ttk.Label(settings_frame, text="Acceptors:").grid(row=4, column=0, padx=5, pady=2, sticky=tk.W)
+        self.acceptors_entry = ttk.Entry(settings_frame, width=6)
+        self.acceptors_entry.insert(0, str(self.accept_workers))
+        self.acceptors_entry.grid(row=4, column=1, padx=5, pady=2, sticky=tk.W)
+        
         # Server control buttons
         control_frame = ttk.Frame(left_frame)
         control_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -332,6 +1711,28 @@ class ChessServerGUI:
         self.stop_button = ttk.Button(control_frame, text="Stop Server", command=self.stop_server, state=tk.DISABLED)
         self.stop_button.pack(side=tk.LEFT, padx=5, pady=5)
         
+        ttk.Button(control_frame, text="Handler Stats", command=self.log_handler_stats).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        ttk.Button(control_frame, text="Recompute Ratings", command=self.recompute_ratings).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        self.drain_button = ttk.Button(control_frame, text="Drain", command=self.start_drain, state=tk.DISABLED)
+        self.drain_button.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # Bot match controls (useful for load testing)
+        bot_frame = ttk.LabelFrame(left_frame, text="Bot Match")
+        bot_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.white_bot_level = ttk.Combobox(bot_frame, values=list(BOT_LEVELS), width=9, state="readonly")
+        self.white_bot_level.set(DEFAULT_BOT_LEVEL)
+        self.white_bot_level.grid(row=0, column=0, padx=5, pady=2)
+        
+        self.black_bot_level = ttk.Combobox(bot_frame, values=list(BOT_LEVELS), width=9, state="readonly")
+        self.black_bot_level.set(DEFAULT_BOT_LEVEL)
+        self.black_bot_level.grid(row=0, column=1, padx=5, pady=2)
+        
+        self.bot_match_button = ttk.Button(bot_frame, text="Start Bot Match", command=self.start_bot_match, state=tk.DISABLED)
+        self.bot_match_button.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky=tk.EW)
+        
         # Server statistics
         stats_frame = ttk.LabelFrame(left_frame, text="Server Statistics")
         stats_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -352,6 +1753,14 @@ class ChessServerGUI:
         self.lobbies_label = ttk.Label(stats_frame, text="0")
         self.lobbies_label.grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
         
+        ttk.Label(stats_frame, text="Rate limited:").grid(row=4, column=0, padx=5, pady=2, sticky=tk.W)
+        self.rate_limited_label = ttk.Label(stats_frame, text="0")
+        self.rate_limited_label.grid(row=4, column=1, padx=5, pady=2, sticky=tk.W)
+        
+        ttk.Label(stats_frame, text="Connections:").grid(row=5, column=0, padx=5, pady=2, sticky=tk.W)
+        self.connections_label = ttk.Label(stats_frame, text="0")
+        self.connections_label.grid(row=5, column=1, padx=5, pady=2, sticky=tk.W)
+        
         # Connected clients
         clients_frame = ttk.LabelFrame(left_frame, text="Connected Clients")
         clients_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -398,42 +1807,61 @@ class ChessServerGUI:
             # Get port settings
             game_port = int(self.game_port_entry.get())
             chat_port = int(self.chat_port_entry.get())
+            self.spectator_delay = max(0.0, float(self.spectator_delay_entry.get() or 0))
+            self.listen_backlog = max(1, int(self.backlog_entry.get() or LISTEN_BACKLOG))
+            self.accept_workers = max(1, int(self.acceptors_entry.get() or ACCEPT_WORKERS))
             
             # Update server settings
             self.game_port = game_port
             self.chat_port = chat_port
             
             # Create server sockets
-            self.game_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.game_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.game_socket.bind(('0.0.0.0', self.game_port))
-            self.game_socket.listen(5)
-            
-            self.chat_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.chat_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.chat_socket.bind(('0.0.0.0', self.chat_port))
-            self.chat_socket.listen(5)
+            self.accept_stats = AcceptStats()
+            self.game_sockets = self.open_listeners(self.game_port)
+            self.chat_sockets = self.open_listeners(self.chat_port)
             
             # Update UI
             self.status_label.config(text="Online")
             self.status_bar.config(text=f"Server running on ports {self.game_port} (game) and {self.chat_port} (chat)")
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
+            self.bot_match_button.config(state=tk.NORMAL)
+            self.drain_button.config(state=tk.NORMAL)
             
             # Start server threads
             self.running = True
             
-            # Game connection thread
-            game_thread = threading.Thread(target=self.handle_game_connections)
-            game_thread.daemon = True
-            game_thread.start()
-            self.threads.append(game_thread)
+            # Process pool for bot searches
+            self.bot_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.bot_workers)
             
-            # Chat connection thread
-            chat_thread = threading.Thread(target=self.handle_chat_connections)
-            chat_thread.daemon = True
-            chat_thread.start()
-            self.threads.append(chat_thread)
+            # Relay threads for spectator fan-out
+            self.spectator_relays = [SpectatorRelay(self, i) for i in range(SPECTATOR_RELAY_WORKERS)]
+            for relay in self.spectator_relays:
+                relay.start()
+            
+            # Pushes live game directory changes to subscribers
+            self.game_directory = GameDirectory(self)
+            self.game_directory.start()
+            
+            # Accounts, with rating changes written back in the background
+            self.user_store = UserStore(self.user_db_path, log=self.log)
+            self.user_store.start()
+            self.login_pool = concurrent.futures.ThreadPoolExecutor(max_workers=LOGIN_WORKERS)
+            
+            # Carry on games checkpointed by the last server
+            self.draining = False
+            self.restore_games()
+            
+            # Acceptor threads, spread over the listening sockets
+            for index in range(self.accept_workers):
+                for target, listeners in ((self.handle_game_connections, self.game_sockets),
+                                          (self.handle_chat_connections, self.chat_sockets)):
+                    accept_thread = threading.Thread(target=target, args=(listeners[index % len(listeners)],))
+                    accept_thread.daemon = True
+                    accept_thread.start()
+                    self.threads.append(accept_thread)
+            self.log(f"Listening with {self.accept_workers} acceptors per port on "
+                     f"{len(self.game_sockets)} socket(s), backlog {self.listen_backlog}")
             
             # Timer thread for game clocks, etc.
             timer_thread = threading.Thread(target=self.timer_loop)
@@ -441,6 +1869,12 @@ class ChessServerGUI:
             timer_thread.start()
             self.threads.append(timer_thread)
             
+            # Bot thread applies moves found by the bot pool
+            bot_thread = threading.Thread(target=self.bot_loop)
+            bot_thread.daemon = True
+            bot_thread.start()
+            self.threads.append(bot_thread)
+            
             self.log("Server started successfully")
         except Exception as e:
             self.log(f"Failed to start server: {e}")
@@ -448,9 +1882,14 @@ class ChessServerGUI:
             self.status_bar.config(text=f"Error starting server: {e}")
     
     def stop_server(self):
-        """Stop the chess server"""
+        """Stop the chess server, checkpointing the games in progress"""
         self.running = False
         
+        # Save games still being played so the next server can carry them
+        # on; their players are detached first so disconnecting them below
+        # doesn't end the games
+        self.checkpoint_games()
+        
         # Close all client connections
         for client_id, client in list(self.clients.items()):
             client.disconnect()
@@ -458,20 +1897,35 @@ class ChessServerGUI:
         for client_id, client in list(self.chat_clients.items()):
             client.disconnect()
         
-        # Close server sockets
-        if self.game_socket:
-            self.game_socket.close()
-            self.game_socket = None
-            
-        if self.chat_socket:
-            self.chat_socket.close()
-            self.chat_socket = None
+        # Close server sockets, waking the acceptors
+        self.close_listeners()
+        
+        # Stop the spectator relays
+        for relay in self.spectator_relays:
+            relay.stop()
+        self.spectator_relays = []
+        self.game_directory.stop()
+        
+        # Stop taking logins and save the ratings
+        if self.login_pool:
+            self.login_pool.shutdown(wait=False, cancel_futures=True)
+            self.login_pool = None
+        if self.user_store:
+            self.user_store.close()
+            self.user_store = None
+        
+        # Stop the bot pool without waiting for running searches
+        if self.bot_pool:
+            self.bot_pool.shutdown(wait=False, cancel_futures=True)
+            self.bot_pool = None
         
         # Update UI
         self.status_label.config(text="Offline")
         self.status_bar.config(text="Server offline")
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
+        self.bot_match_button.config(state=tk.DISABLED)
+        self.drain_button.config(state=tk.DISABLED)
         
         # Clear lists
         self.clients_list.delete(0, tk.END)
@@ -482,111 +1936,174 @@ class ChessServerGUI:
         self.chat_clients = {}
         self.games = {}
         self.lobbies = {}
+        self.tournaments = {}
+        self.absent_seats = {}
+        self.draining = False
         
         self.update_stats()
         self.log("Server stopped")
     
-    def handle_game_connections(self):
-        """Accept and handle game client connections"""
-        self.log("Listening for game connections")
-        self.game_socket.settimeout(1.0)  # Set a timeout to allow checking if we should stop
-        
-        while self.running:
+    def open_listeners(self, port):
+        """Bind the listening sockets for a port: one per acceptor if the port
+        can be shared, otherwise one for all of them"""
+        listeners = []
+        while len(listeners) < self.accept_workers:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            shared = self.share_port(listener)
+            listener.bind(('0.0.0.0', port))
+            listener.listen(self.listen_backlog)
+            listeners.append(listener)
+            if not shared:
+                break
+        
+        # The kernel silently caps the backlog
+        try:
+            with open('/proc/sys/net/core/somaxconn') as f:
+                somaxconn = int(f.read())
+            if somaxconn < self.listen_backlog:
+                self.log(f"Listen backlog capped at {somaxconn} by net.core.somaxconn")
+        except (OSError, ValueError):
+            pass
+        return listeners
+    
+    def close_listeners(self):
+        """Close every listening socket; shutting them down wakes the blocked acceptors"""
+        for listener in self.game_sockets + self.chat_sockets:
             try:
-                client_socket, address = self.game_socket.accept()
-                self.log(f"New game connection from {address[0]}:{address[1]}")
-                
-                # Create client instance
-                client = ChessClient(client_socket, address, self)
-                
-                # Add to clients dictionary
-                self.clients[client.client_id] = client
-                
-                # Start a thread to handle this client
-                client_thread = threading.Thread(target=self.handle_game_client, args=(client,))
-                client_thread.daemon = True
-                client_thread.start()
-                self.threads.append(client_thread)
-                
-                # Update UI
-                self.update_stats()
-                
-            except socket.timeout:
-                pass  # This is expected due to the timeout
-            except Exception as e:
-                if self.running:  # Only log if we're still supposed to be running
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+        self.game_sockets = []
+        self.chat_sockets = []
+    
+    def handle_game_connections(self, listener):
+        """Accept game client connections (one of several acceptor threads)"""
+        while self.running and not self.draining:
+            try:
+                client_socket, address = listener.accept()
+            except OSError as e:
+                # Closing the listener ends the loop; anything else is counted
+                if self.running and not self.draining:
+                    self.accept_stats.record_error()
                     self.log(f"Error accepting game connection: {e}")
+                    time.sleep(ACCEPT_ERROR_PAUSE)
+                continue
+            self.admit_game_connection(client_socket, address)
     
-    def handle_chat_connections(self):
-        """Accept and handle chat client connections"""
-        self.log("Listening for chat connections")
-        self.chat_socket.settimeout(1.0)  # Set a timeout to allow checking if we should stop
+    def admit_game_connection(self, client_socket, address):
+        """Set up an accepted game connection and start its thread"""
+        accepted = time.perf_counter()
+        self.accept_stats.record_accept()
+        self.log(f"New game connection from {address[0]}:{address[1]}")
         
-        while self.running:
+        try:
+            tune_connection(client_socket)
+            
+            # Create client instance
+            client = ChessClient(client_socket, address, self)
+            
+            # Add to clients dictionary
+            self.clients[client.client_id] = client
+            
+            # Start a thread to handle this client
+            client_thread = threading.Thread(target=self.handle_game_client, args=(client, accepted))
+            client_thread.daemon = True
+            client_thread.start()
+            self.threads.append(client_thread)
+        except Exception as e:
+            self.accept_stats.record_error()
+            self.log(f"Error setting up game connection from {address[0]}:{address[1]}: {e}")
+            client_socket.close()
+    
+    def handle_chat_connections(self, listener):
+        """Accept chat client connections (one of several acceptor threads)"""
+        while self.running and not self.draining:
             try:
-                client_socket, address = self.chat_socket.accept()
-                self.log(f"New chat connection from {address[0]}:{address[1]}")
-                
-                # Create chat client instance
-                chat_client = ChatClient(client_socket, address, self)
-                
-                # Start a thread to handle this chat client
-                chat_thread = threading.Thread(target=self.handle_chat_client, args=(chat_client,))
-                chat_thread.daemon = True
-                chat_thread.start()
-                self.threads.append(chat_thread)
-                
-            except socket.timeout:
-                pass  # This is expected due to the timeout
-            except Exception as e:
-                if self.running:  # Only log if we're still supposed to be running
+                client_socket, address = listener.accept()
+            except OSError as e:
+                if self.running and not self.draining:
+                    self.accept_stats.record_error()
                     self.log(f"Error accepting chat connection: {e}")
+                    time.sleep(ACCEPT_ERROR_PAUSE)
+                continue
+            self.admit_chat_connection(client_socket, address)
+    
+    def admit_chat_connection(self, client_socket, address):
+        """Set up an accepted chat connection and start its thread"""
+        accepted = time.perf_counter()
+        self.accept_stats.record_accept()
+        self.log(f"New chat connection from {address[0]}:{address[1]}")
+        
+        try:
+            tune_connection(client_socket)
+            
+            # Create chat client instance
+            chat_client = ChatClient(client_socket, address, self)
+            
+            # Start a thread to handle this chat client
+            chat_thread = threading.Thread(target=self.handle_chat_client, args=(chat_client, accepted))
+            chat_thread.daemon = True
+            chat_thread.start()
+            self.threads.append(chat_thread)
+        except Exception as e:
+            self.accept_stats.record_error()
+            self.log(f"Error setting up chat connection from {address[0]}:{address[1]}: {e}")
+            client_socket.close()
+    
+    def accept_queued(self):
+        """Take every connection already waiting on our listeners.
+        
+        Closing a listener resets the connections still in its accept queue
+        (unless net.ipv4.tcp_migrate_req moves them to another socket on the
+        port), so they're taken first and served here like any other.
+        Returns how many there were.
+        """
+        taken = 0
+        for listeners, admit in ((self.game_sockets, self.admit_game_connection),
+                                 (self.chat_sockets, self.admit_chat_connection)):
+            for listener in listeners:
+                listener.setblocking(False)
+                while True:
+                    try:
+                        client_socket, address = listener.accept()
+                    except OSError:
+                        break  # Queue empty (or the listener is gone)
+                    client_socket.setblocking(True)
+                    admit(client_socket, address)
+                    taken += 1
+        return taken
     
-    def handle_game_client(self, client):
+    def handle_game_client(self, client, accepted=None):
         """Handle communication with a game client"""
+        if accepted:
+            self.accept_stats.record_latency(time.perf_counter() - accepted)
         try:
-            buffer = ""
+            decoder = MessageDecoder(MAX_CLIENT_MESSAGE_SIZE)
             while self.running:
                 try:
-                    data = client.socket.recv(4096).decode('utf-8', errors='replace')
+                    data = client.socket.recv(4096)
                     if not data:
                         self.log(f"Client {client.username or client.client_id[:8]} disconnected")
                         break
                     
-                    buffer += data
-                    
-                    # Process complete JSON messages
-                    while True:
-                        # Find a complete JSON object
-                        json_end = buffer.find('}')
-                        if json_end == -1:
-                            break
-                        
-                        # Extract JSON
-                        try:
-                            # Try to find the start of the JSON object
-                            json_start = buffer.find('{')
-                            if json_start == -1:
-                                # No start brace found, clear buffer and break
-                                buffer = ""
-                                break
-                                
-                            # Extract and parse JSON
-                            json_str = buffer[json_start:json_end+1]
-                            message = json.loads(json_str)
-                            
-                            # Process the message
-                            self.process_game_message(client, message)
-                            
-                            # Remove processed JSON from buffer
-                            buffer = buffer[json_end+1:]
-                            
-                        except json.JSONDecodeError:
-                            # Invalid JSON, try to find the next complete object
-                            buffer = buffer[json_end+1:]
-                        except Exception as e:
-                            self.log(f"Error processing message from {client.username or client.client_id[:8]}: {e}")
-                            buffer = buffer[json_end+1:]
+                    # Process complete messages (JSON objects or binary frames);
+                    # everything they send goes out when they're all done
+                    self.open_write_batch()
+                    try:
+                        for message in decoder.feed(data):
+                            try:
+                                self.process_game_message(client, message)
+                            except Exception as e:
+                                self.log(f"Error processing message from {client.username or client.client_id[:8]}: {e}")
+                    except ProtocolError as e:
+                        # The stream can't be followed past this; drop the client
+                        self.log(f"Bad frame from {client.username or client.client_id[:8]}, disconnecting: {e}")
+                        client.disconnect()
+                        break
+                    finally:
+                        self.flush_write_batch()
                 
                 except socket.timeout:
                     # Check if client hasn't sent any messages in a while
@@ -603,51 +2120,30 @@ class ChessServerGUI:
             # Clean up when client disconnects
             self.handle_client_disconnect(client)
     
-    def handle_chat_client(self, chat_client):
+    def handle_chat_client(self, chat_client, accepted=None):
         """Handle communication with a chat client"""
+        if accepted:
+            self.accept_stats.record_latency(time.perf_counter() - accepted)
         try:
-            buffer = ""
+            decoder = MessageDecoder(MAX_CLIENT_MESSAGE_SIZE)
             while self.running:
                 try:
-                    data = chat_client.socket.recv(4096).decode('utf-8', errors='replace')
+                    data = chat_client.socket.recv(4096)
                     if not data:
                         self.log(f"Chat client disconnected")
                         break
                     
-                    buffer += data
-                    
                     # Process complete JSON messages
-                    while True:
-                        # Find a complete JSON object
-                        json_end = buffer.find('}')
-                        if json_end == -1:
-                            break
-                        
-                        # Extract JSON
-                        try:
-                            # Try to find the start of the JSON object
-                            json_start = buffer.find('{')
-                            if json_start == -1:
-                                # No start brace found, clear buffer and break
-                                buffer = ""
-                                break
-                                
-                            # Extract and parse JSON
-                            json_str = buffer[json_start:json_end+1]
-                            message = json.loads(json_str)
-                            
-                            # Process the message
-                            self.process_chat_message(chat_client, message)
-                            
-                            # Remove processed JSON from buffer
-                            buffer = buffer[json_end+1:]
-                            
-                        except json.JSONDecodeError:
-                            # Invalid JSON, try to find the next complete object
-                            buffer = buffer[json_end+1:]
-                        except Exception as e:
-                            self.log(f"Error processing chat message: {e}")
-                            buffer = buffer[json_end+1:]
+                    try:
+                        for message in decoder.feed(data):
+                            try:
+                                self.process_chat_message(chat_client, message)
+                            except Exception as e:
+                                self.log(f"Error processing chat message: {e}")
+                    except ProtocolError as e:
+                        self.log(f"Bad frame from chat client, disconnecting: {e}")
+                        chat_client.disconnect()
+                        break
                 
                 except socket.timeout:
                     pass
@@ -667,53 +2163,178 @@ class ChessServerGUI:
         
         # First message should include username
         if not client.is_authenticated:
-            username = message.get('username')
-            if username:
-                client.authenticate(username)
-                
-                # Send acknowledgement
-                client.send({
-                    'type': 'connection_ack',
-                    'client_id': client.client_id,
-                    'message': f"Connected as {username}"
-                })
-                
-                self.log(f"Client authenticated as {username}")
-                self.update_clients_list()
+            if client.login_pending:
+                client.send({'type': 'error', 'message': 'Still logging in'})
+                return
+            values, error = HELLO_SCHEMA.parse(message)
+            if values:
+                username, password = values[:2]
+                if self.user_store:
+                    # Checking the password is slow on purpose; finish the
+                    # login when the pool is done with it
+                    client.login_pending = True
+                    future = self.login_pool.submit(self.user_store.authenticate, username, password)
+                    future.add_done_callback(lambda future: self.finish_login(client, values, future))
+                else:
+                    self.complete_login(client, values, None)
                 return
             else:
-                # Disconnect clients that don't provide a username
-                client.send({'type': 'error', 'message': 'Username required'})
+                # Disconnect clients that don't provide a valid username
+                client.send({'type': 'error', 'message': f'Invalid login: {error}'})
                 client.disconnect()
                 return
         
+        # Drop floods before they cost any work
+        if not self.check_rate_limit(client, message_type):
+            return
+        
+        # A draining server only lets the games it has finish
+        if self.draining and message_type in DRAIN_REFUSED:
+            client.send({'type': 'error', 'message': 'Server is restarting; try again in a moment'})
+            return
+        
         # Handle messages from authenticated clients
-        if message_type == 'create_lobby':
-            self.handle_create_lobby(client)
-            
-        elif message_type == 'list_lobbies':
-            self.handle_list_lobbies(client)
-            
-        elif message_type == 'join_lobby':
-            lobby_id = message.get('lobby_id')
-            self.handle_join_lobby(client, lobby_id)
-            
-        elif message_type == 'start_game':
-            lobby_id = message.get('lobby_id')
-            self.handle_start_game(client, lobby_id)
-            
-        elif message_type == 'move':
-            game_id = message.get('game_id')
-            move = message.get('move')
-            self.handle_game_move(client, game_id, move)
-            
-        elif message_type == 'resign':
-            game_id = message.get('game_id')
-            self.handle_resignation(client, game_id)
-            
-        elif message_type == 'spectate':
-            game_id = message.get('game_id')
-            self.handle_spectate_request(client, game_id)
+        self.dispatch(self.game_handlers, client, message_type, message)
+    
+    def finish_login(self, client, values, future):
+        """Complete or refuse a login once its password has been checked"""
+        client.login_pending = False
+        if not client.is_connected:
+            return
+        try:
+            account, error = future.result()
+        except Exception as e:
+            account, error = None, f"Login failed: {e}"
+        if error:
+            client.send({'type': 'error', 'message': f'Invalid login: {error}'})
+            client.disconnect()
+            return
+        self.complete_login(client, values, account)
+    
+    def complete_login(self, client, values, account):
+        """Authenticate a client and acknowledge its hello"""
+        username, _, encodings, compressions, wants_legal_moves, resume_token = values
+        client.authenticate(username, account)
+        client.wants_legal_moves = wants_legal_moves
+        client.resume_token = resume_token
+        encoding = choose_encoding(encodings)
+        compression = choose_compression(compressions)
+        
+        # Send acknowledgement (always as uncompressed JSON); everything
+        # after it uses the negotiated encoding and compression
+        client.send({
+            'type': 'connection_ack',
+            'client_id': client.client_id,
+            'encoding': encoding,
+            'compression': compression,
+            'rating': round(client.rating) if account else None,
+            'message': f"Connected as {client.username}"
+        })
+        client.flush()  # The ack must be written before compression starts
+        client.encoding = encoding
+        if compression:
+            client.compressor = StreamCompressor()
+        
+        self.log(f"Client authenticated as {client.username}" + (" (guest)" if account is None else ""))
+        self.update_clients_list()
+        
+        # Give back a seat in a game carried over from before a restart
+        self.resume_seat(client)
+        
+        # Logged in while we drain (e.g. connected just before we stopped listening)
+        if self.draining:
+            client.send(self.drain_notice)
+    
+    def dispatch(self, handlers, connection, message_type, message):
+        """Validate a message against its schema and run its handler, timing it"""
+        entry = handlers.get(message_type)
+        if entry is None:
+            self.unknown_messages += 1
+            return
+        handler, schema = entry
+        
+        values, error = schema.parse(message)
+        if error:
+            self.invalid_messages += 1
+            connection.send({'type': 'error', 'message_type': message_type,
+                             'message': f"Invalid {message_type} message: {error}"})
+            return
+        
+        start = time.perf_counter()
+        try:
+            handler(connection, *values)
+        finally:
+            stats = self.handler_stats.get(message_type)
+            if stats is None:
+                stats = self.handler_stats[message_type] = HandlerStats()
+            stats.record(time.perf_counter() - start)
+    
+    def current_write_batch(self):
+        """Get the write batch open on this thread, if any"""
+        return getattr(self.write_batches, 'batch', None)
+    
+    def open_write_batch(self):
+        """Hold back what this thread sends until flush_write_batch"""
+        self.write_batches.batch = WriteBatch()
+    
+    def flush_write_batch(self):
+        """Write out and close this thread's batch"""
+        batch = self.current_write_batch()
+        self.write_batches.batch = None
+        if batch:
+            messages, writes = batch.flush()
+            self.batched_messages += messages
+            self.batched_writes += writes
+    
+    def log_handler_stats(self):
+        """Log connection metrics and time spent per message type, busiest first"""
+        self.log(f"Connections: {self.accept_stats}")
+        self.log(f"Writes: {self.batched_messages} messages from message handlers sent in {self.batched_writes} writes")
+        if not self.handler_stats:
+            self.log("No messages handled yet")
+            return
+        self.log(f"Handler timings ({self.invalid_messages} invalid, {self.unknown_messages} unknown messages):")
+        for message_type, stats in sorted(self.handler_stats.items(), key=lambda item: -item[1].total_time):
+            self.log(f"  {message_type}: {stats}")
+    
+    def check_rate_limit(self, client, message_type):
+        """Check a client's message against its own and the global limits"""
+        if not client.is_connected:
+            return False  # Already dropped; ignore what's left in its buffer
+        if not client.allow_message(message_type):
+            self.record_rate_violation(client, message_type, client.username)
+            return False
+        
+        # Shared capacity for expensive requests; running out isn't this
+        # client's fault, so it's not counted against them
+        global_bucket = self.global_rate_buckets.get(message_type)
+        if global_bucket and not global_bucket.consume():
+            self.rate_limited_messages += 1
+            client.send({'type': 'rate_limited', 'message_type': message_type,
+                         'message': "Server busy, please try again shortly"})
+            return False
+        
+        client.throttled = False
+        return True
+    
+    def record_rate_violation(self, connection, message_type, name):
+        """Count a dropped message, disconnecting connections that keep flooding"""
+        connection.rate_violations += 1
+        self.rate_limited_messages += 1
+        
+        if not connection.violation_bucket.consume():
+            self.rate_limit_disconnects += 1
+            self.log(f"Disconnecting {name}: flooding ({connection.rate_violations} messages dropped)")
+            connection.send({'type': 'error', 'message': 'Disconnected for sending too many messages'})
+            connection.disconnect()
+            return
+        
+        # Notify and log once per burst rather than for every dropped message
+        if not connection.throttled:
+            connection.throttled = True
+            self.log(f"Throttling {name}: too many '{message_type}' messages")
+            connection.send({'type': 'rate_limited', 'message_type': message_type,
+                             'message': "Too many requests, slow down"})
     
     def process_chat_message(self, chat_client, message):
         """Process a message from a chat client"""
@@ -769,43 +2390,49 @@ class ChessServerGUI:
             chat_client.disconnect()
             return
         
+        if not chat_client.is_connected:
+            return
+        if not chat_client.chat_bucket.consume():
+            self.record_rate_violation(chat_client, message_type, chat_client.game_client.username)
+            return
+        chat_client.throttled = False
+        
         # Handle chat messages
-        if message_type == 'chat':
-            text = message.get('text', '')
-            game_id = message.get('game_id')
-            lobby_id = message.get('lobby_id')
+        self.dispatch(self.chat_handlers, chat_client, message_type, message)
+    
+    def handle_chat(self, chat_client, text, game_id, lobby_id):
+        """Broadcast a chat message to a game or lobby"""
+        if game_id and game_id in self.games:
+            # Game chat
+            game = self.games[game_id]
             
-            if game_id and game_id in self.games:
-                # Game chat
-                game = self.games[game_id]
-                
-                # Create chat message to broadcast
-                chat_message = {
-                    'type': 'chat',
-                    'sender': chat_client.game_client.username,
-                    'text': text,
-                    'timestamp': time.time()
-                }
-                
-                # Broadcast to all participants in the game
-                self.broadcast_chat(game, chat_message)
-                self.log(f"Chat in game {game_id}: {chat_client.game_client.username}: {text}")
-                
-            elif lobby_id and lobby_id in self.lobbies:
-                # Lobby chat
-                lobby = self.lobbies[lobby_id]
-                
-                # Create chat message to broadcast
-                chat_message = {
-                    'type': 'chat',
-                    'sender': chat_client.game_client.username,
-                    'text': text,
-                    'timestamp': time.time()
-                }
-                
-                # Broadcast to all players in the lobby
-                self.broadcast_lobby_chat(lobby, chat_message)
-                self.log(f"Chat in lobby {lobby_id}: {chat_client.game_client.username}: {text}")
+            # Create chat message to broadcast
+            chat_message = {
+                'type': 'chat',
+                'sender': chat_client.game_client.username,
+                'text': text,
+                'timestamp': time.time()
+            }
+            
+            # Broadcast to all participants in the game
+            self.broadcast_chat(game, chat_message)
+            self.log(f"Chat in game {game_id}: {chat_client.game_client.username}: {text}")
+            
+        elif lobby_id and lobby_id in self.lobbies:
+            # Lobby chat
+            lobby = self.lobbies[lobby_id]
+            
+            # Create chat message to broadcast
+            chat_message = {
+                'type': 'chat',
+                'sender': chat_client.game_client.username,
+                'text': text,
+                'timestamp': time.time()
+            }
+            
+            # Broadcast to all players in the lobby
+            self.broadcast_lobby_chat(lobby, chat_message)
+            self.log(f"Chat in lobby {lobby_id}: {chat_client.game_client.username}: {text}")
     
     def handle_create_lobby(self, client):
         """Handle a client's request to create a lobby"""
@@ -931,19 +2558,16 @@ class ChessServerGUI:
             client.send({'type': 'error', 'message': 'Need at least 2 players to start'})
             return
             
-        # Create a new game
-        game_id = str(uuid.uuid4())
+        # Nobody plays two games at once
+        for player in lobby.players[:2]:
+            reason = self.busy_reason(player)
+            if reason:
+                client.send({'type': 'error', 'message': reason})
+                return
+                
         white_player = lobby.players[0]  # Host is white
         black_player = lobby.players[1]  # Joiner is black
         
-        # Create the chess game
-        new_game = ChessGame(game_id, white_player, black_player)
-        self.games[game_id] = new_game
-        
-        # Update players' current game
-        white_player.current_game = new_game
-        black_player.current_game = new_game
-        
         # Remove players from lobby
         white_player.current_lobby = None
         black_player.current_lobby = None
@@ -951,81 +2575,472 @@ class ChessServerGUI:
         # Remove the lobby
         del self.lobbies[lobby_id]
         
+        self.create_game(white_player, black_player)
+    
+    def create_game(self, white_player, black_player, time_control=600, announce=True):
+        """Create a game between two seated players and list it for spectators.
+        
+        Clients looking for games find it in the live game directory.
+        Tournament rounds pass announce=False: they create many games at
+        once and log and update the UI once per round instead.
+        """
+        game_id = str(uuid.uuid4())
+        
+        # Create the chess game
+        new_game = ChessGame(game_id, white_player, black_player, time_control)
+        new_game.spectator_delay = self.spectator_delay
+        self.games[game_id] = new_game
+        
+        # Update players' current game; anyone spectating stops first
+        for player in (white_player, black_player):
+            watching = player.current_game
+            if watching and player in watching.spectators:
+                self.stop_spectating(player, watching)
+        white_player.current_game = new_game
+        black_player.current_game = new_game
+        
         # Notify players that game has started
         for player in [white_player, black_player]:
             player.send({
                 'type': 'game_started',
                 'game_id': game_id,
+                'color': 'white' if player == white_player else 'black',
+                'opponent': black_player.username if player == white_player else white_player.username,
                 'white_player': white_player.username,
                 'black_player': black_player.username,
                 'time_control': new_game.time_control
             })
-            
-            # Send initial game state
-            player.send(new_game.get_state(player))
         
-        # Log game start and create a message for all clients
+        self.game_directory.add(new_game)
+        self.start_play(new_game)
+        
+        if not announce:
+            return new_game
+        
         self.log(f"Game {game_id} started: {white_player.username} (White) vs {black_player.username} (Black)")
         
-        # Announce game to all connected clients so they can spectate
-        spectate_announcement = {
-            'type': 'game_announcement',
-            'message': f"Game started: {white_player.username} (White) vs {black_player.username} (Black)",
-            'game_id': game_id,
-            'white_player': white_player.username,
-            'black_player': black_player.username
-        }
+        self.update_stats()
+        self.update_games_list()
+        return new_game
+    
+    def start_play(self, game):
+        """Start a pending game once both players are seated.
+        
+        Starting the clocks and sending each player the position is the
+        whole transition; returns False if the game had already started.
+        """
+        if not game.advance(GAME_ACTIVE):
+            return False
         
-        # Send announcement to all connected clients
-        for client_id, other_client in self.clients.items():
-            if other_client != white_player and other_client != black_player:
-                other_client.send(spectate_announcement)
+        with game.lock:
+            game.last_move_time = time.time()
+            for player in (game.white_player, game.black_player):
+                player.send(game.get_state(player))
+        return True
+    
+    def handle_add_bot(self, client, lobby_id, level):
+        """Handle a lobby host's request to seat a bot opponent"""
+        # Check if lobby exists
+        if lobby_id not in self.lobbies:
+            client.send({'type': 'error', 'message': 'Lobby not found'})
+            return
+            
+        lobby = self.lobbies[lobby_id]
         
+        # Check if client is the host of the lobby
+        if lobby.players[0] != client:
+            client.send({'type': 'error', 'message': 'Only the host can add a bot'})
+            return
+            
+        bot = BotPlayer(self, level)
+        if not lobby.add_player(bot):
+            client.send({'type': 'error', 'message': 'Lobby is full'})
+            return
+        bot.current_lobby = lobby
+        
+        # Notify the host like any other joining player
+        client.send({
+            'type': 'player_joined_lobby',
+            'lobby_id': lobby_id,
+            'player': bot.username,
+            'players': [p.username for p in lobby.players]
+        })
+        client.send({
+            'type': 'lobby_full',
+            'lobby_id': lobby_id,
+            'message': 'Lobby is now full. Ready to start game.'
+        })
+        
+        self.log(f"Bot {bot.username} joined lobby {lobby_id[:8]}")
+    
+    def busy_reason(self, client, tournament=None):
+        """Say why a player can't be seated in a new game, or None if they can.
+        
+        Players are busy while seated in a game still in progress, or while
+        taking part in a running tournament other than the given one.
+        """
+        game = client.current_game
+        if game and game.is_player(client) and game.status in GAME_IN_PROGRESS:
+            return f"{client.username} is already playing a game"
+        for other in list(self.tournaments.values()):
+            if other is not tournament and other.status == "running" and other.is_playing(client):
+                return f"{client.username} is playing in another tournament"
+        return None
+    
+    def handle_create_tournament(self, client, format, rounds):
+        """Handle a client's request to create a tournament"""
+        reason = self.busy_reason(client)
+        if reason:
+            client.send({'type': 'error', 'message': reason})
+            return
+            
+        tournament_id = str(uuid.uuid4())
+        self.tournaments[tournament_id] = Tournament(tournament_id, client, format, rounds)
+        
+        client.send({
+            'type': 'tournament_created',
+            'tournament_id': tournament_id,
+            'format': format,
+            'message': 'Tournament created successfully'
+        })
+        
+        self.log(f"Player {client.username} created {format} tournament {tournament_id[:8]}")
+    
+    def handle_list_tournaments(self, client):
+        """Handle a client's request to list tournaments open for registration"""
+        tournament_list = []
+        for tournament_id, tournament in self.tournaments.items():
+            if tournament.status == "registering":
+                tournament_list.append({
+                    'tournament_id': tournament_id,
+                    'host': tournament.host.username,
+                    'format': tournament.format,
+                    'player_count': len(tournament.players)
+                })
+        
+        client.send({
+            'type': 'tournaments_list',
+            'tournaments': tournament_list
+        })
+    
+    def handle_join_tournament(self, client, tournament_id):
+        """Handle a client's request to register for a tournament"""
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            client.send({'type': 'error', 'message': 'Tournament not found'})
+            return
+            
+        reason = self.busy_reason(client, tournament)
+        if reason:
+            client.send({'type': 'error', 'message': reason})
+            return
+            
+        if not tournament.add_player(client):
+            client.send({'type': 'error', 'message': 'Cannot join this tournament'})
+            return
+            
+        client.send({
+            'type': 'tournament_joined',
+            'tournament_id': tournament_id,
+            'format': tournament.format,
+            'player_count': len(tournament.players)
+        })
+        
+        self.log(f"Player {client.username} joined tournament {tournament_id[:8]}")
+    
+    def handle_add_tournament_bots(self, client, tournament_id, level, count):
+        """Handle a host's request to register bots in a tournament"""
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            client.send({'type': 'error', 'message': 'Tournament not found'})
+            return
+            
+        if tournament.host != client:
+            client.send({'type': 'error', 'message': 'Only the host can add bots'})
+            return
+            
+        for _ in range(count):
+            tournament.add_player(BotPlayer(self, level))
+            
+        client.send({
+            'type': 'tournament_joined',
+            'tournament_id': tournament_id,
+            'format': tournament.format,
+            'player_count': len(tournament.players)
+        })
+    
+    def handle_start_tournament(self, client, tournament_id):
+        """Handle the host's request to start a tournament"""
+        tournament = self.tournaments.get(tournament_id)
+        if not tournament:
+            client.send({'type': 'error', 'message': 'Tournament not found'})
+            return
+            
+        if tournament.host != client:
+            client.send({'type': 'error', 'message': 'Only the host can start the tournament'})
+            return
+            
+        if tournament.status != "registering" or len(tournament.players) < 2:
+            client.send({'type': 'error', 'message': 'Need at least 2 players to start'})
+            return
+            
+        tournament.start()
+        self.log(f"Tournament {tournament_id[:8]} started with {len(tournament.players)} players, "
+                 f"{tournament.total_rounds} rounds")
+        self.start_tournament_round(tournament)
+    
+    def start_tournament_round(self, tournament):
+        """Pair and start every game of the next round at once"""
+        with tournament.lock:
+            pairings, bye = tournament.pair_next_round()
+            
+            games = []
+            forfeits = []  # (player, reason, forfeited) for pairings not played
+            for white_player, black_player in pairings:
+                # A player still busy elsewhere forfeits rather than being
+                # pulled out of that game; the opponent gets the point
+                reasons = {player: self.busy_reason(player, tournament) for player in (white_player, black_player)}
+                busy = [player for player, reason in reasons.items() if reason]
+                if busy:
+                    present = [player for player in (white_player, black_player) if player not in busy]
+                    tournament.forfeit(present[0] if present else None)
+                    forfeits.extend((player, reasons[player], player in busy) for player in (white_player, black_player))
+                    continue
+                    
+                game = self.create_game(white_player, black_player, tournament.time_control, announce=False)
+                game.tournament = tournament
+                tournament.pending_games[game.game_id] = (white_player.client_id, black_player.client_id)
+                games.append(game)
+        
+        # One round notice per player instead of an announcement per game
+        for game in games:
+            for player, color, opponent in ((game.white_player, "white", game.black_player),
+                                            (game.black_player, "black", game.white_player)):
+                player.send({
+                    'type': 'tournament_round',
+                    'tournament_id': tournament.tournament_id,
+                    'round': tournament.current_round,
+                    'total_rounds': tournament.total_rounds,
+                    'game_id': game.game_id,
+                    'color': color,
+                    'opponent': opponent.username
+                })
+        if bye:
+            bye.send({
+                'type': 'tournament_round',
+                'tournament_id': tournament.tournament_id,
+                'round': tournament.current_round,
+                'total_rounds': tournament.total_rounds,
+                'bye': True
+            })
+        for player, reason, forfeited in forfeits:
+            notice = {
+                'type': 'tournament_round',
+                'tournament_id': tournament.tournament_id,
+                'round': tournament.current_round,
+                'total_rounds': tournament.total_rounds
+            }
+            if forfeited:
+                notice.update(forfeit=True, reason=reason)
+                self.log(f"Tournament {tournament.tournament_id[:8]}: {reason}, forfeits round {tournament.current_round}")
+            else:
+                notice['bye'] = True
+            player.send(notice)
+            
+        self.log(f"Tournament {tournament.tournament_id[:8]} round {tournament.current_round}: {len(games)} games")
         self.update_stats()
         self.update_games_list()
+        
+        # A round where every pairing was decided without play ends at once
+        if not games:
+            self.finish_tournament_round(tournament)
+    
+    def finish_tournament_round(self, tournament):
+        """Start the next round, or finish the tournament after the last one"""
+        if not tournament.is_last_round() and len(tournament.active_players()) >= 2:
+            self.start_tournament_round(tournament)
+            return
+            
+        tournament.status = "finished"
+        standings = tournament.standings()
+        for player in tournament.active_players():
+            player.send({
+                'type': 'tournament_finished',
+                'tournament_id': tournament.tournament_id,
+                'standings': standings
+            })
+            
+        self.log(f"Tournament {tournament.tournament_id[:8]} finished, winner: {standings[0]['player']}")
+        self.tournaments.pop(tournament.tournament_id, None)
+    
+    def start_bot_match(self):
+        """Start a game between two bots from the server window"""
+        if not self.running or self.draining:
+            return
+        white_bot = BotPlayer(self, self.white_bot_level.get())
+        black_bot = BotPlayer(self, self.black_bot_level.get())
+        self.create_game(white_bot, black_bot)
+    
+    def bot_loop(self):
+        """Apply moves found by the bot pool as they complete"""
+        while self.running:
+            try:
+                bot, game_id, fen, future = self.bot_results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+                
+            try:
+                bot.pending_fen = None
+                if future.cancelled():
+                    continue
+                move_uci = future.result()
+                game = self.games.get(game_id)
+                
+                # Drop results for positions that are no longer current
+                if not move_uci or not game or not game.is_active or game.board.fen() != fen:
+                    continue
+                    
+                self.open_write_batch()
+                try:
+                    self.handle_game_move(bot, game_id, move_uci)
+                finally:
+                    self.flush_write_batch()
+            except Exception as e:
+                self.log(f"Error applying move for bot {bot.username}: {e}")
     
     def handle_game_move(self, client, game_id, move_uci):
-        """Handle a move in a chess game"""
+        """Handle a move in a chess game.
+        
+        Rejections name the message type, so a client showing the move
+        already knows to take it back.
+        """
         # Check if game exists
         if game_id not in self.games:
-            client.send({'type': 'error', 'message': 'Game not found'})
+            client.send({'type': 'error', 'message_type': 'move', 'message': 'Game not found'})
             return
             
         game = self.games[game_id]
         
         # Check if client is a player in this game
         if not game.is_player(client):
-            client.send({'type': 'error', 'message': 'Not a player in this game'})
+            client.send({'type': 'error', 'message_type': 'move', 'message': 'Not a player in this game'})
             return
             
-        # Check if it's this player's turn
-        is_white_turn = game.board.turn == chess.WHITE
-        if (is_white_turn and client != game.white_player) or \
-           (not is_white_turn and client != game.black_player):
-            client.send({'type': 'error', 'message': 'Not your turn'})
-            return
+        with game.lock:
+            # Restored games wait for both players; finished ones take no more moves
+            if not game.is_active:
+                client.send({'type': 'error', 'message_type': 'move', 'message': 'Game is not in progress'})
+                return
+                
+            # Check if it's this player's turn
+            is_white_turn = game.board.turn == chess.WHITE
+            if (is_white_turn and client != game.white_player) or \
+               (not is_white_turn and client != game.black_player):
+                client.send({'type': 'error', 'message_type': 'move', 'message': 'Not your turn'})
+                return
+                
+            # Try to make the move
+            success, error_msg = game.make_move(move_uci)
             
-        # Try to make the move
-        success, error_msg = game.make_move(move_uci)
-        
-        if success:
-            # Get updated game state
-            game_state = game.get_state()
+            if not success:
+                # Send error message to client
+                client.send({'type': 'error', 'message_type': 'move', 'message': f'Invalid move: {error_msg}'})
+                return
+                
+            self.announce_move(game, client, move_uci)
             
-            # Send updated state to all participants
-            for participant in game.get_all_participants():
-                participant.send(game.get_state(participant))
+            # The opponent's queued moves are played before the lock is
+            # released, so nothing can get in between
+            self.play_premoves(game)
+    
+    def announce_move(self, game, client, move_uci):
+        """Send the position after a move and end the game if it's over"""
+        # Get updated game state
+        game_state = game.get_state()
+        
+        # Players get their own state right away; spectators get the
+        # shared state through the relays
+        for player in [game.white_player, game.black_player]:
+            if player:
+                player.send(game.get_state(player))
+        self.publish_to_spectators(game, game.spectator_snapshot())
+        self.game_directory.touch(game)
+        
+        # Log the move
+        turn_number = len(game.move_history)
+        self.log(f"Game {game.game_id[:8]}: {client.username} played {move_uci} ({turn_number})")
+        
+        # Check if game is over
+        if game_state.get('game_over', False):
+            self.handle_game_over(game, game_state)
+    
+    def play_premoves(self, game):
+        """Play queued moves for whoever is to move, for as long as they apply"""
+        while game.is_active:
+            color = game.board.turn
+            player = game.white_player if color == chess.WHITE else game.black_player
+            move_uci = game.take_premove(color)
+            if move_uci is None:
+                return
+                
+            success, error_msg = game.make_move(move_uci)
+            if not success:
+                # The position didn't go the way the player expected; drop
+                # the rest of the queue too
+                game.clear_premoves(color)
+                player.send({
+                    'type': 'premoves',
+                    'game_id': game.game_id,
+                    'premoves': [],
+                    'cancelled': move_uci,
+                    'reason': error_msg
+                })
+                return
+                
+            self.send_premoves(player, game)
+            self.announce_move(game, player, move_uci)
+    
+    def send_premoves(self, client, game):
+        """Tell a player which of their moves are still queued"""
+        client.send({
+            'type': 'premoves',
+            'game_id': game.game_id,
+            'premoves': list(game.premoves[game.color_of(client)])
+        })
+    
+    def handle_premove(self, client, game_id, move_uci):
+        """Queue a move to be played as soon as the opponent has moved"""
+        game = self.games.get(game_id)
+        if not game or not game.is_player(client):
+            client.send({'type': 'error', 'message': 'Game not found'})
+            return
             
-            # Log the move
-            turn_number = len(game.move_history)
-            self.log(f"Game {game_id[:8]}: {client.username} played {move_uci} ({turn_number})")
+        with game.lock:
+            if not game.is_active:
+                return
+                
+            # The opponent moved while this was on its way: just play it
+            color = game.color_of(client)
+            if game.board.turn == color:
+                self.handle_game_move(client, game_id, move_uci)
+                return
+                
+            if not game.queue_premove(color, move_uci):
+                client.send({'type': 'error', 'message': f'At most {MAX_PREMOVES} moves can be queued'})
+                return
+                
+            self.send_premoves(client, game)
+    
+    def handle_cancel_premoves(self, client, game_id):
+        """Drop all of a player's queued moves"""
+        game = self.games.get(game_id)
+        if not game or not game.is_player(client):
+            client.send({'type': 'error', 'message': 'Game not found'})
+            return
             
-            # Check if game is over
-            if game_state.get('game_over', False):
-                self.handle_game_over(game, game_state)
-        else:
-            # Send error message to client
-            client.send({'type': 'error', 'message': f'Invalid move: {error_msg}'})
+        with game.lock:
+            game.clear_premoves(game.color_of(client))
+            self.send_premoves(client, game)
     
     def handle_resignation(self, client, game_id):
         """Handle a player resigning from a game"""
@@ -1041,45 +3056,263 @@ class ChessServerGUI:
             client.send({'type': 'error', 'message': 'Not a player in this game'})
             return
             
-        # Determine winner
-        winner = None
-        if client == game.white_player:
-            winner = "black"
-        else:
-            winner = "white"
+        with game.lock:
+            # A game that has ended can't be resigned again
+            if game.status not in GAME_IN_PROGRESS:
+                client.send({'type': 'error', 'message': 'Game is not in progress'})
+                return
+                
+            # Determine winner
+            winner = None
+            if client == game.white_player:
+                winner = "black"
+            else:
+                winner = "white"
+                
+            # Update game state
+            game_state = game.get_state()
+            game_state['game_over'] = True
+            game_state['result'] = 'resignation'
+            game_state['winner'] = winner
+            
+            self.log(f"Game {game_id[:8]}: {client.username} resigned, {winner} wins")
+            
+            # Handle game over; its game_over message tells everyone
+            self.handle_game_over(game, game_state)
+    
+    def played_game(self, client, game_id):
+        """Get a game the client plays in, or send them an error and get None"""
+        game = self.games.get(game_id)
+        if not game or not game.is_player(client):
+            client.send({'type': 'error', 'message': 'Game not found'})
+            return None
+        return game
+    
+    def send_to_players(self, game, message):
+        """Send a message to both players of a game, but not its spectators"""
+        for player in (game.white_player, game.black_player):
+            if player:
+                player.send(message)
+    
+    def handle_offer_draw(self, client, game_id):
+        """Offer the opponent a draw; offering one back accepts theirs"""
+        game = self.played_game(client, game_id)
+        if not game:
+            return
             
-        # Update game state
+        with game.lock:
+            if not game.is_active:
+                client.send({'type': 'error', 'message': 'Game is not in progress'})
+                return
+                
+            color = 'white' if game.color_of(client) == chess.WHITE else 'black'
+            if game.draw_offer == color:
+                client.send({'type': 'error', 'message': 'You have already offered a draw'})
+                return
+            if game.draw_offer:
+                game.draw_offer = None
+                self.end_in_draw(game, 'agreement')
+                return
+                
+            # Bots play on
+            if getattr(game.get_opponent(client), 'is_bot', False):
+                client.send({'type': 'draw_declined', 'game_id': game_id})
+                return
+                
+            # The offer stands until it's answered or the opponent moves
+            game.draw_offer = color
+            self.send_to_players(game, {'type': 'draw_offered', 'game_id': game_id, 'by': color})
+            self.log(f"Game {game_id[:8]}: {client.username} offered a draw")
+    
+    def handle_answer_draw(self, client, game_id, accept):
+        """Accept or decline the opponent's draw offer"""
+        game = self.played_game(client, game_id)
+        if not game:
+            return
+            
+        with game.lock:
+            color = 'white' if game.color_of(client) == chess.WHITE else 'black'
+            if not game.is_active or game.draw_offer in (None, color):
+                client.send({'type': 'error', 'message': 'No draw offer to answer'})
+                return
+                
+            game.draw_offer = None
+            if accept:
+                self.end_in_draw(game, 'agreement')
+            else:
+                self.send_to_players(game, {'type': 'draw_declined', 'game_id': game_id})
+    
+    def handle_claim_draw(self, client, game_id):
+        """End the game in a draw by threefold repetition or the fifty-move rule"""
+        game = self.played_game(client, game_id)
+        if not game:
+            return
+            
+        with game.lock:
+            # Both rules are kept up to date move by move, so this is a lookup
+            rule = game.claimable_draw() if game.is_active else None
+            if not rule:
+                client.send({'type': 'error', 'message': 'No draw to claim'})
+                return
+                
+            self.log(f"Game {game_id[:8]}: {client.username} claimed a draw by {rule}")
+            self.end_in_draw(game, rule)
+    
+    def end_in_draw(self, game, result):
+        """Finish a game as a draw"""
         game_state = game.get_state()
         game_state['game_over'] = True
-        game_state['result'] = 'resignation'
-        game_state['winner'] = winner
-        
-        # Notify all participants
-        for participant in game.get_all_participants():
-            participant.send(game_state)
-            
-        self.log(f"Game {game_id[:8]}: {client.username} resigned, {winner} wins")
-        
-        # Handle game over
+        game_state['result'] = result
+        game_state['winner'] = None
         self.handle_game_over(game, game_state)
     
-    def handle_spectate_request(self, client, game_id):
-        """Handle a client's request to spectate a game"""
+    def handle_takeback_request(self, client, game_id):
+        """Ask the opponent to let the client take back their last move"""
+        game = self.played_game(client, game_id)
+        if not game:
+            return
+            
+        with game.lock:
+            if not game.is_active:
+                client.send({'type': 'error', 'message': 'Game is not in progress'})
+                return
+                
+            color = 'white' if game.color_of(client) == chess.WHITE else 'black'
+            if len(game.board.move_stack) < self.takeback_plies(game, color):
+                client.send({'type': 'error', 'message': 'No move to take back'})
+                return
+            if game.takeback_request == color:
+                client.send({'type': 'error', 'message': 'You have already asked for a takeback'})
+                return
+                
+            # Bots don't mind
+            if getattr(game.get_opponent(client), 'is_bot', False):
+                self.take_back(game, color)
+                return
+                
+            # The request stands until it's answered or someone moves
+            game.takeback_request = color
+            self.send_to_players(game, {'type': 'takeback_requested', 'game_id': game_id, 'by': color})
+            self.log(f"Game {game_id[:8]}: {client.username} asked for a takeback")
+    
+    def handle_answer_takeback(self, client, game_id, accept):
+        """Accept or decline the opponent's takeback request"""
+        game = self.played_game(client, game_id)
+        if not game:
+            return
+            
+        with game.lock:
+            color = 'white' if game.color_of(client) == chess.WHITE else 'black'
+            requester = game.takeback_request
+            if not game.is_active or requester in (None, color):
+                client.send({'type': 'error', 'message': 'No takeback request to answer'})
+                return
+                
+            game.takeback_request = None
+            if accept:
+                self.take_back(game, requester)
+            else:
+                self.send_to_players(game, {'type': 'takeback_declined', 'game_id': game_id})
+    
+    def takeback_plies(self, game, color):
+        """Plies to undo so a player's last move is taken back, along with any reply to it"""
+        turn = 'white' if game.board.turn == chess.WHITE else 'black'
+        return 2 if turn == color else 1
+    
+    def take_back(self, game, color):
+        """Take back a player's last move and tell everyone the position"""
+        plies = self.takeback_plies(game, color)
+        queued = [player for player in (game.white_player, game.black_player)
+                  if game.premoves[game.color_of(player)]]
+        game.take_back(plies)
+        
+        for player in (game.white_player, game.black_player):
+            player.send(game.get_state(player))
+        for player in queued:
+            self.send_premoves(player, game)
+        self.publish_to_spectators(game, game.spectator_snapshot())
+        self.game_directory.touch(game)
+        self.log(f"Game {game.game_id[:8]}: {color} took back {plies} {'move' if plies == 1 else 'moves'}")
+    
+    def handle_spectate_request(self, client, game_id, have_plies=0, digest=None):
+        """Handle a client's request to spectate a game.
+        
+        have_plies is how many moves of this game the client already has,
+        and digest the history_digest of those moves; only the rest of the
+        history is sent when the digest shows they're still this game's.
+        """
+        error = self.start_spectating(client, game_id, have_plies, digest)
+        if error:
+            client.send({'type': 'error', 'message': error})
+            return
+        client.current_game = self.games[game_id]
+    
+    def handle_spectate_games(self, client, game_ids):
+        """Follow several games at once on one connection, e.g. for a broadcast wall.
+        
+        The games are watched alongside whatever game the client is in, and
+        each one gets its own spectating message and state as usual.
+        """
+        errors = []
+        failed = []  # IDs of the games not followed, so the client can let them go
+        for index, game_id in enumerate(game_ids):
+            if len(client.watched_games) >= MAX_WATCHED_GAMES:
+                errors.append(f"At most {MAX_WATCHED_GAMES} games can be followed")
+                failed += [game_id for game_id in game_ids[index:] if isinstance(game_id, str)]
+                break
+            if not isinstance(game_id, str):
+                errors.append("Game IDs must be strings")
+                continue
+            error = self.start_spectating(client, game_id)
+            if error:
+                errors.append(error)
+                failed.append(game_id)
+            else:
+                client.watched_games.add(self.games[game_id])
+                
+        if errors:
+            client.send({
+                'type': 'error',
+                'message': f"{len(errors)} of {len(game_ids)} games could not be followed: {errors[0]}",
+                'game_ids': failed
+            })
+    
+    def handle_unspectate_games(self, client, game_ids):
+        """Stop following games added with spectate_games"""
+        for game_id in game_ids:
+            game = self.games.get(game_id) if isinstance(game_id, str) else None
+            if game in client.watched_games:
+                client.watched_games.discard(game)
+                self.stop_spectating(client, game)
+    
+    def handle_list_games(self, client, sort, offset, limit):
+        """Send a page of the live game directory"""
+        client.send(self.game_directory.page(sort, offset, limit))
+    
+    def handle_subscribe_games(self, client, sort, offset, limit):
+        """Send a page of the live game directory and keep it up to date"""
+        client.send(self.game_directory.page(sort, offset, limit, subscriber=client))
+    
+    def handle_unsubscribe_games(self, client):
+        """Stop sending live game directory updates"""
+        self.game_directory.unsubscribe(client)
+    
+    def start_spectating(self, client, game_id, have_plies=0, digest=None):
+        """Add a spectator to a game and send it the game, returning an error or None"""
         # Check if game exists
         if game_id not in self.games:
-            client.send({'type': 'error', 'message': 'Game not found'})
-            return
+            return 'Game not found'
             
         game = self.games[game_id]
         
         # Check if client is already a player or spectator
         if game.is_player(client) or client in game.spectators:
-            client.send({'type': 'error', 'message': 'Already in this game'})
-            return
+            return 'Already in this game'
             
         # Add client as spectator
-        game.add_spectator(client)
-        client.current_game = game
+        if not game.add_spectator(client):
+            return 'Too many spectators in this game'
+        relay = self.relay_for(client)
         
         # Send game state to spectator
         client.send({
@@ -1089,7 +3322,25 @@ class ChessServerGUI:
             'black_player': game.black_player.username
         })
         
-        client.send(game.get_state(client))
+        if relay:
+            relay.subscribe(game_id, client)
+            
+        # Late joiners get the cached snapshot; clients that already know
+        # part of the history only get the moves they're missing. Takebacks
+        # rewrite history, so the part they know has to match ours.
+        snapshot = game.spectator_snapshot()
+        if isinstance(have_plies, int) and 0 < have_plies <= snapshot.message['ply'] and \
+                digest == history_digest(snapshot.message['move_history'][:have_plies]):
+            state = dict(snapshot.message)
+            state['move_history'] = state['move_history'][have_plies:]
+            state['history_from'] = have_plies
+            snapshot = SharedMessage(state, snapshot.version)
+        
+        # Spectator delay also applies to the position seen on joining
+        if relay and game.spectator_delay:
+            relay.publish(game_id, snapshot, game.spectator_delay, target=client)
+        else:
+            client.send(snapshot)
         
         # Notify players about new spectator
         for player in [game.white_player, game.black_player]:
@@ -1100,36 +3351,124 @@ class ChessServerGUI:
                     'spectator': client.username
                 })
                 
+        self.game_directory.touch(game)
         self.log(f"Player {client.username} is now spectating game {game_id[:8]}")
+        return None
+    
+    def stop_spectating(self, client, game):
+        """Remove a spectator from a game and its relay"""
+        game.remove_spectator(client)
+        relay = self.relay_for(client)
+        if relay:
+            relay.unsubscribe(game.game_id, client)
+        self.game_directory.touch(game)
+        self.log(f"Spectator {client.username} left game {game.game_id[:8]}")
+    
+    def handle_history_request(self, client, game_id, start, end=None):
+        """Handle a request for part of a game's move history"""
+        game = self.games.get(game_id)
+        if not game or not (game.is_player(client) or client in game.spectators):
+            client.send({'type': 'error', 'message': 'Game not found'})
+            return
+            
+        # History past the delay would reveal moves spectators shouldn't see yet
+        if game.spectator_delay and not game.is_player(client):
+            client.send({'type': 'error', 'message': 'History is not available during a delayed broadcast'})
+            return
+            
+        client.send({
+            'type': 'history_range',
+            'game_id': game_id,
+            'from': start,
+            'moves': game.get_history_range(start, end)
+        })
     
     def handle_game_over(self, game, game_state):
-        """Handle a game that has ended"""
-        # Mark game as inactive
-        game.is_active = False
+        """Finish a game with the result in game_state.
+        
+        Only the first result reported for a game counts: later ones send
+        nothing, rate nothing and schedule nothing. Returns whether this
+        call finished the game.
+        """
+        if not game.advance(GAME_FINISHED):
+            return False
+        self.game_directory.remove(game.game_id)
         
         # Send game over notification to all participants
+        self.send_to_game(game, {
+            'type': 'game_over',
+            'game_id': game.game_id,
+            'result': game_state.get('result'),
+            'winner': game_state.get('winner'),
+            'ratings': self.rate_game(game, game_state.get('winner'))
+        })
+        
+        # Update client state; spectators following several games may be
+        # playing one of their own
         for participant in game.get_all_participants():
-            participant.send({
-                'type': 'game_over',
-                'game_id': game.game_id,
-                'result': game_state.get('result'),
-                'winner': game_state.get('winner')
-            })
-            
-            # Update client state
-            participant.current_game = None
+            if participant.current_game is game:
+                participant.current_game = None
             
-        # Remove game after a delay
-        threading.Timer(60, self.remove_game, args=(game.game_id,)).start()
+        # Archive the game after a delay; daemon, so it never holds up a shutdown
+        archive = threading.Timer(GAME_ARCHIVE_DELAY, self.remove_game, args=(game.game_id,))
+        archive.daemon = True
+        archive.start()
         
         self.log(f"Game {game.game_id[:8]} ended: {game_state.get('result')}, winner: {game_state.get('winner')}")
         self.update_stats()
         self.update_games_list()
+        
+        # Tournament games: score it, and move on once the round is complete
+        if game.tournament and game.tournament.record_result(game, game_state.get('winner')):
+            self.finish_tournament_round(game.tournament)
+        return True
+    
+    def rate_game(self, game, winner):
+        """Update the players' ratings for a finished game.
+        
+        Returns the new ratings as {'white': ..., 'black': ...}, or None if
+        the game wasn't rated (a guest or bot played, or accounts are off).
+        """
+        white = getattr(game.white_player, 'account', None)
+        black = getattr(game.black_player, 'account', None)
+        if not self.user_store or not white or not black or white is black:
+            return None
+        
+        # Cached only; the store writes ratings back in the background
+        white_rating, black_rating = self.user_store.record_result(white, black, RATED_SCORES[winner])
+        game.white_player.rating = white_rating
+        game.black_player.rating = black_rating
+        return {'white': round(white_rating), 'black': round(black_rating)}
+    
+    def recompute_ratings(self):
+        """Rebuild every rating from the stored results, off the UI thread"""
+        if not self.user_store:
+            self.log("Start the server to recompute ratings")
+            return
+        
+        def recompute(store):
+            try:
+                start = time.time()
+                games = store.recompute_ratings()
+                for client in list(self.clients.values()):
+                    if client.account:
+                        client.rating = client.account.rating
+                self.log(f"Recomputed ratings from {games} games in {time.time() - start:.2f}s")
+            except Exception as e:
+                self.log(f"Error recomputing ratings: {e}")
+        
+        threading.Thread(target=recompute, args=(self.user_store,), daemon=True).start()
     
     def remove_game(self, game_id):
-        """Remove a game from the server"""
-        if game_id in self.games:
-            del self.games[game_id]
+        """Archive a game: drop it from memory and from everything serving it"""
+        game = self.games.get(game_id)
+        if game and game.advance(GAME_ARCHIVED):
+            self.games.pop(game_id, None)
+            self.game_directory.remove(game_id)
+            for spectator in list(game.spectators):
+                spectator.watched_games.discard(game)
+            for relay in self.spectator_relays:
+                relay.drop_game(game_id)
             self.log(f"Game {game_id[:8]} removed from memory")
             self.update_stats()
             self.update_games_list()
@@ -1143,8 +3482,8 @@ class ChessServerGUI:
         
         # Check if client is a player or spectator
         if game.is_player(client):
-            # If game is still active, handle as resignation
-            if game.is_active:
+            # If game is still in progress, handle as resignation
+            if game.status in GAME_IN_PROGRESS:
                 # Determine winner
                 winner = None
                 if client == game.white_player:
@@ -1170,8 +3509,7 @@ class ChessServerGUI:
                     game.black_player = None
         else:
             # Remove spectator
-            game.remove_spectator(client)
-            self.log(f"Spectator {client.username} left game {game.game_id[:8]}")
+            self.stop_spectating(client, game)
             
         client.current_game = None
     
@@ -1215,9 +3553,19 @@ class ChessServerGUI:
     
     def handle_client_disconnect(self, client):
         """Handle a client disconnecting from the server"""
+        # Withdraw from tournaments before leaving the game, so a round
+        # completed by this disconnection doesn't pair the player again
+        for tournament in list(self.tournaments.values()):
+            if client.client_id in tournament.scores:
+                tournament.withdraw(client)
+                
         # Remove from any game
         if client.current_game:
             self.handle_player_leave_game(client)
+        for game in list(client.watched_games):
+            self.stop_spectating(client, game)
+        client.watched_games.clear()
+        self.game_directory.unsubscribe(client)
             
         # Remove from any lobby
         if client.current_lobby:
@@ -1231,6 +3579,10 @@ class ChessServerGUI:
         self.update_stats()
         self.update_clients_list()
         self.log(f"Client {client.username or client.client_id[:8]} disconnected")
+        stats = client.compression_stats()
+        if stats and stats['bytes_in']:
+            self.log(f"Compression for {client.username}: {stats['bytes_in']} -> {stats['bytes_out']} bytes "
+                     f"({stats['compressed_messages']}/{stats['messages']} messages compressed)")
     
     def handle_chat_client_disconnect(self, chat_client):
         """Handle a chat client disconnecting"""
@@ -1239,6 +3591,34 @@ class ChessServerGUI:
             del self.chat_clients[chat_client.client_id]
             self.log(f"Chat client for {chat_client.client_id[:8]} disconnected")
     
+    def relay_for(self, client):
+        """Get the relay serving a spectator, or None if relays aren't running"""
+        if not self.spectator_relays:
+            return None
+        return self.spectator_relays[hash(client.client_id) % len(self.spectator_relays)]
+    
+    def publish_to_spectators(self, game, message):
+        """Publish a message once to each relay serving the game's spectators"""
+        if not isinstance(message, SharedMessage):
+            message = SharedMessage(message)
+            
+        if not self.spectator_relays:
+            # No relays running: deliver directly
+            for spectator in list(game.spectators):
+                spectator.send(message)
+            return
+            
+        for relay in self.spectator_relays:
+            if relay.has_spectators(game.game_id):
+                relay.publish(game.game_id, message, game.spectator_delay)
+    
+    def send_to_game(self, game, message):
+        """Send a message to the players directly and to spectators via relays"""
+        for player in [game.white_player, game.black_player]:
+            if player:
+                player.send(message)
+        self.publish_to_spectators(game, message)
+    
     def broadcast_chat(self, game, chat_message):
         """Broadcast a chat message to all participants in a game"""
         # Get all chat clients for participants in this game
@@ -1257,6 +3637,273 @@ class ChessServerGUI:
                 chat_client = self.chat_clients[player.client_id]
                 chat_client.send(chat_message)
     
+    def start_drain(self):
+        """Stop taking new connections and games, and stop once the games in progress are done"""
+        if not self.running or self.draining:
+            return
+        self.draining = True
+        self.drain_deadline = time.time() + DRAIN_TIMEOUT
+        self.drain_button.config(state=tk.DISABLED)
+        self.bot_match_button.config(state=tk.DISABLED)
+        
+        # Stop listening. Connections already queued are taken first, since
+        # closing the listeners would reset them; a new server sharing the
+        # ports gets the ones that arrive after
+        queued = self.accept_queued()
+        self.close_listeners()
+        if queued:
+            self.log(f"Took {queued} queued connections before closing the listeners")
+        
+        # Let everyone know, so clients reconnect once we go; clients still
+        # logging in are told when they finish
+        self.drain_notice = SharedMessage({
+            'type': 'server_draining',
+            'deadline': DRAIN_TIMEOUT,
+            'message': 'The server is restarting. Games in progress will finish here or carry on after the restart.'
+        })
+        for client in list(self.clients.values()):
+            if client.is_authenticated:
+                client.send(self.drain_notice)
+        
+        drain_thread = threading.Thread(target=self.drain_loop)
+        drain_thread.daemon = True
+        drain_thread.start()
+        self.threads.append(drain_thread)
+        self.log(f"Draining: {self.active_game_count()} games in progress, stopping within {DRAIN_TIMEOUT}s")
+    
+    def drain_loop(self):
+        """Wait for the active games to end (or the drain deadline), then stop"""
+        while self.running and self.active_game_count() and time.time() < self.drain_deadline:
+            # Tk is only touched from its own thread
+            status = f"Draining: {self.active_game_count()} games in progress"
+            self.root.after(0, lambda status=status: self.status_bar.config(text=status))
+            time.sleep(1)
+        if self.running:
+            self.log("Drain finished, stopping server")
+            self.root.after(0, self.stop_server)
+    
+    def active_game_count(self):
+        """Count the games still being played, or waiting for players to return"""
+        return sum(1 for game in list(self.games.values()) if game.status in GAME_IN_PROGRESS)
+    
+    def share_port(self, listener):
+        """Let other sockets (our acceptors, or a replacement server) bind the same port"""
+        if hasattr(socket, 'SO_REUSEPORT'):
+            try:
+                listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                return True
+            except OSError as e:
+                self.log(f"SO_REUSEPORT not available: {e}")
+        return False
+    
+    def checkpoint_game(self, game):
+        """Get what it takes to carry a game on in another server.
+        
+        A seat is held for its account, or for a guest, for whoever has the
+        resume token sent to them here; only the token's hash is saved.
+        """
+        def seat(player):
+            if getattr(player, 'level', None):
+                return {'username': player.username, 'bot': player.level}
+            if isinstance(player, AbsentPlayer):
+                # Still away since the last restart: their old claim stands
+                return {'username': player.username, 'bot': None,
+                        'account': player.account_name, 'token_hash': player.token_hash}
+            if player.account:
+                return {'username': player.username, 'bot': None, 'account': player.account.name}
+            token = secrets.token_urlsafe(16)
+            player.send({'type': 'resume_token', 'game_id': game.game_id, 'token': token})
+            return {'username': player.username, 'bot': None, 'account': None, 'token_hash': token_hash(token)}
+        
+        return {
+            'game_id': game.game_id,
+            'white': seat(game.white_player),
+            'black': seat(game.black_player),
+            'moves': [move.uci() for move in game.board.move_stack],
+            'white_time': game.white_time,
+            'black_time': game.black_time,
+            'time_control': game.time_control,
+            'spectator_delay': game.spectator_delay,
+            'start_time': game.start_time,
+            'checkpointed': time.time()
+        }
+    
+    def checkpoint_games(self):
+        """Write every game in progress to the checkpoint directory and detach its players"""
+        saved = 0
+        for game in list(self.games.values()):
+            if game.status not in GAME_IN_PROGRESS or not game.white_player or not game.black_player:
+                continue
+            try:
+                with game.lock:
+                    data = self.checkpoint_game(game)
+                    
+                    # The game carries on elsewhere; here it's archived
+                    # without a result
+                    self.remove_game(game.game_id)
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                path = os.path.join(self.checkpoint_dir, f"{game.game_id}.json")
+                
+                # Write then rename, so a server picking checkpoints up never
+                # reads half a file
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(data, f)
+                os.replace(path + '.tmp', path)
+                saved += 1
+            except Exception as e:
+                self.log(f"Error checkpointing game {game.game_id[:8]}: {e}")
+                continue
+            for participant in game.get_all_participants():
+                if participant.current_game is game:
+                    participant.current_game = None
+        if saved:
+            self.log(f"Checkpointed {saved} games in progress")
+        return saved
+    
+    def restore_games(self):
+        """Carry on the games found in the checkpoint directory"""
+        try:
+            names = [name for name in os.listdir(self.checkpoint_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            return 0
+        
+        restored = 0
+        for name in names:
+            path = os.path.join(self.checkpoint_dir, name)
+            
+            # Claim the file first: another server may be looking at it too
+            claimed = f"{path}.{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(claimed) as f:
+                    self.restore_game(json.load(f))
+                os.remove(claimed)
+                restored += 1
+            except Exception as e:
+                self.log(f"Error restoring checkpoint {name}: {e}")
+                os.replace(claimed, path + '.failed')
+        if restored:
+            self.log(f"Restored {restored} games from checkpoints")
+            self.update_stats()
+            self.update_games_list()
+        return restored
+    
+    def restore_game(self, data):
+        """Rebuild a checkpointed game and seat whoever can play it"""
+        game = ChessGame(data['game_id'], None, None, data['time_control'])
+        
+        # Replay the moves; parse_uci rejects anything illegal
+        for uci in data['moves']:
+            game.push(game.board.parse_uci(uci))
+        game.white_time = data['white_time']
+        game.black_time = data['black_time']
+        game.spectator_delay = data['spectator_delay']
+        game.start_time = data['start_time']
+        game.last_move_time = time.time()  # The clock was stopped while the game was on disk
+        
+        # Bots are recreated; everyone else has their seat held until they log in
+        deadline = time.time() + RESUME_TIMEOUT
+        for color in ('white', 'black'):
+            seat = data[color]
+            if seat['bot']:
+                player = BotPlayer(self, seat['bot'])
+            else:
+                player = AbsentPlayer(seat['username'], seat.get('account'), seat.get('token_hash'))
+                self.absent_seats[seat['username'].lower()] = (game, color, deadline)
+            player.current_game = game
+            setattr(game, f"{color}_player", player)
+        
+        self.games[game.game_id] = game
+        self.game_directory.add(game)
+        
+        # Players may have reconnected before the checkpoint turned up
+        for client in list(self.clients.values()):
+            if client.is_authenticated:
+                self.resume_seat(client)
+        
+        # Bot games, and games whose players were already back, start now
+        if not any(isinstance(player, AbsentPlayer) for player in (game.white_player, game.black_player)):
+            self.start_play(game)
+    
+    def resume_seat(self, client):
+        """Seat a player who logged in back in their restored game, if they have one"""
+        if client.current_game or not client.username:
+            return
+        entry = self.absent_seats.get(client.username.lower())
+        if not entry:
+            return
+        game, color, _ = entry
+        
+        # The name alone proves nothing: anyone can log in as a guest
+        if not self.may_resume(client, getattr(game, f"{color}_player")):
+            self.log(f"{client.username} can't take the held seat in game {game.game_id[:8]}: not its player")
+            return
+        self.absent_seats.pop(client.username.lower(), None)
+        if game.status != GAME_PENDING or self.games.get(game.game_id) is not game:
+            return
+        
+        with game.lock:
+            setattr(game, f"{color}_player", client)
+            client.current_game = game
+            opponent = game.black_player if color == 'white' else game.white_player
+            
+            client.send({
+                'type': 'game_started',
+                'game_id': game.game_id,
+                'color': color,
+                'opponent': opponent.username,
+                'white_player': game.white_player.username,
+                'black_player': game.black_player.username,
+                'time_control': game.time_control,
+                'resumed': True
+            })
+            
+            # The game starts again once both players are back; until then
+            # the player just gets the position
+            if isinstance(opponent, AbsentPlayer) or not self.start_play(game):
+                client.send(game.get_state(client))
+        self.game_directory.touch(game)
+        self.log(f"{client.username} rejoined game {game.game_id[:8]} as {color}")
+    
+    def may_resume(self, client, absent):
+        """Check that a client is the player a held seat belongs to"""
+        if not isinstance(absent, AbsentPlayer):
+            return False
+        if absent.account_name:
+            return client.account is not None and client.account.name == absent.account_name
+        # Guest seats go to a guest with the seat's token, never to an account
+        if client.account is not None or not client.resume_token or not absent.token_hash:
+            return False
+        return hmac.compare_digest(token_hash(client.resume_token), absent.token_hash)
+    
+    def expire_absent_seats(self):
+        """Forfeit restored games whose players didn't come back in time"""
+        now = time.time()
+        for username, (game, color, deadline) in list(self.absent_seats.items()):
+            if now < deadline:
+                continue
+            self.absent_seats.pop(username, None)
+            if game.status != GAME_PENDING or self.games.get(game.game_id) is not game:
+                continue
+            opponent_color = 'black' if color == 'white' else 'white'
+            opponent = getattr(game, f"{opponent_color}_player")
+            
+            if isinstance(opponent, AbsentPlayer):
+                # Nobody came back; drop the game without a result
+                self.log(f"Restored game {game.game_id[:8]} abandoned by both players")
+                self.remove_game(game.game_id)
+                continue
+            
+            game_state = game.get_state()
+            game_state['game_over'] = True
+            game_state['result'] = 'abandoned'
+            game_state['winner'] = opponent_color
+            self.log(f"{username} did not return to game {game.game_id[:8]}, {opponent_color} wins")
+            self.handle_game_over(game, game_state)
+    
     def timer_loop(self):
         """Main timer loop for handling game clocks and inactivity"""
         while self.running:
@@ -1272,6 +3919,11 @@ class ChessServerGUI:
                         self.log(f"Client {client.username or client.client_id[:8]} inactive, disconnecting")
                         client.disconnect()
                         
+                # Games handed over by a draining server, and seats nobody came back for
+                if not self.draining:
+                    self.restore_games()
+                self.expire_absent_seats()
+                        
                 # Update UI
                 if self.games or self.clients:
                     self.update_ui()
@@ -1294,6 +3946,10 @@ class ChessServerGUI:
             self.clients_label.config(text=str(len(self.clients)))
             self.games_label.config(text=str(len(self.games)))
             self.lobbies_label.config(text=str(len(self.lobbies)))
+            self.rate_limited_label.config(
+                text=f"{self.rate_limited_messages} ({self.rate_limit_disconnects} disconnected)")
+            self.connections_label.config(
+                text=f"{self.accept_stats.accepted} ({self.accept_stats.errors} failed)")
         except:
             pass  # Ignore UI update errors
     
@@ -1307,6 +3963,8 @@ class ChessServerGUI:
                     status = "(in game)"
                 elif client.current_lobby:
                     status = "(in lobby)"
+                if client.compressor:
+                    status += f" [zlib {client.compressor.ratio():.0%}]"
                     
                 self.clients_list.insert(tk.END, f"{client.username} {status}")
         except:
@@ -1317,7 +3975,7 @@ class ChessServerGUI:
         try:
             self.games_listbox.delete(0, tk.END)
             for game_id, game in self.games.items():
-                status = "Active" if game.is_active else "Ended"
+                status = game.status.capitalize()
                 self.games_listbox.insert(tk.END, f"{game.white_player.username} vs {game.black_player.username} ({status})")
         except:
             pass  # Ignore UI update errors
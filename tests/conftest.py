@@ -0,0 +1,95 @@
+
+import os
+import sys
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chess_server
+
+
+class Widget:
+    """Stands in for any Tk widget: every method does nothing"""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class Root(Widget):
+    """Stands in for the Tk root; callbacks scheduled with after() run at once"""
+    def after(self, ms, callback=None, *args):
+        if callback:
+            callback(*args)
+        return 'after'
+
+
+class HeadlessServer(chess_server.ChessServerGUI):
+    """The server without its window, for driving handlers directly"""
+    def setup_ui(self):
+        pass
+
+    def process_logs(self):
+        pass
+
+    def __getattr__(self, name):
+        # Only widgets are missing: setup_ui never ran
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Widget()
+
+    def logs(self):
+        """Everything logged so far"""
+        lines = []
+        while not self.log_queue.empty():
+            lines.append(self.log_queue.get())
+        return lines
+
+
+class FakeClient:
+    """A connected, logged-in player that records what it's sent"""
+    def __init__(self, username):
+        self.username = username
+        self.client_id = str(uuid.uuid4())
+        self.current_game = None
+        self.current_lobby = None
+        self.watched_games = set()
+        self.account = None
+        self.rating = None
+        self.is_authenticated = True
+        self.wants_legal_moves = True
+        self.last_activity = time.time()
+        self.is_connected = True
+        self.resume_token = None
+        self.sent = []
+
+    def send(self, message, timeout=None):
+        if isinstance(message, chess_server.SharedMessage):
+            message = message.message
+        self.sent.append(message)
+        return True
+
+    def disconnect(self):
+        pass
+
+    def received(self, message_type):
+        """Messages of one type sent to this client, oldest first"""
+        return [message for message in self.sent if message.get('type') == message_type]
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = HeadlessServer(Root())
+    server.running = True
+    server.checkpoint_dir = str(tmp_path / 'checkpoints')
+    return server
+
+
+@pytest.fixture
+def players(server):
+    """Two registered players, white then black"""
+    white, black = FakeClient('white'), FakeClient('black')
+    for client in (white, black):
+        server.clients[client.client_id] = client
+    return white, black
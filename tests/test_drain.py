@@ -0,0 +1,59 @@
+import json
+import socket
+
+import chess_server
+
+
+def test_queued_connections_are_taken_before_listeners_close(server):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    server.game_sockets = [listener]
+    # Connected, but no acceptor thread has picked it up
+    peer = socket.create_connection(listener.getsockname())
+    peer.settimeout(2)
+
+    try:
+        assert server.accept_queued() == 1
+        server.close_listeners()
+        client, = server.clients.values()
+
+        # Still served: it can log in, and hears about the drain when it does
+        server.draining = True
+        server.drain_notice = chess_server.SharedMessage({'type': 'server_draining'})
+        peer.sendall(json.dumps({'type': 'hello', 'username': 'late'}).encode())
+        received = b''
+        while b'server_draining' not in received:
+            data = peer.recv(4096)
+            assert data
+            received += data
+        assert b'connection_ack' in received
+    finally:
+        server.running = False
+        peer.close()
+
+
+class Label:
+    """Records the text it's given"""
+    def __init__(self):
+        self.shown = []
+
+    def config(self, text):
+        self.shown.append(text)
+
+
+def test_drain_progress_is_shown_from_the_tk_thread(server, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(server.root, 'after', lambda ms, callback, *args: scheduled.append(callback))
+    counts = iter([1, 1, 0])
+    monkeypatch.setattr(server, 'active_game_count', lambda: next(counts))
+    monkeypatch.setattr(chess_server.time, 'sleep', lambda seconds: None)
+    server.drain_deadline = float('inf')
+    server.status_bar = Label()
+
+    server.drain_loop()
+
+    assert not server.status_bar.shown  # Nothing touched Tk from the drain thread
+    scheduled[0]()
+    assert server.status_bar.shown == ['Draining: 1 games in progress']
+    assert scheduled[-1] == server.stop_server
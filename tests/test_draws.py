@@ -0,0 +1,178 @@
+import chess
+import chess.polyglot
+import pytest
+
+import chess_server
+
+# Short games reaching each special move; every position along the way is checked
+LINES = {
+    'castling': "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 e1g1 d7d6 d2d4 c8g4 b1c3 d8d7 c1e3 e8c8",
+    'en passant': "e2e4 a7a6 e4e5 d7d5 e5d6 c7c5 a2a3 c5c4 b2b4 c4b3",
+    'promotion': "a2a4 b7b5 a4b5 a7a6 b5a6 c8b7 a6b7 b8c6 b7a8q d8a8",
+    'castling rights lost': "e2e4 e7e5 h2h4 h7h5 h1h3 h8h6 h3h1 h6h8 e1e2 e8e7",
+}
+
+
+def play(game, line):
+    for move in line.split():
+        game.push(game.board.parse_uci(move))
+
+
+def assert_hashes_match(game):
+    """The incremental hash of every position equals one computed from scratch"""
+    board = chess.Board()
+    assert game.positions[0][1] == chess.polyglot.zobrist_hash(board)
+    for move, (_, key) in zip(game.board.move_stack, game.positions[1:]):
+        board.push(move)
+        assert key == chess.polyglot.zobrist_hash(board), board.fen()
+    assert len(game.positions) == len(game.board.move_stack) + 1
+
+
+def new_game():
+    return chess_server.ChessGame('game', None, None)
+
+
+@pytest.mark.parametrize('line', LINES.values(), ids=LINES.keys())
+def test_incremental_zobrist_matches_polyglot(line):
+    game = new_game()
+    play(game, line)
+    assert_hashes_match(game)
+
+
+@pytest.mark.parametrize('line', LINES.values(), ids=LINES.keys())
+def test_take_back_restores_hashes_and_counts(line):
+    game = new_game()
+    play(game, line)
+    plies = len(game.board.move_stack)
+    while game.board.move_stack:
+        game.take_back(1)
+        assert_hashes_match(game)
+        assert sum(game.repetitions.values()) == len(game.positions)
+    assert game.repetitions == {chess.polyglot.zobrist_hash(chess.Board()): 1}
+
+    play(game, line)
+    assert len(game.board.move_stack) == plies
+    assert_hashes_match(game)
+
+
+def test_claimable_draw_by_repetition():
+    game = new_game()
+    play(game, "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1")
+    assert game.repetition_count() == 2
+    assert game.claimable_draw() is None
+
+    play(game, "f6g8")
+    assert game.repetition_count() == 3
+    assert game.claimable_draw() == "threefold repetition"
+
+    game.take_back(1)
+    assert game.claimable_draw() is None
+
+
+def test_claimable_draw_by_fifty_move_rule():
+    game = new_game()
+    game.board.halfmove_clock = 97
+    play(game, "g1f3 g8f6")
+    assert game.claimable_draw() is None
+
+    play(game, "b1c3")
+    assert game.claimable_draw() == "fifty-move rule"
+
+
+def test_repetition_ignores_en_passant_that_cannot_be_taken():
+    game = new_game()
+    # The double step leaves an en passant square nobody can capture on, so
+    # the position repeats the one after the knights' dance
+    play(game, "e2e4 g8f6 g1f3 f6g8 f3g1 g8f6 g1f3 f6g8 f3g1")
+    assert game.repetition_count() == 3
+
+
+@pytest.fixture
+def game(server, players):
+    white, black = players
+    game = server.create_game(white, black)
+    server.start_play(game)
+    return game
+
+
+def test_draw_offer_declined(server, players, game):
+    white, black = players
+    server.handle_offer_draw(white, game.game_id)
+    assert game.draw_offer == 'white'
+    assert black.received('draw_offered')[-1]['by'] == 'white'
+
+    server.handle_offer_draw(white, game.game_id)
+    assert 'already offered' in white.received('error')[-1]['message']
+
+    server.handle_answer_draw(white, game.game_id, True)
+    assert white.received('error')[-1]['message'] == 'No draw offer to answer'
+
+    server.handle_answer_draw(black, game.game_id, False)
+    assert game.draw_offer is None
+    assert white.received('draw_declined')
+    assert game.is_active
+
+
+def test_draw_offer_accepted(server, players, game):
+    white, black = players
+    server.handle_offer_draw(black, game.game_id)
+    server.handle_answer_draw(white, game.game_id, True)
+
+    assert game.status == chess_server.GAME_FINISHED
+    assert white.received('game_over')[-1]['result'] == 'agreement'
+
+
+def test_offering_back_accepts_the_offer(server, players, game):
+    white, black = players
+    server.handle_offer_draw(white, game.game_id)
+    server.handle_offer_draw(black, game.game_id)
+
+    assert game.status == chess_server.GAME_FINISHED
+    assert black.received('game_over')[-1]['winner'] is None
+
+
+def test_moving_declines_opponents_offer_only(game):
+    game.draw_offer = 'black'
+    game.make_move('e2e4')
+    assert game.draw_offer is None
+
+    game.draw_offer = 'black'
+    game.make_move('e7e5')
+    assert game.draw_offer == 'black'
+
+
+def test_claim_draw(server, players, game):
+    white, black = players
+    server.handle_claim_draw(white, game.game_id)
+    assert white.received('error')[-1]['message'] == 'No draw to claim'
+    assert game.is_active
+
+    for move in "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1 f6g8".split():
+        game.make_move(move)
+    server.handle_claim_draw(white, game.game_id)
+    assert black.received('game_over')[-1]['result'] == 'threefold repetition'
+
+
+def test_takeback_request_and_answers(server, players, game):
+    white, black = players
+    server.handle_takeback_request(white, game.game_id)
+    assert white.received('error')[-1]['message'] == 'No move to take back'
+
+    game.make_move('e2e4')
+    game.make_move('e7e5')
+    server.handle_takeback_request(white, game.game_id)
+    assert game.takeback_request == 'white'
+
+    server.handle_answer_takeback(white, game.game_id, True)
+    assert white.received('error')[-1]['message'] == 'No takeback request to answer'
+
+    server.handle_answer_takeback(black, game.game_id, False)
+    assert game.takeback_request is None
+    assert len(game.move_history) == 2
+
+    # White's move and black's reply to it both go
+    server.handle_takeback_request(white, game.game_id)
+    server.handle_answer_takeback(black, game.game_id, True)
+    assert game.move_history == []
+    assert game.board.fen() == chess.STARTING_FEN
+    assert_hashes_match(game)
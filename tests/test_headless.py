@@ -0,0 +1,88 @@
+import logging
+import socket
+import threading
+
+import pytest
+
+from chess_protocol import FRAME_HEADER, FRAME_MAGIC, encode_message
+
+import chess_headless
+
+
+def test_sessions_must_implement_sending():
+    class Mute(chess_headless.ClientSession):
+        def send_game_message(self, message):
+            return False
+
+    with pytest.raises(TypeError, match='send_chat_message'):
+        Mute(username='mute')
+
+
+def test_connect_failure_is_logged(caplog):
+    # Nothing listens on a port we bound and never listened on
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        session = chess_headless.ChessSession('127.0.0.1', port, 'nobody')
+
+        with caplog.at_level(logging.WARNING, logger='chess_headless'):
+            assert not session.connect(timeout=1)
+
+    assert 'Failed to connect to game server' in caplog.text
+
+
+def test_failing_listener_is_logged_and_the_rest_still_run(caplog):
+    session = chess_headless.ChessSession(username='listener')
+    seen = []
+    session.on('chat', lambda message: 1 / 0)
+    session.on('chat', seen.append)
+
+    with caplog.at_level(logging.ERROR, logger='chess_headless'):
+        session.deliver(chess_headless.GAME, {'type': 'chat', 'message': 'hi'})
+
+    assert seen == [{'type': 'chat', 'message': 'hi'}]
+    assert 'Error in chat listener' in caplog.text
+    assert 'ZeroDivisionError' in caplog.text
+
+
+def listening_session():
+    """A session reading one end of a socket pair, as if connected"""
+    ours, theirs = socket.socketpair()
+    session = chess_headless.ChessSession(username='reader')
+    session.game_socket = ours
+    session.is_connected = True
+    received = []
+    session.on(chess_headless.ANY, received.append)
+    thread = threading.Thread(target=session.listen, args=(chess_headless.GAME, ours, session.game_decoder))
+    thread.daemon = True
+    thread.start()
+    return session, theirs, thread, received
+
+
+def test_large_server_messages_are_delivered():
+    session, server_end, thread, received = listening_session()
+    history = ['e2e4'] * 400000
+    try:
+        server_end.sendall(encode_message({'type': 'move_history', 'moves': history}))
+    finally:
+        server_end.close()
+    thread.join(5)
+
+    assert [message['type'] for message in received] == ['move_history', 'disconnected']
+    assert received[0]['moves'] == history
+
+
+def test_bad_frame_drops_the_connection():
+    session, server_end, thread, received = listening_session()
+    # A frame of an unknown kind, then what looks like more messages
+    bad = FRAME_HEADER.pack(FRAME_MAGIC, 250, 4) + b'{"a"'
+    try:
+        server_end.sendall(bad + b'{"type": "bogus"}')
+        thread.join(5)
+    finally:
+        server_end.close()
+
+    assert not thread.is_alive()
+    assert [message['type'] for message in received] == ['disconnected']
+    assert 'Bad data' in received[0]['message']
+    assert not session.is_connected
@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.fixture
+def game(server, players):
+    white, black = players
+    game = server.create_game(white, black)
+    server.start_play(game)
+    return game
+
+
+def test_move_rejections_name_the_move(server, players, game):
+    white, black = players
+    server.handle_game_move(black, game.game_id, 'e7e5')
+    server.handle_game_move(white, game.game_id, 'e2e5')
+    server.handle_offer_draw(black, 'no-such-game')
+
+    errors = white.received('error') + black.received('error')
+    assert [error.get('message_type') for error in errors] == ['move', 'move', None]
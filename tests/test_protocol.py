@@ -0,0 +1,86 @@
+
+import socket
+import threading
+
+import pytest
+
+import chess_server
+from chess_protocol import (FRAME_HEADER, FRAME_MAGIC, KIND_JSON, MessageDecoder, ProtocolError,
+                            encode_message, split_frame)
+
+
+def test_decoder_splits_objects_and_frames():
+    decoder = MessageDecoder()
+    data = encode_message({'type': 'a'}) + encode_message({'type': 'b'}, 'binary') + b'{"type": "c"'
+    assert [m['type'] for m in decoder.feed(data)] == ['a', 'b']
+    assert [m['type'] for m in decoder.feed(b'}')] == ['c']
+
+
+def test_decoder_rejects_object_that_never_closes():
+    decoder = MessageDecoder(max_message_size=1024)
+    with pytest.raises(ProtocolError):
+        list(decoder.feed(b'{"text": "' + b'x' * 600))
+        list(decoder.feed(b'x' * 600))
+    assert not decoder.buffer
+
+    # The decoder starts afresh afterwards
+    assert list(decoder.feed(b'{"type": "ok"}')) == [{'type': 'ok'}]
+
+
+def test_decoder_rejects_complete_object_over_limit():
+    decoder = MessageDecoder(max_message_size=1024)
+    with pytest.raises(ProtocolError):
+        list(decoder.feed(b'{"text": "' + b'x' * 2000 + b'"}'))
+
+
+def test_decoder_rejects_huge_frame_from_header():
+    decoder = MessageDecoder(max_message_size=1024)
+    header = FRAME_HEADER.pack(FRAME_MAGIC, KIND_JSON, 3 << 30)
+    with pytest.raises(ProtocolError):
+        list(decoder.feed(header + b'{'))
+    assert not decoder.buffer
+
+
+def test_unlimited_decoder_takes_messages_of_any_size():
+    decoder = MessageDecoder(max_message_size=None)
+    history = ['e2e4'] * 300000  # Several megabytes as JSON
+    data = encode_message({'type': 'a', 'moves': history}) + encode_message({'type': 'b', 'moves': history}, 'binary')
+
+    messages = []
+    for start in range(0, len(data), 65536):
+        messages += decoder.feed(data[start:start + 65536])
+
+    assert [m['type'] for m in messages] == ['a', 'b']
+    assert messages[1]['moves'] == history
+
+
+def test_split_frame_limit():
+    data = encode_message({'type': 'x', 'pad': 'y' * 100}, 'binary')
+    assert split_frame(data, max_size=len(data))[0]['type'] == 'x'
+    with pytest.raises(ProtocolError):
+        split_frame(data, max_size=50)
+
+
+@pytest.mark.parametrize('attack', [
+    b'{' + b'a' * (chess_server.MAX_CLIENT_MESSAGE_SIZE + 8192),
+    FRAME_HEADER.pack(FRAME_MAGIC, KIND_JSON, 1 << 31),
+], ids=['unclosed object', 'huge frame'])
+def test_server_drops_client_sending_oversized_message(server, attack):
+    ours, theirs = socket.socketpair()
+    client = chess_server.ChessClient(ours, ('test', 0), server)
+    server.clients[client.client_id] = client
+    handler = threading.Thread(target=server.handle_game_client, args=(client,), daemon=True)
+    handler.start()
+
+    try:
+        theirs.sendall(attack)
+    except OSError:
+        pass  # Already cut off
+    handler.join(timeout=5)
+    assert not handler.is_alive()
+    assert client.client_id not in server.clients
+    theirs.settimeout(5)
+    try:
+        assert theirs.recv(1) == b''
+    except ConnectionResetError:
+        pass
@@ -0,0 +1,94 @@
+import socket
+
+import pytest
+
+import chess_server
+
+
+class Clock:
+    """A monotonic clock the test moves by hand"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chess_server.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def connection(server):
+    ours, theirs = socket.socketpair()
+    client = chess_server.ChessClient(ours, ('test', 0), server)
+    client.username = 'flooder'
+    yield client
+    ours.close()
+    theirs.close()
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    bucket = chess_server.TokenBucket(2, 4)
+    assert all(bucket.consume() for _ in range(4))
+    assert not bucket.consume()
+
+    clock.now += 0.5
+    assert bucket.consume()
+    assert not bucket.consume()
+
+
+def test_bucket_never_holds_more_than_capacity(clock):
+    bucket = chess_server.TokenBucket(10, 3)
+    clock.now += 60
+    assert sum(bucket.consume() for _ in range(10)) == 3
+
+
+def test_bucket_takes_several_tokens_only_if_all_are_there(clock):
+    bucket = chess_server.TokenBucket(1, 3)
+    assert not bucket.consume(4)
+    assert bucket.consume(3)
+    assert not bucket.consume()
+
+
+def test_message_types_have_separate_buckets(clock, connection):
+    _, burst = chess_server.RATE_LIMITS['create_lobby']
+    assert all(connection.allow_message('create_lobby') for _ in range(burst))
+    assert not connection.allow_message('create_lobby')
+    assert connection.allow_message('move')
+
+
+def test_unlisted_types_share_the_default_bucket(clock, connection):
+    _, burst = chess_server.DEFAULT_RATE_LIMIT
+    for index in range(burst):
+        assert connection.allow_message('unlisted' if index % 2 else 'other')
+    assert not connection.allow_message('unlisted')
+
+
+def test_flooding_throttles_then_disconnects(clock, server, connection):
+    _, burst = chess_server.RATE_LIMITS['offer_draw']
+    for _ in range(burst):
+        assert server.check_rate_limit(connection, 'offer_draw')
+
+    assert not server.check_rate_limit(connection, 'offer_draw')
+    assert connection.throttled
+    assert connection.is_connected
+
+    _, allowance = chess_server.VIOLATION_LIMIT
+    for _ in range(allowance):
+        server.check_rate_limit(connection, 'offer_draw')
+
+    assert not connection.is_connected
+    assert server.rate_limit_disconnects == 1
+
+
+def test_global_limit_is_not_held_against_the_client(clock, server, connection):
+    server.global_rate_buckets['list_games'] = chess_server.TokenBucket(1, 1)
+    assert server.check_rate_limit(connection, 'list_games')
+    assert not server.check_rate_limit(connection, 'list_games')
+
+    assert connection.rate_violations == 0
+    assert server.rate_limited_messages == 1
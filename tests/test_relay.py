@@ -0,0 +1,47 @@
+import socket
+import time
+
+import chess_server
+from conftest import FakeClient
+
+
+def test_slow_spectator_is_dropped_without_holding_up_the_rest(server, monkeypatch):
+    monkeypatch.setattr(chess_server, 'SPECTATOR_SEND_TIMEOUT', 0.2)
+    ours, theirs = socket.socketpair()
+    ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    slow = chess_server.ChessClient(ours, ('slow', 0), server)
+    slow.username = 'slow'
+    fast = FakeClient('fast')
+    relay = chess_server.SpectatorRelay(server, 0)
+    relay.subscribe('game', slow)
+    relay.subscribe('game', fast)
+
+    try:
+        # Nobody reads theirs, so the slow spectator's buffers fill up
+        started = time.monotonic()
+        for index in range(50):
+            relay.publish('game', {'type': 'chat_message', 'message': 'x' * 100000, 'index': index})
+            relay.pending.append(relay.queue.get_nowait())  # What run() would do
+            relay.deliver_due()
+        elapsed = time.monotonic() - started
+
+        assert not slow.is_connected
+        assert relay.spectators_dropped == 1
+        assert relay.subscribers['game'] == {fast}
+        assert [message['index'] for message in fast.sent] == list(range(50))
+        assert elapsed < 2  # One timeout, not one per update
+    finally:
+        theirs.close()
+
+
+def test_send_within_sends_everything_in_time():
+    ours, theirs = socket.socketpair()
+    try:
+        chess_server.send_within(ours, b'move' * 1000, 1.0)
+        received = b''
+        while len(received) < 4000:
+            received += theirs.recv(8192)
+        assert received == b'move' * 1000
+    finally:
+        ours.close()
+        theirs.close()
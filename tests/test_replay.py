@@ -0,0 +1,25 @@
+import io
+
+import chess_replay
+
+
+def test_malformed_uci_lines_become_game_errors():
+    stream = io.StringIO('{"moves": ["e2e4", "e7e5"]}\n'
+                         '{"moves": [\n'
+                         '{}}\n'
+                         'e2e4 e7e5 g1f3\n')
+
+    results = [chess_replay.replay_record(record) for record in chess_replay.iter_uci_records(stream)]
+
+    assert [result['valid'] for result in results] == [True, False, False, True]
+    assert [result['game_id'] for result in results] == ['0', '1', '2', '3']
+    assert results[1]['error'].startswith('Malformed record')
+
+
+def test_wrongly_typed_record_is_a_game_error():
+    records = list(chess_replay.iter_uci_records(io.StringIO('{"moves": 5}\n')))
+
+    result, = chess_replay.replay_games(records, workers=1)
+
+    assert not result['valid']
+    assert result['game_id'] == '0'
@@ -0,0 +1,72 @@
+import chess_server
+from chess_accounts import Account
+from conftest import FakeClient
+
+
+def restart(server, game):
+    """Checkpoint a game in progress and pick it up again, as the next server would"""
+    game.make_move('e2e4')
+    assert server.checkpoint_games() == 1
+    server.clients = {}  # Everyone was disconnected
+    assert server.restore_games() == 1
+    return server.games[game.game_id]
+
+
+def login(server, username, account=None, resume_token=None):
+    client = FakeClient(username)
+    client.account = account
+    client.resume_token = resume_token
+    server.clients[client.client_id] = client
+    server.resume_seat(client)
+    return client
+
+
+def test_guest_seat_needs_the_resume_token(server, players):
+    white, black = players
+    game = server.create_game(white, black)
+    server.start_play(game)
+    restored = restart(server, game)
+    token = white.received('resume_token')[-1]['token']
+
+    impostor = login(server, 'WHITE')
+    assert impostor.current_game is None
+    registered = login(server, 'white', account=Account('white', 'white', 'hash', 1500, 0), resume_token=token)
+    assert registered.current_game is None
+
+    returning = login(server, 'white', resume_token=token)
+    assert returning.current_game is restored
+    assert restored.white_player is returning
+
+
+def test_registered_seat_needs_the_account(server, players):
+    white, black = players
+    white.account = Account('white', 'White', 'hash', 1500, 0)
+    game = server.create_game(white, black)
+    server.start_play(game)
+    assert not white.received('resume_token')
+    restored = restart(server, game)
+
+    guest = login(server, 'White')
+    other = login(server, 'white', account=Account('someone', 'white', 'hash', 1500, 0))
+    assert guest.current_game is None and other.current_game is None
+
+    returning = login(server, 'White', account=Account('white', 'White', 'hash', 1500, 0))
+    assert restored.white_player is returning
+
+
+def test_seat_still_held_after_a_second_restart(server, players):
+    white, black = players
+    game = server.create_game(white, black)
+    server.start_play(game)
+    restored = restart(server, game)
+    token = white.received('resume_token')[-1]['token']
+
+    # Nobody came back before the next restart; the first token still works
+    restored.make_move('e7e5')
+    assert server.checkpoint_games() == 1
+    server.absent_seats = {}
+    assert server.restore_games() == 1
+
+    returning = login(server, 'white', resume_token=token)
+    assert returning.current_game is server.games[game.game_id]
+    assert returning.current_game.move_history == ['e4', 'e5']
@@ -0,0 +1,85 @@
+
+import chess_headless
+import chess_server
+from conftest import FakeClient
+
+
+class BridgedSession(chess_headless.ClientSession):
+    """A session wired straight to the server's handlers, no sockets"""
+    def __init__(self, server):
+        super().__init__(username='watcher')
+        self.server = server
+        self.client = FakeClient('watcher')
+        self.client.send = self.deliver
+
+    def deliver(self, message):
+        if isinstance(message, chess_server.SharedMessage):
+            message = message.message
+        self.track(dict(message))
+        return True
+
+    def send_game_message(self, message):
+        assert message['type'] == 'spectate'
+        self.server.handle_spectate_request(self.client, message['game_id'], message.get('have_plies', 0),
+                                            message.get('history_digest'))
+        return True
+
+    def send_chat_message(self, message):
+        return False
+
+
+def play(server, game, moves):
+    for move in moves:
+        player = game.white_player if game.board.turn else game.black_player
+        server.handle_game_move(player, game.game_id, move)
+
+
+def test_respectating_sends_only_missing_moves(server, players):
+    game = server.create_game(*players)
+    play(server, game, ['e2e4', 'e7e5'])
+    session = BridgedSession(server)
+    session.spectate(game.game_id)
+    server.stop_spectating(session.client, game)
+
+    play(server, game, ['g1f3', 'b8c6'])
+    sent = []
+    session.client.send = lambda message: sent.append(message) or session.deliver(message)
+    session.spectate(game.game_id)
+    state = [getattr(m, 'message', m) for m in sent if getattr(m, 'message', m)['type'] == 'game_state'][-1]
+    assert state['history_from'] == 2 and state['move_history'] == ['Nf3', 'Nc6']
+    assert session.history == ['e4', 'e5', 'Nf3', 'Nc6']
+
+
+def test_respectating_after_takeback_gets_full_history(server, players):
+    white, black = players
+    game = server.create_game(white, black)
+    play(server, game, ['e2e4', 'e7e5', 'g1f3', 'b8c6'])
+    session = BridgedSession(server)
+    session.spectate(game.game_id)
+    server.stop_spectating(session.client, game)
+    assert session.history == ['e4', 'e5', 'Nf3', 'Nc6']
+
+    # Same number of plies, different moves
+    server.handle_takeback_request(white, game.game_id)
+    server.handle_answer_takeback(black, game.game_id, True)
+    play(server, game, ['d2d4', 'd7d5'])
+
+    sent = []
+    session.client.send = lambda message: sent.append(message) or session.deliver(message)
+    session.spectate(game.game_id)
+    state = [getattr(m, 'message', m) for m in sent if getattr(m, 'message', m)['type'] == 'game_state'][-1]
+    assert 'history_from' not in state
+    assert session.history == ['e4', 'e5', 'd4', 'd5']
+
+
+def test_following_games_reports_the_ones_that_failed(server, players, monkeypatch):
+    monkeypatch.setattr(chess_server, 'MAX_WATCHED_GAMES', 1)
+    first = server.create_game(*players)
+    second = server.create_game(FakeClient('a'), FakeClient('b'))
+    watcher = FakeClient('watcher')
+    missing = '00000000-0000-0000-0000-000000000000'
+
+    server.handle_spectate_games(watcher, [missing, first.game_id, second.game_id])
+
+    assert watcher.watched_games == {first}
+    assert watcher.received('error')[-1]['game_ids'] == [missing, second.game_id]
@@ -0,0 +1,151 @@
+import pytest
+
+import chess_server
+from conftest import FakeClient
+
+
+def register(server, *names):
+    clients = [FakeClient(name) for name in names]
+    for client in clients:
+        server.clients[client.client_id] = client
+    return clients
+
+
+def casual_game(server, white, black):
+    return server.create_game(white, black)
+
+
+def test_busy_player_cannot_join_tournament(server, players):
+    white, black = players
+    host, = register(server, 'host')
+    server.handle_create_tournament(host, 'swiss', 1)
+    tournament_id = host.received('tournament_created')[0]['tournament_id']
+    casual_game(server, white, black)
+
+    server.handle_join_tournament(white, tournament_id)
+
+    assert not white.received('tournament_joined')
+    assert 'already playing' in white.received('error')[-1]['message']
+
+
+def test_busy_player_cannot_start_casual_game(server, players):
+    white, black = players
+    casual_game(server, white, black)
+    host, = register(server, 'host')
+    server.handle_create_lobby(host)
+    lobby_id = host.received('lobby_created')[0]['lobby_id']
+    server.handle_join_lobby(white, lobby_id)
+
+    server.handle_start_game(host, lobby_id)
+
+    assert 'already playing' in host.received('error')[-1]['message']
+    assert lobby_id in server.lobbies
+    assert host.current_game is None
+
+
+def test_player_in_running_tournament_cannot_join_another(server, players):
+    white, black = players
+    server.handle_create_tournament(white, 'swiss', 2)
+    first = white.received('tournament_created')[0]['tournament_id']
+    server.handle_join_tournament(black, first)
+    server.handle_start_tournament(white, first)
+    # Between rounds: the first game is over but the tournament isn't
+    black.current_game.advance(chess_server.GAME_FINISHED)
+    other, = register(server, 'other')
+    server.handle_create_tournament(other, 'swiss', 1)
+    second = other.received('tournament_created')[0]['tournament_id']
+
+    server.handle_join_tournament(black, second)
+
+    assert len(black.received('tournament_joined')) == 1
+    assert 'another tournament' in black.received('error')[-1]['message']
+
+
+def test_busy_player_forfeits_pairing(server, players):
+    white, black = players
+    server.handle_create_tournament(white, 'round_robin', None)
+    tournament_id = white.received('tournament_created')[0]['tournament_id']
+    server.handle_join_tournament(black, tournament_id)
+    tournament = server.tournaments[tournament_id]
+    # Registered, then seated in a casual game before the tournament started
+    other, = register(server, 'other')
+    game = casual_game(server, black, other)
+
+    server.handle_start_tournament(white, tournament_id)
+
+    assert black.current_game is game
+    assert black.received('tournament_round')[-1]['forfeit']
+    assert white.received('tournament_round')[-1]['bye']
+    assert tournament.scores[white.client_id] == 1.0
+    assert tournament.scores[black.client_id] == 0.0
+    assert not tournament.pending_games
+
+
+def tournament_of(count, format='swiss', rounds=None):
+    players = [FakeClient(f'p{index}') for index in range(count)]
+    tournament = chess_server.Tournament('t', players[0], format, rounds)
+    for player in players[1:]:
+        tournament.add_player(player)
+    tournament.start()
+    return tournament, players
+
+
+def play_round(tournament, winner='white'):
+    pairings, bye = tournament.pair_next_round()
+    for index, (white, black) in enumerate(pairings):
+        game = chess_server.ChessGame(f'{tournament.current_round}-{index}', white, black)
+        tournament.pending_games[game.game_id] = (white.client_id, black.client_id)
+        tournament.record_result(game, winner)
+    return pairings, bye
+
+
+@pytest.mark.parametrize('count', [4, 5])
+def test_round_robin_pairs_everyone_once(count):
+    tournament, players = tournament_of(count, 'round_robin')
+    met = []
+    byes = []
+    for _ in range(tournament.total_rounds):
+        pairings, bye = play_round(tournament)
+        met += [frozenset((white.client_id, black.client_id)) for white, black in pairings]
+        byes += [bye] if bye else []
+
+    assert len(met) == len(set(met)) == count * (count - 1) // 2
+    # With an odd count everyone sits out exactly once
+    expected = players if count % 2 else []
+    assert sorted(player.username for player in byes) == sorted(player.username for player in expected)
+
+
+def test_swiss_avoids_rematches():
+    tournament, players = tournament_of(4, rounds=2)
+    first, _ = play_round(tournament)
+    second, _ = play_round(tournament)
+
+    met = [frozenset((white.client_id, black.client_id)) for white, black in first + second]
+    assert len(set(met)) == 4
+
+
+def test_swiss_byes_go_to_different_players():
+    tournament, players = tournament_of(5, rounds=3)
+    byes = [play_round(tournament)[1] for _ in range(3)]
+
+    assert len(set(byes)) == 3
+    assert sum(tournament.scores.values()) == 3 * 3
+
+
+def test_colors_alternate():
+    tournament, players = tournament_of(2, 'round_robin')
+    tournament.total_rounds = 2
+    ((first, _),), _ = play_round(tournament)
+    ((second, _),), _ = play_round(tournament)
+    assert first is not second
+
+
+def test_withdrawn_opponent_gives_the_point():
+    tournament, players = tournament_of(4, 'round_robin')
+    tournament.withdraw(players[3])
+
+    pairings, bye = tournament.pair_next_round()
+
+    assert bye is None
+    assert len(pairings) == 1
+    assert tournament.scores[players[0].client_id] == 1.0